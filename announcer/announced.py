@@ -0,0 +1,151 @@
+import hashlib
+import math
+import sqlite3
+from typing import Iterable, Iterator, Optional
+
+from announcer.metrics import MetricsRegistry
+
+
+class AnnouncedIndexError(Exception):
+    pass
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed number of bits. Lookups may return false
+    positives at around `error_rate` once `capacity` keys are added,
+    but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        capacity = max(1, capacity)
+        self.capacity = capacity
+
+        self._num_bits = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self._num_hashes = max(1, round(self._num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self._num_hashes):
+            yield (h1 + i * h2) % self._num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self._bits)
+
+
+class AnnouncedIndex:
+    """
+    Persistent set of the ids of posts which have been announced.
+
+    The ids are stored in SQLite, with a Bloom filter held in memory in
+    front of them. Most posts looked up have never been announced, and
+    the filter answers those without touching the database. The filter
+    is rebuilt from the database on start up, and at twice the size
+    whenever it fills up.
+
+    Lookups are counted in `metrics` by whether the filter answered
+    them, the post was found, or the filter gave a false positive.
+    """
+
+    MEMORY = ":memory:"
+    CAPACITY = 100000
+    ERROR_RATE = 0.01
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS announced (post_id TEXT PRIMARY KEY)"
+
+    LOOKUPS = "announcer_announced_lookups_total"
+
+    def __init__(
+        self,
+        path: str = MEMORY,
+        capacity: int = CAPACITY,
+        error_rate: float = ERROR_RATE,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self._error_rate = error_rate
+
+        try:
+            self._db = sqlite3.connect(path, isolation_level=None)
+            if path != AnnouncedIndex.MEMORY:
+                self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute(AnnouncedIndex.SCHEMA)
+        except sqlite3.Error as e:
+            raise AnnouncedIndexError(e)
+
+        (self._count,) = self._db.execute("SELECT COUNT(*) FROM announced").fetchone()
+        self._filter = self._build_filter(max(capacity, self._count * 2))
+
+        metrics = metrics or MetricsRegistry()
+        lookups = metrics.counter(
+            AnnouncedIndex.LOOKUPS, "Lookups of announced posts, by result", ("result",)
+        )
+        self._filtered = lookups.labels("filtered")
+        self._found = lookups.labels("found")
+        self._false_positives = lookups.labels("false_positive")
+
+    def _build_filter(self, capacity: int) -> BloomFilter:
+        bloom = BloomFilter(capacity, self._error_rate)
+        for (post_id,) in self._db.execute("SELECT post_id FROM announced"):
+            bloom.add(post_id)
+        return bloom
+
+    def add(self, post_ids: Iterable[str]) -> None:
+        post_ids = list(post_ids)
+
+        with self._db:
+            self._db.execute("BEGIN")
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO announced (post_id) VALUES (?)",
+                ((post_id,) for post_id in post_ids),
+            )
+            self._count += self._db.total_changes - before
+
+        if self._count > self._filter.capacity:
+            self._filter = self._build_filter(
+                max(self._filter.capacity, self._count) * 2
+            )
+            return
+
+        for post_id in post_ids:
+            self._filter.add(post_id)
+
+    def __contains__(self, post_id: object) -> bool:
+        if post_id not in self._filter:
+            self._filtered.inc()
+            return False
+
+        found = (
+            self._db.execute(
+                "SELECT 1 FROM announced WHERE post_id = ?", (post_id,)
+            ).fetchone()
+            is not None
+        )
+        (self._found if found else self._false_positives).inc()
+        return found
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._db.close()
@@ -1,10 +1,11 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, NamedTuple, Optional
 
 import aiohttp
 from aiohttp.client_exceptions import ClientConnectionError
 
-from dataclasses import dataclass
+from announcer.api.session import HttpPool, RequestMetrics
+from announcer.metrics import MetricsRegistry
 
 
 class AccountsApiError(Exception):
@@ -15,8 +16,7 @@ class InvalidResponse(AccountsApiError):
     pass
 
 
-@dataclass
-class User:
+class User(NamedTuple):
     username: str
     email: str
     admin: bool
@@ -27,8 +27,20 @@ class User:
 class AccountsApi:
     TIMEOUT = 3
 
-    def __init__(self, address: str) -> None:
+    def __init__(
+        self,
+        address: str,
+        pool: Optional[HttpPool] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
         self._address = address
+        self._pool = pool
+        self._metrics = RequestMetrics("accounts", metrics)
+
+    def _session(self):
+        if self._pool:
+            return self._pool.borrow()
+        return aiohttp.ClientSession()
 
     def _decode_user(self, user_data: Dict[str, Any]):
         return User(
@@ -51,7 +63,11 @@ class AccountsApi:
             raise InvalidResponse("Could not decode response json")
 
     async def get_accounts(self, query) -> List[User]:
-        async with aiohttp.ClientSession() as session:
+        with self._metrics.track("list", AccountsApiError):
+            return await self._get_accounts(query)
+
+    async def _get_accounts(self, query) -> List[User]:
+        async with self._session() as session:
             data = await self._get_response(
                 session.get(self._address + "/v1/accounts", params=query)
             )
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+from announcer.metrics import MetricsRegistry
+
+T = TypeVar("T")
+
+
+class RefreshingCache(Generic[T]):
+    """
+    Caches the result of an async loader for `ttl` seconds.
+
+    Once the value is older than `ttl` it is still served, and a refresh
+    is started in the background so the caller never waits on the
+    upstream service. If the refresh fails the stale value keeps being
+    served until it is older than `max_stale`, after which callers
+    have to wait for a fresh load again.
+
+    Lookups, by whether they were fresh, stale or missed, and failed
+    refreshes are counted in `metrics`, labelled with the cache's `name`.
+    """
+
+    TTL = 300.0
+    MAX_STALE = 24 * 60 * 60.0
+
+    LOOKUPS = "announcer_cache_lookups_total"
+    REFRESH_ERRORS = "announcer_cache_refresh_errors_total"
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[T]],
+        ttl: float = TTL,
+        max_stale: float = MAX_STALE,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "cache",
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self._log = logging.getLogger(RefreshingCache.__name__)
+        self._loader = loader
+        self._ttl = ttl
+        self._max_stale = max_stale
+        self._clock = clock
+
+        self._value: Optional[T] = None
+        self._loaded_at: Optional[float] = None
+        self._loading: Optional[asyncio.Future] = None
+
+        metrics = metrics or MetricsRegistry()
+        lookups = metrics.counter(
+            RefreshingCache.LOOKUPS,
+            "Lookups of cached values, by result",
+            ("cache", "result"),
+        )
+        self._hits = lookups.labels(name, "hit")
+        self._stale_hits = lookups.labels(name, "stale")
+        self._misses = lookups.labels(name, "miss")
+        self._refresh_errors = metrics.counter(
+            RefreshingCache.REFRESH_ERRORS,
+            "Background refreshes of cached values which failed",
+            ("cache",),
+        ).labels(name)
+
+    @property
+    def age(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return self._clock() - self._loaded_at
+
+    async def _load(self) -> T:
+        try:
+            value = await self._loader()
+        finally:
+            self._loading = None
+
+        self._value = value
+        self._loaded_at = self._clock()
+        return value
+
+    def _start_load(self) -> asyncio.Future:
+        # Concurrent callers share a single request to the upstream
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+            # Nobody may be left waiting on the load, so its error is
+            # retrieved here to keep it from being reported as unhandled
+            self._loading.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return self._loading
+
+    def _refresh_done(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is not None:
+            self._refresh_errors.inc()
+            self._log.warning(f"Could not refresh, serving stale value: {error}")
+
+    async def get(self) -> T:
+        age = self.age
+
+        if age is not None and age < self._ttl:
+            self._hits.inc()
+            assert self._value is not None
+            return self._value
+
+        if age is not None and age < self._max_stale:
+            self._stale_hits.inc()
+            if self._loading is None:
+                self._start_load().add_done_callback(self._refresh_done)
+            assert self._value is not None
+            return self._value
+
+        self._misses.inc()
+
+        # Shielded so that a cancelled caller doesn't abandon a load
+        # other callers may be waiting on
+        return await asyncio.shield(self._start_load())
@@ -0,0 +1,56 @@
+import datetime
+import re
+from typing import Optional
+
+from dateutil import tz
+from dateutil.parser import parse
+
+_ISO_8601 = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})"
+    r"(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6}))?)?"
+    r"(Z|[+-]\d{2}(?::?\d{2})?)?)?$"
+)
+_UTC = tz.tzutc()
+
+
+def _timezone(designator: Optional[str]) -> Optional[datetime.tzinfo]:
+    if designator is None:
+        return None
+    if designator == "Z":
+        return _UTC
+
+    sign = -1 if designator[0] == "-" else 1
+    digits = designator[1:].replace(":", "")
+    offset = int(digits[:2]) * 3600 + int(digits[2:] or 0) * 60
+    if offset == 0:
+        return _UTC
+    # tzoffset instances are cached by dateutil
+    return tz.tzoffset(None, sign * offset)
+
+
+def parse_date(value: str) -> datetime.datetime:
+    """
+    Parse an ISO-8601 date, as sent by the posts service, to a date
+    equal to the one dateutil would give. Anything else is left to
+    dateutil's much slower parser.
+    """
+    match = _ISO_8601.match(value)
+    if match is None:
+        return parse(value)
+
+    year, month, day, hour, minute, second, fraction, designator = match.groups()
+    try:
+        return datetime.datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour or 0),
+            int(minute or 0),
+            int(second or 0),
+            int(fraction.ljust(6, "0")) if fraction else 0,
+            _timezone(designator),
+        )
+    except ValueError:
+        # Out of range, which dateutil may still make sense of, or
+        # reject with its own error
+        return parse(value)
@@ -1,26 +1,126 @@
+import asyncio
 import datetime
 import json
-from typing import List
+import sys
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlencode
 
 import aiohttp
-from aiohttp.client_exceptions import ClientConnectionError
-from dateutil.parser import parse
+from aiohttp.client_exceptions import ClientError, ContentTypeError
 
 from dataclasses import dataclass
 
+from announcer.api.dates import parse_date
+from announcer.api.session import HttpPool, RequestMetrics
+from announcer.metrics import MetricsRegistry
+from announcer.api.stream import iter_json_array
+
 
-@dataclass
 class Post:
-    id: str
-    author: str
-    title: str
-    content: str
-    num_images: int
-    date: datetime.datetime
-    approved: bool = False
-    pinned: bool = False
-    notified: bool = False
-    approval_requested: bool = False
+    """
+    A post from the posts service. The date may be given as the string
+    the service sent, in which case it is only parsed when first read.
+
+    Posts are slotted, and share author strings, as tens of thousands
+    of them can be held at once.
+    """
+
+    __slots__ = (
+        "id",
+        "author",
+        "title",
+        "content",
+        "num_images",
+        "_date",
+        "approved",
+        "pinned",
+        "notified",
+        "approval_requested",
+    )
+
+    # Attribute names, and the posts service's names for them
+    FIELDS = {
+        "id": "id",
+        "author": "author",
+        "title": "title",
+        "content": "content",
+        "num_images": "numImages",
+        "date": "date",
+        "approved": "approved",
+        "pinned": "pinned",
+        "notified": "notified",
+        "approval_requested": "approvalRequested",
+    }
+
+    # Values of the fields which weren't requested
+    DEFAULTS: Dict[str, Any] = {
+        "author": "",
+        "title": "",
+        "content": "",
+        "num_images": 0,
+        "date": datetime.datetime.min,
+        "approved": False,
+        "pinned": False,
+        "notified": False,
+        "approval_requested": False,
+    }
+
+    def __init__(
+        self,
+        id: str,
+        author: str,
+        title: str,
+        content: str,
+        num_images: int,
+        date: Union[datetime.datetime, str],
+        approved: bool = False,
+        pinned: bool = False,
+        notified: bool = False,
+        approval_requested: bool = False,
+    ) -> None:
+        self.id = id
+        self.author = sys.intern(author)
+        self.title = title
+        self.content = content
+        self.num_images = num_images
+        self._date = date
+        self.approved = approved
+        self.pinned = pinned
+        self.notified = notified
+        self.approval_requested = approval_requested
+
+    @property
+    def date(self) -> datetime.datetime:
+        if isinstance(self._date, str):
+            self._date = parse_date(self._date)
+        return self._date
+
+    @date.setter
+    def date(self, date: Union[datetime.datetime, str]) -> None:
+        self._date = date
+
+    def _values(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in Post.FIELDS)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Post):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in Post.FIELDS)
+        return f"Post({values})"
 
 
 class PostsApiError(Exception):
@@ -31,59 +131,211 @@ class InvalidResponse(PostsApiError):
     pass
 
 
+class BulkUnsupported(PostsApiError):
+    pass
+
+
+@dataclass
+class _CachedResponse:
+    """
+    Validators from the last response to a query, so that the query
+    can be repeated as a conditional request
+    """
+
+    since: Optional[datetime.datetime]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    posts: List[Post]
+
+    def request_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
 class PostsApi:
     TIMEOUT = 3
     POSTS_KEY = "posts"
     SUCCESS_KEY = "success"
+    SINCE_PARAM = "since"
+    FIELDS_PARAM = "fields"
+    CHUNK_SIZE = 16 * 1024
 
-    def __init__(self, address: str) -> None:
+    def __init__(
+        self,
+        address: str,
+        pool: Optional[HttpPool] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
         self._address = address
+        self._pool = pool
+        self._cached_responses: Dict[str, _CachedResponse] = {}
+        self._metrics = RequestMetrics("posts", metrics)
 
-    def _decode_post(self, post_data):
-        return Post(
-            id=post_data["id"],
-            author=post_data["author"],
-            title=post_data["title"],
-            content=post_data["content"],
-            num_images=post_data["numImages"],
-            date=parse(post_data["date"]),
-            approved=post_data["approved"],
-            pinned=post_data["pinned"],
-            notified=post_data["notified"],
-            approval_requested=post_data["approvalRequested"],
-        )
+    def _session(self):
+        if self._pool:
+            return self._pool.borrow()
+        return aiohttp.ClientSession()
 
-    async def _get_response(self, request) -> dict:
+    def _decode_post(
+        self, post_data: Dict[str, Any], fields: Optional[Iterable[str]] = None
+    ) -> Post:
+        """
+        Build a post from only the requested fields, leaving the rest at
+        their defaults. The date is kept as a string until it is read.
+        """
+        if fields is None:
+            fields = Post.FIELDS
+
+        values = dict(Post.DEFAULTS)
+        for field in fields:
+            values[field] = post_data[Post.FIELDS[field]]
+        values["id"] = post_data["id"]
+
+        return Post(**values)
+
+    async def _fetch(self, request) -> Tuple[int, Mapping[str, str], Any]:
         try:
             async with request as response:
                 if response.status == 500:
                     raise PostsApiError("Internal server error")
-                return await response.json()
-        except (TimeoutError, ClientConnectionError) as e:
-            raise PostsApiError(e)
-        except json.JSONDecodeError as e:
+                # Not modified, client errors and not implemented have no
+                # json body to decode
+                if response.status in (304, 501) or 400 <= response.status < 500:
+                    return response.status, response.headers, None
+                return response.status, response.headers, await response.json()
+        except (json.JSONDecodeError, ContentTypeError):
             raise InvalidResponse("Could not decode response json")
+        except (asyncio.TimeoutError, TimeoutError, ClientError) as e:
+            raise PostsApiError(e)
 
-    async def get_posts(self, query=None) -> List[Post]:
-        async with aiohttp.ClientSession() as session:
-            data = await self._get_response(
-                session.get(
-                    f"{self._address}/v1/posts", params=query, timeout=PostsApi.TIMEOUT
-                )
+    async def _get_response(self, request) -> dict:
+        _, _, data = await self._fetch(request)
+        return data
+
+    def iter_posts(
+        self,
+        query=None,
+        since: Optional[datetime.datetime] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> AsyncIterator[Post]:
+        """
+        Yield posts matching the query as the response is read,
+        optionally only those posted since the given date.
+
+        If `fields` is given only those fields are asked for and
+        decoded, the others being left at their defaults.
+
+        Queries are sent as conditional requests when the server provided
+        an ETag or Last-Modified header for the previous response, so an
+        unchanged result costs a 304 instead of a download and decode.
+        """
+        # Only reading the response is timed, not whatever the caller
+        # does with each post before asking for the next
+        return self._metrics.track_iter(
+            "list", PostsApiError, self._iter_posts(query, since, fields)
+        )
+
+    async def _iter_posts(
+        self, query, since: Optional[datetime.datetime], fields: Optional[Iterable[str]]
+    ) -> AsyncGenerator[Post, None]:
+        if fields is not None:
+            fields = sorted(set(fields) | {"id"})
+            for field in fields:
+                if field not in Post.FIELDS:
+                    raise ValueError(f"Unknown post field: {field}")
+
+        params = dict(query or {})
+        if fields is not None:
+            params[PostsApi.FIELDS_PARAM] = ",".join(
+                Post.FIELDS[field] for field in fields
             )
+        key = urlencode(sorted(params.items()))
+        if since is not None:
+            params[PostsApi.SINCE_PARAM] = since.isoformat()
+
+        cached = self._cached_responses.get(key)
+        if cached and cached.since != since:
+            cached = None
+
+        # Posts are only held on to if they may be needed to answer a
+        # conditional request later
+        kept: Optional[List[Post]] = None
+
+        try:
+            async with self._session() as session:
+                async with session.get(
+                    f"{self._address}/v1/posts",
+                    params=params,
+                    headers=cached.request_headers() if cached else None,
+                    timeout=PostsApi.TIMEOUT,
+                ) as response:
+                    if response.status == 500:
+                        raise PostsApiError("Internal server error")
+
+                    if response.status == 304:
+                        if not cached:
+                            raise InvalidResponse(
+                                "Not modified response to unconditional request"
+                            )
+                        for post in cached.posts:
+                            yield post
+                        return
+
+                    if 400 <= response.status < 500:
+                        raise InvalidResponse("posts missing from response")
 
-            if PostsApi.POSTS_KEY not in data:
-                raise InvalidResponse("posts missing from response")
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    if etag or last_modified:
+                        kept = []
 
-            posts = []
+                    posts_data = iter_json_array(
+                        response.content.iter_chunked(PostsApi.CHUNK_SIZE),
+                        PostsApi.POSTS_KEY,
+                    )
+                    async for post_data in posts_data:
+                        if not isinstance(post_data, dict):
+                            raise InvalidResponse("Post is not an object")
 
-            for post_data in data[PostsApi.POSTS_KEY]:
-                posts.append(self._decode_post(post_data))
+                        post = self._decode_post(post_data, fields)
+                        if kept is not None:
+                            kept.append(post)
+                        yield post
+        except (asyncio.TimeoutError, TimeoutError, ClientError) as e:
+            # Reads time out with asyncio's error, which isn't the
+            # builtin one before Python 3.11
+            raise PostsApiError(e)
+        except ValueError as e:
+            raise InvalidResponse(f"Could not decode response json: {e}")
+
+        if kept is not None:
+            self._cached_responses[key] = _CachedResponse(
+                since, etag, last_modified, kept
+            )
+        else:
+            self._cached_responses.pop(key, None)
 
-            return posts
+    async def get_posts(
+        self,
+        query=None,
+        since: Optional[datetime.datetime] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> List[Post]:
+        """
+        Get posts matching the query, as `iter_posts`
+        """
+        return [post async for post in self.iter_posts(query, since, fields)]
 
     async def set_approval_requested(self, post_id: str, requested: bool) -> bool:
-        async with aiohttp.ClientSession() as session:
+        with self._metrics.track("mark", PostsApiError):
+            return await self._set_approval_requested(post_id, requested)
+
+    async def _set_approval_requested(self, post_id: str, requested: bool) -> bool:
+        async with self._session() as session:
             data = await self._get_response(
                 session.put(
                     f"{self._address}/v1/posts/{post_id}/approvalRequested",
@@ -92,7 +344,41 @@ class PostsApi:
                 )
             )
 
-            if PostsApi.SUCCESS_KEY not in data:
+            if not isinstance(data, dict) or PostsApi.SUCCESS_KEY not in data:
                 raise InvalidResponse("SUCCESS_KEY missing from response")
 
             return data[PostsApi.SUCCESS_KEY]
+
+    async def set_approval_requested_bulk(
+        self, post_ids: List[str], requested: bool
+    ) -> bool:
+        """
+        Set approval requested on many posts in one request.
+
+        Raises BulkUnsupported if the server has no bulk endpoint, in
+        which case posts have to be set individually.
+        """
+        with self._metrics.track("mark_bulk", PostsApiError):
+            return await self._set_approval_requested_bulk(post_ids, requested)
+
+    async def _set_approval_requested_bulk(
+        self, post_ids: List[str], requested: bool
+    ) -> bool:
+        async with self._session() as session:
+            status, _, data = await self._fetch(
+                session.put(
+                    f"{self._address}/v1/posts/approvalRequested",
+                    json={"ids": post_ids, "approvalRequested": requested},
+                    timeout=PostsApi.TIMEOUT,
+                )
+            )
+
+        # Servers without the endpoint may route it to a single post, or
+        # reject it as a bad request
+        if status in (400, 404, 405, 501):
+            raise BulkUnsupported("Bulk approval requested is not supported")
+
+        if not isinstance(data, dict) or PostsApi.SUCCESS_KEY not in data:
+            raise InvalidResponse("SUCCESS_KEY missing from response")
+
+        return data[PostsApi.SUCCESS_KEY]
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Mapping, Optional
+
+import aiohttp
+from aiohttp.client_exceptions import ClientConnectionError, ServerTimeoutError
+from multidict import CIMultiDict
+from yarl import URL
+
+from announcer.api.session import HttpPool
+from announcer.replay import Recorder, ReplayError, Replayer
+
+KIND = "http"
+
+# Errors the API clients handle, most specific first
+_ERRORS = {
+    "server_timeout": ServerTimeoutError,
+    "timeout": asyncio.TimeoutError,
+    "connection": ClientConnectionError,
+}
+
+
+def request_key(
+    method: str,
+    url: str,
+    params: Optional[Mapping[str, Any]] = None,
+    json_body: Any = None,
+) -> str:
+    """
+    Requests are told apart by method, path, query and body, but not by
+    host, so that a recording can be replayed against any address
+    """
+    key = f"{method} {URL(url).raw_path}"
+    if params:
+        key += "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+    if json_body is not None:
+        key += " " + json.dumps(json_body, sort_keys=True, separators=(",", ":"))
+    return key
+
+
+class _Content:
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        for i in range(0, len(self._body), size):
+            yield self._body[i : i + size]
+
+
+class RecordedResponse:
+    """
+    A response read in full, with as much of the interface of an
+    `aiohttp.ClientResponse` as the API clients use
+    """
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = CIMultiDict(headers)
+        self.content = _Content(body)
+        self._body = body
+
+    async def json(self) -> Any:
+        return json.loads(self._body.decode("utf-8"))
+
+
+class _Request:
+    def __init__(self, method: str, url: str, kwargs: Dict[str, Any]) -> None:
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.key = request_key(method, url, kwargs.get("params"), kwargs.get("json"))
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+
+class _RecordingRequest(_Request):
+    def __init__(self, session: "RecordingSession", *args: Any) -> None:
+        super().__init__(*args)
+        self._session = session
+
+    async def __aenter__(self) -> RecordedResponse:
+        recorder = self._session._recorder
+        start = time.perf_counter()
+        try:
+            async with self._session._session.request(
+                self.method, self.url, **self.kwargs
+            ) as response:
+                body = await response.read()
+        except (asyncio.TimeoutError, ClientConnectionError) as e:
+            error = next(name for name, kind in _ERRORS.items() if isinstance(e, kind))
+            recorder.record(KIND, self.key, start, error=error, message=str(e))
+            raise
+
+        recorder.record(
+            KIND,
+            self.key,
+            start,
+            status=response.status,
+            headers=dict(response.headers),
+            body=body.decode("utf-8", "replace"),
+        )
+        return RecordedResponse(response.status, response.headers, body)
+
+
+class _ReplayRequest(_Request):
+    def __init__(self, replayer: Replayer, *args: Any) -> None:
+        super().__init__(*args)
+        self._replayer = replayer
+
+    async def __aenter__(self) -> RecordedResponse:
+        try:
+            exchange = await self._replayer.replay(KIND, self.key)
+        except ReplayError as e:
+            # Seen by the API clients like a service that can't be reached
+            raise ClientConnectionError(str(e))
+
+        if "error" in exchange:
+            raise _ERRORS[exchange["error"]](exchange["message"])
+
+        return RecordedResponse(
+            exchange["status"], exchange["headers"], exchange["body"].encode("utf-8")
+        )
+
+
+class RecordingSession:
+    """
+    Makes requests with `session`, reading each response in full and
+    recording it before handing it back
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, recorder: Recorder) -> None:
+        self._session = session
+        self._recorder = recorder
+
+    def request(self, method: str, url: str, **kwargs: Any) -> _RecordingRequest:
+        return _RecordingRequest(self, method, url, kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> _RecordingRequest:
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> _RecordingRequest:
+        return self.request("PUT", url, **kwargs)
+
+
+class ReplaySession:
+    """
+    Answers requests from a recording, without touching the network
+    """
+
+    def __init__(self, replayer: Replayer) -> None:
+        self._replayer = replayer
+
+    def request(self, method: str, url: str, **kwargs: Any) -> _ReplayRequest:
+        return _ReplayRequest(self._replayer, method, url, kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> _ReplayRequest:
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> _ReplayRequest:
+        return self.request("PUT", url, **kwargs)
+
+
+class RecordingHttpPool(HttpPool):
+    """
+    A pool whose requests and responses are recorded
+    """
+
+    def __init__(self, recorder: Recorder, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._recorder = recorder
+
+    @property
+    def session(self) -> Any:
+        return RecordingSession(super().session, self._recorder)
+
+
+class ReplayHttpPool(HttpPool):
+    """
+    A pool whose requests are answered from a recording
+    """
+
+    def __init__(self, replayer: Replayer) -> None:
+        super().__init__()
+        self._replay_session = ReplaySession(replayer)
+
+    @property
+    def session(self) -> Any:
+        return self._replay_session
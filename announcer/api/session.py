@@ -0,0 +1,148 @@
+import time
+from contextlib import contextmanager
+from typing import AsyncGenerator, Iterator, Optional, Tuple, Type, TypeVar, Union
+
+import aiohttp
+
+from announcer import tracing
+from announcer.metrics import MetricsRegistry, track
+
+T = TypeVar("T")
+
+
+class _BorrowedSession:
+    """
+    Async context manager which hands out the pool's shared session
+    without closing it on exit, so it can be used the same way as a
+    freshly created `aiohttp.ClientSession`
+    """
+
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        self._session = session
+
+    async def __aenter__(self) -> aiohttp.ClientSession:
+        return self._session
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+
+class HttpPool:
+    """
+    Long lived keep-alive connection pool shared between the API clients,
+    so requests reuse TCP (and TLS) connections between ticks instead of
+    paying for a new handshake on every request
+    """
+
+    LIMIT = 100
+    LIMIT_PER_HOST = 0
+    DNS_CACHE_TTL = 10
+
+    def __init__(
+        self,
+        limit: int = LIMIT,
+        limit_per_host: int = LIMIT_PER_HOST,
+        dns_cache_ttl: Optional[int] = DNS_CACHE_TTL,
+    ) -> None:
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # The session is created lazily as aiohttp sessions must
+        # be created inside of a running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                use_dns_cache=self._dns_cache_ttl is not None,
+                ttl_dns_cache=self._dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+
+        return self._session
+
+    def borrow(self) -> _BorrowedSession:
+        return _BorrowedSession(self.session)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+
+
+class RequestMetrics:
+    """
+    Latency and errors of the requests an API client makes to `service`,
+    by operation
+    """
+
+    LATENCY = "announcer_upstream_request_seconds"
+    ERRORS = "announcer_upstream_errors_total"
+
+    def __init__(
+        self, service: str, registry: Optional[MetricsRegistry] = None
+    ) -> None:
+        registry = registry or MetricsRegistry()
+        self._service = service
+        self._latency = registry.histogram(
+            RequestMetrics.LATENCY,
+            "Time taken by requests to other services",
+            ("service", "operation"),
+        )
+        self._errors = registry.counter(
+            RequestMetrics.ERRORS,
+            "Requests to other services which failed",
+            ("service", "operation"),
+        )
+
+    @contextmanager
+    def track(
+        self,
+        operation: str,
+        exceptions: Union[Type[BaseException], Tuple[Type[BaseException], ...]],
+    ) -> Iterator[None]:
+        """
+        Time and trace the request as `<service>.<operation>`
+        """
+        with tracing.span(f"{self._service}.{operation}"), track(
+            self._latency.labels(self._service, operation),
+            self._errors.labels(self._service, operation),
+            exceptions,
+        ):
+            yield
+
+    async def track_iter(
+        self,
+        operation: str,
+        exceptions: Union[Type[BaseException], Tuple[Type[BaseException], ...]],
+        items: AsyncGenerator[T, None],
+    ) -> AsyncGenerator[T, None]:
+        """
+        Yield from `items`, timing and tracing each step as
+        `<service>.<operation>`, so the time the caller spends between
+        items isn't counted as part of the request
+        """
+        name = f"{self._service}.{operation}"
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    with tracing.span(name):
+                        item = await items.__anext__()
+                except StopAsyncIteration:
+                    return
+                except exceptions:
+                    self._errors.labels(self._service, operation).inc()
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            await items.aclose()
+            self._latency.labels(self._service, operation).observe(elapsed)
@@ -0,0 +1,122 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+_DECODER = json.JSONDecoder()
+
+
+class _Buffer:
+    """
+    Text decoded so far from a stream of utf-8 chunks. Text before
+    `pos` has been consumed, and is dropped when more is read.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes]) -> None:
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        if self.eof:
+            return False
+
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            chunk = b""
+
+        self.text = self.text[self.pos :] + self._decoder.decode(chunk, self.eof)
+        self.pos = 0
+        return True
+
+    async def peek(self) -> str:
+        while True:
+            whitespace = _WHITESPACE.match(self.text, self.pos)
+            assert whitespace is not None
+            self.pos = whitespace.end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                raise ValueError("Unexpected end of JSON")
+
+    async def expect(self, char: str) -> None:
+        if await self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.pos}")
+        self.pos += 1
+
+    async def value(self) -> Any:
+        await self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value is cut off at the end of a chunk
+                if not await self.fill():
+                    raise
+                continue
+
+            # A number at the end of the text may carry on in the next
+            # chunk, even if what was read so far is a shorter number
+            if isinstance(value, (int, float)):
+                tail = _NUMBER_TAIL.match(self.text, end)
+                assert tail is not None
+                if tail.end() == len(self.text) and await self.fill():
+                    continue
+
+            self.pos = end
+            return value
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes], key: str) -> AsyncIterator[Any]:
+    """
+    Yield the elements of the array under `key` in a JSON object, as
+    the object is read from `chunks`. Only one element is held in
+    memory at a time. Raises ValueError if the JSON is invalid, or has
+    no such array.
+    """
+    buffer = _Buffer(chunks)
+    found = False
+
+    await buffer.expect("{")
+    if await buffer.peek() == "}":
+        raise ValueError(f"{key} missing from JSON")
+
+    while True:
+        name = await buffer.value()
+        if not isinstance(name, str):
+            raise ValueError(f"Expected a key at {buffer.pos}")
+        await buffer.expect(":")
+
+        if name == key and await buffer.peek() == "[":
+            found = True
+            buffer.pos += 1
+
+            if await buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    yield await buffer.value()
+                    separator = await buffer.peek()
+                    buffer.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"Expected ',' or ']' at {buffer.pos}")
+        else:
+            await buffer.value()
+
+        separator = await buffer.peek()
+        buffer.pos += 1
+        if separator == "}":
+            break
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' at {buffer.pos}")
+
+    if not found:
+        raise ValueError(f"{key} missing from JSON")
@@ -5,6 +5,9 @@ import asynctest
 from aioresponses import aioresponses
 
 from announcer.api.accounts import AccountsApi, AccountsApiError, InvalidResponse, User
+from announcer.api.session import HttpPool
+from announcer.metrics import MetricsRegistry
+from announcer.testing import allocated_per_object
 
 
 class TestAccountsApi(asynctest.TestCase):
@@ -46,6 +49,20 @@ class TestAccountsApi(asynctest.TestCase):
             error = e
         assert type(error) == AccountsApiError
 
+    @aioresponses()
+    async def test_metrics(self, m) -> None:
+        m.get(TestAccountsApi.ADDRESS + "/v1/accounts?type=admin", status=500)
+        registry = MetricsRegistry()
+        client = AccountsApi(TestAccountsApi.ADDRESS, metrics=registry)
+
+        with self.assertRaises(AccountsApiError):
+            await client.get_accounts({"type": "admin"})
+
+        self.assertIn(
+            'announcer_upstream_errors_total{service="accounts",operation="list"} 1\n',
+            registry.render(),
+        )
+
     @aioresponses()
     async def test_get_accounts_server_error(self, m) -> None:
         m.get(TestAccountsApi.ADDRESS + "/v1/accounts?type=admin", status=500)
@@ -78,3 +95,33 @@ class TestAccountsApi(asynctest.TestCase):
             error = e
 
         assert type(error) == InvalidResponse
+
+    @aioresponses()
+    async def test_get_accounts_pooled(self, m: aioresponses) -> None:
+        pool = HttpPool()
+        client = AccountsApi(TestAccountsApi.ADDRESS, pool)
+
+        m.get(
+            TestAccountsApi.ADDRESS + "/v1/accounts?type=admin",
+            payload={"accounts": []},
+        )
+
+        users = await client.get_accounts({"type": "admin"})
+        self.assertEqual(users, [])
+        self.assertFalse(pool.session.closed)
+
+        await pool.close()
+
+
+class TestUser(unittest.TestCase):
+    def test_compact(self) -> None:
+        user = User("test", "test@test.com", True, "first", "last")
+
+        self.assertFalse(hasattr(user, "__dict__"))
+        self.assertEqual(user, User(*user))
+
+        # The same user as a dataclass, with a __dict__, takes about 180
+        size = allocated_per_object(
+            lambda i: User("test", "test@test.com", True, "first", "last")
+        )
+        self.assertLess(size, 140)
@@ -0,0 +1,176 @@
+import asyncio
+from typing import Any, List
+
+import asynctest
+
+from announcer.api.accounts import AccountsApiError
+from announcer.api.cache import RefreshingCache
+from announcer.metrics import MetricsRegistry
+
+
+class TestRefreshingCache(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.now = 1000.0
+        self.loads = 0
+        self.results: List[Any] = []
+        self.registry = MetricsRegistry()
+
+    def clock(self) -> float:
+        return self.now
+
+    async def loader(self) -> Any:
+        self.loads += 1
+        result = self.results.pop(0)
+        if isinstance(result, asyncio.Future):
+            result = await result
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def generate_cache(self) -> RefreshingCache:
+        return RefreshingCache(
+            self.loader,
+            ttl=10,
+            max_stale=100,
+            clock=self.clock,
+            name="test",
+            metrics=self.registry,
+        )
+
+    def count(self, series: str) -> float:
+        for line in self.registry.render().splitlines():
+            name, value = line.rsplit(" ", 1)
+            if name == series:
+                return float(value)
+        return 0.0
+
+    def lookups(self, result: str) -> float:
+        return self.count(
+            f'{RefreshingCache.LOOKUPS}{{cache="test",result="{result}"}}'
+        )
+
+    def refresh_errors(self) -> float:
+        return self.count(f'{RefreshingCache.REFRESH_ERRORS}{{cache="test"}}')
+
+    async def test_get_caches_value(self) -> None:
+        cache = self.generate_cache()
+        self.results = ["value"]
+
+        self.assertIsNone(cache.age)
+        self.assertEqual(await cache.get(), "value")
+        self.now += 5
+        self.assertEqual(await cache.get(), "value")
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(cache.age, 5)
+        self.assertEqual(self.lookups("hit"), 1)
+        self.assertEqual(self.lookups("stale"), 0)
+        self.assertEqual(self.lookups("miss"), 1)
+        self.assertEqual(self.refresh_errors(), 0)
+
+    async def test_get_miss_error(self) -> None:
+        cache = self.generate_cache()
+        self.results = [AccountsApiError("Down")]
+
+        with self.assertRaises(AccountsApiError):
+            await cache.get()
+
+        self.assertIsNone(cache.age)
+
+    async def test_get_stale_refreshes_in_background(self) -> None:
+        cache = self.generate_cache()
+        refresh: asyncio.Future = asyncio.Future()
+        self.results = ["old", refresh]
+
+        await cache.get()
+        self.now += 11
+
+        # The stale value is returned without waiting for the refresh
+        self.assertEqual(await cache.get(), "old")
+        self.assertEqual(await cache.get(), "old")
+        await asyncio.sleep(0)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.lookups("stale"), 2)
+
+        refresh.set_result("new")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(await cache.get(), "new")
+        self.assertEqual(cache.age, 0)
+        self.assertEqual(self.lookups("hit"), 1)
+
+    async def test_get_stale_refresh_error(self) -> None:
+        cache = self.generate_cache()
+        self.results = ["old", AccountsApiError("Down"), "new"]
+
+        await cache.get()
+        self.now += 50
+
+        self.assertEqual(await cache.get(), "old")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual(self.refresh_errors(), 1)
+
+        # Still serving stale data, and trying again
+        self.assertEqual(await cache.get(), "old")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual(await cache.get(), "new")
+
+    async def test_get_too_stale(self) -> None:
+        cache = self.generate_cache()
+        self.results = ["old", AccountsApiError("Down")]
+
+        await cache.get()
+        self.now += 100
+
+        with self.assertRaises(AccountsApiError):
+            await cache.get()
+        self.assertEqual(self.lookups("miss"), 2)
+
+    async def test_get_shares_load(self) -> None:
+        cache = self.generate_cache()
+        load: asyncio.Future = asyncio.Future()
+        self.results = [load]
+
+        first = asyncio.ensure_future(cache.get())
+        second = asyncio.ensure_future(cache.get())
+        await asyncio.sleep(0)
+
+        load.set_result("value")
+        self.assertEqual(await first, "value")
+        self.assertEqual(await second, "value")
+        self.assertEqual(self.loads, 1)
+
+    async def test_cancelled_get_keeps_loading(self) -> None:
+        cache = self.generate_cache()
+        load: asyncio.Future = asyncio.Future()
+        self.results = [load]
+
+        getter = asyncio.ensure_future(cache.get())
+        await asyncio.sleep(0)
+        getter.cancel()
+        await asyncio.sleep(0)
+
+        load.set_result("value")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(await cache.get(), "value")
+        self.assertEqual(self.loads, 1)
+
+    async def test_refresh_cancelled(self) -> None:
+        cache = self.generate_cache()
+        self.results = ["old", asyncio.Future()]
+
+        await cache.get()
+        self.now += 11
+        await cache.get()
+
+        assert cache._loading is not None
+        cache._loading.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.refresh_errors(), 0)
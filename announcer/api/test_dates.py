@@ -0,0 +1,56 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from dateutil.parser import parse
+
+from announcer.api.dates import parse_date
+
+
+class TestParseDate(unittest.TestCase):
+    def test_matches_dateutil(self) -> None:
+        for value in (
+            "2018-10-20",
+            "2018-10-20T12:30",
+            "2018-10-20T12:30:15",
+            "2018-10-20 12:30:15",
+            "2018-10-20T12:30:15.5",
+            "2018-10-20T12:30:15,25",
+            "2018-10-20T12:30:15.123456",
+            "2018-10-20T12:30:15.123Z",
+            "2018-10-20T12:30:15+00:00",
+            "2018-10-20T12:30:15+01:00",
+            "2018-10-20T12:30:15-0530",
+            "2018-10-20T12:30:15+02",
+        ):
+            with patch("announcer.api.dates.parse") as mock_parse:
+                date = parse_date(value)
+                mock_parse.assert_not_called()
+
+            self.assertEqual(date, parse(value), msg=value)
+            self.assertEqual(date.utcoffset(), parse(value).utcoffset(), msg=value)
+
+    def test_offsets(self) -> None:
+        self.assertEqual(
+            parse_date("2018-10-20T12:00:00-05:30").utcoffset(),
+            -datetime.timedelta(hours=5, minutes=30),
+        )
+        self.assertEqual(
+            parse_date("2018-10-20T12:00:00Z").utcoffset(), datetime.timedelta(0)
+        )
+        self.assertIsNone(parse_date("2018-10-20T12:00:00").tzinfo)
+
+    def test_falls_back_to_dateutil(self) -> None:
+        for value in (
+            "20 October 2018",
+            "2018-10-20T12:30:15.1234567Z",
+            "2018/10/20 12:30",
+        ):
+            with patch("announcer.api.dates.parse", wraps=parse) as mock_parse:
+                self.assertEqual(parse_date(value), parse(value), msg=value)
+                mock_parse.assert_called_once_with(value)
+
+    def test_invalid(self) -> None:
+        for value in ("2018-13-20", "2018-10-20T25:00:00", "not a date"):
+            with self.assertRaises(ValueError, msg=value):
+                parse_date(value)
@@ -1,10 +1,27 @@
+import asyncio
 import datetime
+import json
 import unittest
+from typing import Any, AsyncIterator
+from unittest.mock import patch
 
 import asynctest
+from aiohttp.client_exceptions import ClientPayloadError
 from aioresponses import aioresponses
+from yarl import URL
 
-from announcer.api.posts import InvalidResponse, Post, PostsApi, PostsApiError
+from announcer import tracing
+from announcer.api.dates import parse_date
+from announcer.metrics import MetricsRegistry
+from announcer.testing import allocated_per_object
+from announcer.tracing import Tracer
+from announcer.api.posts import (
+    BulkUnsupported,
+    InvalidResponse,
+    Post,
+    PostsApi,
+    PostsApiError,
+)
 
 TEST_POSTS_ADDRESS = "http://localhost:3922"
 posts_client = PostsApi(TEST_POSTS_ADDRESS)
@@ -150,6 +167,30 @@ class TestPostsApi(asynctest.TestCase):
 
         assert type(error) == InvalidResponse
 
+    @aioresponses()
+    async def test_set_approval_requested_html_error_page(
+        self, m: aioresponses
+    ) -> None:
+        m.put(
+            TEST_POSTS_ADDRESS + "/v1/posts/post1/approvalRequested",
+            status=502,
+            body="<html>Bad gateway</html>",
+            content_type="text/html",
+        )
+
+        with self.assertRaises(InvalidResponse):
+            await posts_client.set_approval_requested("post1", True)
+
+    @aioresponses()
+    async def test_set_approval_requested_client_error(self, m: aioresponses) -> None:
+        m.put(
+            TEST_POSTS_ADDRESS + "/v1/posts/post1/approvalRequested",
+            exception=ClientPayloadError("Response payload is not completed"),
+        )
+
+        with self.assertRaises(PostsApiError):
+            await posts_client.set_approval_requested("post1", True)
+
     @aioresponses()
     async def test_set_approval_requested_bad_json_response(
         self, m: aioresponses
@@ -165,3 +206,355 @@ class TestPostsApi(asynctest.TestCase):
             error = e
 
         assert type(error) == InvalidResponse
+
+    @aioresponses()
+    async def test_get_posts_conditional(self, m: aioresponses) -> None:
+        client = PostsApi(TEST_POSTS_ADDRESS)
+        mock_post = {
+            "id": "asdasd",
+            "date": datetime.datetime.now().isoformat(),
+            "title": "test",
+            "author": "me",
+            "content": "test",
+            "approved": False,
+            "approvalRequested": False,
+            "numImages": 0,
+            "notified": False,
+            "pinned": False,
+        }
+        url = TEST_POSTS_ADDRESS + "/v1/posts?approved=false"
+        m.get(
+            url,
+            payload={"posts": [mock_post]},
+            headers={"ETag": '"v1"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        )
+        m.get(url, status=304)
+
+        posts = await client.get_posts(query={"approved": "false"})
+        not_modified_posts = await client.get_posts(query={"approved": "false"})
+
+        self.assertEqual(not_modified_posts, posts)
+        requests = m.requests[("GET", URL(url))]
+        self.assertIsNone(requests[0].kwargs["headers"])
+        self.assertEqual(
+            requests[1].kwargs["headers"],
+            {
+                "If-None-Match": '"v1"',
+                "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+            },
+        )
+
+    @aioresponses()
+    async def test_get_posts_conditional_dropped(self, m: aioresponses) -> None:
+        client = PostsApi(TEST_POSTS_ADDRESS)
+        url = TEST_POSTS_ADDRESS + "/v1/posts"
+        m.get(url, payload={"posts": []}, headers={"ETag": '"v1"'})
+        m.get(url, payload={"posts": []})
+        m.get(url, payload={"posts": []})
+
+        await client.get_posts()
+        await client.get_posts()
+        await client.get_posts()
+
+        # The server stopped sending validators, so we stop sending conditions
+        requests = m.requests[("GET", URL(url))]
+        self.assertEqual(requests[1].kwargs["headers"], {"If-None-Match": '"v1"'})
+        self.assertIsNone(requests[2].kwargs["headers"])
+
+    @aioresponses()
+    async def test_get_posts_unexpected_not_modified(self, m: aioresponses) -> None:
+        m.get(TEST_POSTS_ADDRESS + "/v1/posts", status=304)
+
+        with self.assertRaises(InvalidResponse):
+            await posts_client.get_posts()
+
+    @aioresponses()
+    async def test_get_posts_since(self, m: aioresponses) -> None:
+        client = PostsApi(TEST_POSTS_ADDRESS)
+        since = datetime.datetime(2018, 11, 3, 12, 30)
+        url = TEST_POSTS_ADDRESS + "/v1/posts?approved=false"
+        since_url = url + "&since=2018-11-03T12:30:00"
+        m.get(url, payload={"posts": []}, headers={"ETag": '"v1"'})
+        m.get(since_url, payload={"posts": []})
+
+        await client.get_posts(query={"approved": "false"})
+        await client.get_posts(query={"approved": "false"}, since=since)
+
+        # Validators only apply to the same cursor
+        requests = m.requests[("GET", URL(since_url))]
+        self.assertIsNone(requests[0].kwargs["headers"])
+
+    @aioresponses()
+    async def test_set_approval_requested_bulk(self, m: aioresponses) -> None:
+        url = TEST_POSTS_ADDRESS + "/v1/posts/approvalRequested"
+        m.put(url, payload={"success": True})
+
+        success = await posts_client.set_approval_requested_bulk(["a", "b"], True)
+
+        self.assertTrue(success)
+        request = m.requests[("PUT", URL(url))][0]
+        self.assertEqual(
+            request.kwargs["json"], {"ids": ["a", "b"], "approvalRequested": True}
+        )
+
+    @aioresponses()
+    async def test_set_approval_requested_bulk_unsupported(
+        self, m: aioresponses
+    ) -> None:
+        url = TEST_POSTS_ADDRESS + "/v1/posts/approvalRequested"
+        statuses = (400, 404, 405, 501)
+        for status in statuses:
+            m.put(url, status=status, body="Unsupported", content_type="text/plain")
+
+        for status in statuses:
+            with self.assertRaises(BulkUnsupported):
+                await posts_client.set_approval_requested_bulk(["a"], True)
+
+    @aioresponses()
+    async def test_set_approval_requested_bulk_bad_json_response(
+        self, m: aioresponses
+    ) -> None:
+        m.put(
+            TEST_POSTS_ADDRESS + "/v1/posts/approvalRequested", payload={"weird": True}
+        )
+
+        with self.assertRaises(InvalidResponse):
+            await posts_client.set_approval_requested_bulk(["a"], True)
+
+    @aioresponses()
+    async def test_iter_posts(self, m: aioresponses) -> None:
+        mock_posts = [
+            {
+                "id": f"post{i}",
+                "date": "2018-10-20T12:00:00",
+                "title": "test",
+                "author": "me",
+                "content": "test",
+                "approved": False,
+                "approvalRequested": False,
+                "numImages": 0,
+                "notified": False,
+                "pinned": False,
+            }
+            for i in range(3)
+        ]
+        m.get(TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": mock_posts})
+
+        ids = [post.id async for post in PostsApi(TEST_POSTS_ADDRESS).iter_posts()]
+        self.assertEqual(ids, ["post0", "post1", "post2"])
+
+    @aioresponses()
+    async def test_get_posts_fields(self, m: aioresponses) -> None:
+        url = TEST_POSTS_ADDRESS + "/v1/posts"
+        m.get(
+            url + "?fields=date,id,title",
+            payload={"posts": [{"id": "a", "title": "test", "date": "2018-10-20"}]},
+        )
+
+        posts = await PostsApi(TEST_POSTS_ADDRESS).get_posts(fields=["title", "date"])
+
+        self.assertEqual(posts[0].id, "a")
+        self.assertEqual(posts[0].title, "test")
+        self.assertEqual(posts[0].content, "")
+        self.assertEqual(posts[0].date, datetime.datetime(2018, 10, 20))
+
+        with self.assertRaises(ValueError):
+            await PostsApi(TEST_POSTS_ADDRESS).get_posts(fields=["colour"])
+
+    @aioresponses()
+    async def test_get_posts_bad_post(self, m: aioresponses) -> None:
+        m.get(TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": ["post"]})
+
+        with self.assertRaises(InvalidResponse):
+            await PostsApi(TEST_POSTS_ADDRESS).get_posts()
+
+    @aioresponses()
+    async def test_metrics(self, m: aioresponses) -> None:
+        url = TEST_POSTS_ADDRESS + "/v1/posts"
+        m.get(url, payload={"posts": []})
+        m.get(url, status=500)
+        registry = MetricsRegistry()
+        api = PostsApi(TEST_POSTS_ADDRESS, metrics=registry)
+
+        await api.get_posts()
+        with self.assertRaises(PostsApiError):
+            await api.get_posts()
+
+        metrics = registry.render()
+        self.assertIn(
+            'announcer_upstream_request_seconds_count{service="posts",operation="list"} 2\n',
+            metrics,
+        )
+        self.assertIn(
+            'announcer_upstream_errors_total{service="posts",operation="list"} 1\n',
+            metrics,
+        )
+
+    @aioresponses()
+    async def test_spans(self, m: aioresponses) -> None:
+        m.get(TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": []})
+        tracer = Tracer()
+        tracer.enabled = True
+
+        with patch("announcer.tracing.tracer", tracer):
+            await PostsApi(TEST_POSTS_ADDRESS).get_posts()
+
+        self.assertEqual([span.name for span in tracer.spans], ["posts.list"])
+
+    @aioresponses()
+    async def test_consumer_time_not_tracked(self, m: aioresponses) -> None:
+        mock_post = {
+            "id": "asdasd",
+            "date": datetime.datetime.now().isoformat(),
+            "title": "test",
+            "author": "me",
+            "content": "test",
+            "approved": True,
+            "approvalRequested": True,
+            "numImages": 0,
+            "notified": False,
+            "pinned": False,
+        }
+        m.get(
+            TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": [mock_post, mock_post]}
+        )
+        registry = MetricsRegistry()
+        tracer = Tracer()
+        tracer.enabled = True
+
+        with patch("announcer.tracing.tracer", tracer):
+            async for _ in PostsApi(TEST_POSTS_ADDRESS, metrics=registry).iter_posts():
+                with tracing.span("consumer"):
+                    await asyncio.sleep(0.1)
+
+        # Each read of the response is its own span, and the caller's
+        # work between posts isn't part of any of them
+        spans = tracer.spans
+        self.assertEqual(
+            [span.name for span in spans if span.name == "posts.list"],
+            ["posts.list"] * 3,
+        )
+        for span in spans:
+            self.assertIsNone(span.parent)
+        self.assertIn(
+            'announcer_upstream_request_seconds_bucket{service="posts",operation="list",le="0.1"} 1\n',
+            registry.render(),
+        )
+
+    @aioresponses()
+    async def test_iter_posts_closed_early(self, m: aioresponses) -> None:
+        mock_post = {
+            "id": "asdasd",
+            "date": datetime.datetime.now().isoformat(),
+            "title": "test",
+            "author": "me",
+            "content": "test",
+            "approved": True,
+            "approvalRequested": True,
+            "numImages": 0,
+            "notified": False,
+            "pinned": False,
+        }
+        m.get(
+            TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": [mock_post, mock_post]}
+        )
+        registry = MetricsRegistry()
+        posts = PostsApi(TEST_POSTS_ADDRESS, metrics=registry).iter_posts()
+
+        await posts.__anext__()
+        await posts.aclose()  # type: ignore
+
+        self.assertIn(
+            'announcer_upstream_request_seconds_count{service="posts",operation="list"} 1\n',
+            registry.render(),
+        )
+
+    @aioresponses()
+    async def test_get_posts_client_error(self, m: aioresponses) -> None:
+        m.get(
+            TEST_POSTS_ADDRESS + "/v1/posts",
+            status=400,
+            body="Bad request",
+            content_type="text/plain",
+        )
+
+        with self.assertRaises(InvalidResponse):
+            await PostsApi(TEST_POSTS_ADDRESS).get_posts()
+
+    @aioresponses()
+    async def test_get_posts_truncated_response(self, m: aioresponses) -> None:
+        m.get(
+            TEST_POSTS_ADDRESS + "/v1/posts",
+            body='{"posts": [{"id": "a"',
+            content_type="application/json",
+        )
+
+        with self.assertRaises(InvalidResponse):
+            await PostsApi(TEST_POSTS_ADDRESS).get_posts()
+
+    @aioresponses()
+    async def test_get_posts_read_timeout(self, m: aioresponses) -> None:
+        m.get(TEST_POSTS_ADDRESS + "/v1/posts", payload={"posts": []})
+
+        async def timing_out(*args: Any) -> AsyncIterator[Any]:
+            yield {"id": "a"}
+            raise asyncio.TimeoutError()
+
+        # The body stops arriving part way through
+        with patch("announcer.api.posts.iter_json_array", timing_out):
+            with self.assertRaises(PostsApiError) as raised:
+                await PostsApi(TEST_POSTS_ADDRESS).get_posts(fields=[])
+
+        self.assertIs(type(raised.exception), PostsApiError)
+
+
+class TestPost(unittest.TestCase):
+    def generate_post(self, date) -> Post:
+        return Post(
+            id="a", author="me", title="test", content="test", num_images=0, date=date
+        )
+
+    def test_lazy_date(self) -> None:
+        post = self.generate_post("2018-10-20T12:00:00")
+
+        with patch("announcer.api.posts.parse_date", wraps=parse_date) as mock_parse:
+            self.assertFalse(mock_parse.called)
+            self.assertEqual(post.date, datetime.datetime(2018, 10, 20, 12))
+            self.assertEqual(post.date, datetime.datetime(2018, 10, 20, 12))
+            self.assertEqual(mock_parse.call_count, 1)
+
+        post.date = datetime.datetime(2018, 1, 1)
+        self.assertEqual(post.date, datetime.datetime(2018, 1, 1))
+
+    def test_equality(self) -> None:
+        post = self.generate_post("2018-10-20T12:00:00")
+
+        self.assertEqual(post, self.generate_post(datetime.datetime(2018, 10, 20, 12)))
+        self.assertNotEqual(post, self.generate_post(datetime.datetime(2018, 1, 1)))
+        self.assertNotEqual(post, "a")
+
+    def test_repr(self) -> None:
+        post = self.generate_post(datetime.datetime(2018, 10, 20))
+        self.assertIn("id='a'", repr(post))
+        self.assertTrue(repr(post).startswith("Post("))
+
+    def test_compact(self) -> None:
+        date = datetime.datetime(2018, 10, 20)
+        post = self.generate_post(date)
+
+        self.assertFalse(hasattr(post, "__dict__"))
+        with self.assertRaises(AttributeError):
+            post.colour = "red"  # type: ignore
+
+        # The same post as a dataclass, with a __dict__, takes about 220
+        size = allocated_per_object(lambda i: self.generate_post(date))
+        self.assertLess(size, 160)
+
+    def test_interns_authors(self) -> None:
+        api = PostsApi(TEST_POSTS_ADDRESS)
+        posts = [
+            api._decode_post(json.loads('{"id": "a", "author": "someone"}'), ["author"])
+            for _ in range(2)
+        ]
+
+        self.assertIs(posts[0].author, posts[1].author)
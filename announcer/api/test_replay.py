@@ -0,0 +1,153 @@
+import asyncio
+import os
+import tempfile
+
+import asynctest
+from aiohttp.client_exceptions import ClientConnectionError, ServerTimeoutError
+from aioresponses import aioresponses
+
+from announcer.api.accounts import AccountsApi, AccountsApiError
+from announcer.api.posts import PostsApi, PostsApiError
+from announcer.api.replay import (
+    RecordingHttpPool,
+    ReplayHttpPool,
+    ReplaySession,
+    request_key,
+)
+from announcer.replay import Recorder, Replayer
+
+TEST_ADDRESS = "http://localhost:3922"
+
+POST = {
+    "id": "post1",
+    "author": "me",
+    "title": "test",
+    "content": "test",
+    "numImages": 0,
+    "date": "2018-10-01T12:00:00Z",
+    "approved": False,
+    "pinned": False,
+    "notified": False,
+    "approvalRequested": False,
+}
+
+USER = {
+    "username": "admin",
+    "email": "admin@test.com",
+    "admin": True,
+    "firstName": "test",
+    "lastName": "test",
+}
+
+
+class TestReplay(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "traffic.jsonl.gz")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_request_key(self) -> None:
+        self.assertEqual(
+            request_key("GET", "http://localhost:2833/v1/posts"), "GET /v1/posts"
+        )
+        self.assertEqual(
+            request_key("GET", "/v1/posts", {"b": "2", "a": "1"}),
+            "GET /v1/posts?a=1&b=2",
+        )
+        self.assertEqual(
+            request_key("PUT", "/v1/posts", json_body={"ids": ["a"], "on": True}),
+            'PUT /v1/posts {"ids":["a"],"on":true}',
+        )
+
+    async def record(self) -> None:
+        recorder = Recorder(self.path)
+        pool = RecordingHttpPool(recorder, limit=10)
+        posts_api = PostsApi(TEST_ADDRESS, pool)
+        accounts_api = AccountsApi(TEST_ADDRESS, pool)
+
+        with aioresponses() as m:
+            m.get(
+                TEST_ADDRESS + "/v1/posts",
+                payload={"posts": [POST]},
+                headers={"ETag": '"1"'},
+            )
+            m.get(TEST_ADDRESS + "/v1/posts", status=304)
+            m.get(
+                TEST_ADDRESS + "/v1/accounts?admin=true", payload={"accounts": [USER]}
+            )
+            m.put(
+                TEST_ADDRESS + "/v1/posts/post1/approvalRequested",
+                payload={"success": True},
+            )
+            m.get(
+                TEST_ADDRESS + "/v1/accounts?admin=false",
+                exception=ClientConnectionError("refused"),
+            )
+
+            self.assertEqual(len(await posts_api.get_posts()), 1)
+            self.assertEqual(len(await posts_api.get_posts()), 1)
+            self.assertEqual(len(await accounts_api.get_accounts({"admin": "true"})), 1)
+            self.assertTrue(await posts_api.set_approval_requested("post1", True))
+            with self.assertRaises(AccountsApiError):
+                await accounts_api.get_accounts({"admin": "false"})
+
+        await pool.close()
+        recorder.close()
+
+    async def test_record_and_replay(self) -> None:
+        await self.record()
+
+        pool = ReplayHttpPool(Replayer(self.path, latency_scale=0))
+        self.assertIs(pool.session, pool.session)
+        posts_api = PostsApi(TEST_ADDRESS, pool)
+        accounts_api = AccountsApi(TEST_ADDRESS, pool)
+
+        # Served without any network access
+        with aioresponses():
+            posts = await posts_api.get_posts()
+            self.assertEqual([post.id for post in posts], ["post1"])
+            self.assertEqual(posts[0].title, "test")
+
+            # A conditional request, answered from the client's cache
+            self.assertEqual(await posts_api.get_posts(), posts)
+
+            users = await accounts_api.get_accounts({"admin": "true"})
+            self.assertEqual(users[0].email, "admin@test.com")
+            self.assertTrue(await posts_api.set_approval_requested("post1", True))
+
+            with self.assertRaises(AccountsApiError):
+                await accounts_api.get_accounts({"admin": "false"})
+
+            # Not recorded
+            with self.assertRaises(PostsApiError):
+                await posts_api.set_approval_requested("post2", True)
+
+        await pool.close()
+
+    async def test_replays_errors(self) -> None:
+        recorder = Recorder(self.path)
+        session = RecordingHttpPool(recorder).session
+
+        errors = {
+            "/server_timeout": ServerTimeoutError("slow"),
+            "/timeout": asyncio.TimeoutError(),
+            "/connection": ClientConnectionError("refused"),
+        }
+        with aioresponses() as m:
+            for path, error in errors.items():
+                m.get(TEST_ADDRESS + path, exception=error)
+                with self.assertRaises(type(error)):
+                    async with session.get(TEST_ADDRESS + path):
+                        pass
+
+        await session._session.close()
+        recorder.close()
+
+        session = ReplaySession(Replayer(self.path, latency_scale=0))
+        for path, error in errors.items():
+            with self.assertRaises(type(error)) as raised:
+                async with session.get(TEST_ADDRESS + path):
+                    pass
+            self.assertIs(type(raised.exception), type(error))
@@ -0,0 +1,79 @@
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import asynctest
+from aioresponses import aioresponses
+
+from announcer.api.posts import PostsApi
+from announcer.api.session import HttpPool
+
+
+class TestHttpPool(asynctest.TestCase):
+    async def test_session_is_shared(self) -> None:
+        pool = HttpPool()
+
+        session = pool.session
+        self.assertIs(pool.session, session)
+
+        async with pool.borrow() as borrowed:
+            self.assertIs(borrowed, session)
+
+        # Borrowing must not close the shared session
+        self.assertFalse(session.closed)
+
+        await pool.close()
+
+    @patch("aiohttp.ClientSession", autospec=True)
+    @patch("aiohttp.TCPConnector", autospec=True)
+    def test_session_limits(
+        self, MockTCPConnector: MagicMock, MockClientSession: MagicMock
+    ) -> None:
+        pool = HttpPool(limit=7, limit_per_host=3, dns_cache_ttl=42)
+        MockClientSession.return_value.closed = False
+
+        session = pool.session
+
+        MockTCPConnector.assert_called_with(
+            limit=7, limit_per_host=3, use_dns_cache=True, ttl_dns_cache=42
+        )
+        MockClientSession.assert_called_with(connector=MockTCPConnector.return_value)
+        self.assertIs(pool.session, session)
+
+    async def test_session_without_dns_cache(self) -> None:
+        pool = HttpPool(dns_cache_ttl=None)
+
+        connector: Any = pool.session.connector
+        self.assertFalse(connector.use_dns_cache)
+
+        await pool.close()
+
+    async def test_close(self) -> None:
+        pool = HttpPool()
+
+        # Closing an unused pool does nothing
+        await pool.close()
+
+        session = pool.session
+        await pool.close()
+
+        self.assertTrue(session.closed)
+        self.assertIsNot(pool.session, session)
+
+        await pool.close()
+
+    @aioresponses()
+    async def test_api_uses_pool(self, m: aioresponses) -> None:
+        pool = HttpPool()
+        client = PostsApi("http://localhost:3922", pool)
+
+        m.get("http://localhost:3922/v1/posts", payload={"posts": []})
+        m.get("http://localhost:3922/v1/posts", payload={"posts": []})
+
+        await client.get_posts()
+        session = pool.session
+        await client.get_posts()
+
+        self.assertIs(pool.session, session)
+        self.assertFalse(session.closed)
+
+        await pool.close()
@@ -0,0 +1,61 @@
+from typing import Any, AsyncIterator, List
+
+import asynctest
+
+from announcer.api.stream import iter_json_array
+
+
+async def chunked(data: str, size: int) -> AsyncIterator[bytes]:
+    encoded = data.encode("utf-8")
+    for i in range(0, len(encoded), size):
+        yield encoded[i : i + size]
+
+
+async def decode(data: str, size: int = 1, key: str = "posts") -> List[Any]:
+    return [item async for item in iter_json_array(chunked(data, size), key)]
+
+
+class TestIterJsonArray(asynctest.TestCase):
+    async def test_elements(self) -> None:
+        data = '{"success": true, "posts": [{"id": "a"}, {"id": "b"}], "count": 2}'
+
+        for size in (1, 3, 7, 1000):
+            self.assertEqual(await decode(data, size), [{"id": "a"}, {"id": "b"}])
+
+    async def test_numbers_split_across_chunks(self) -> None:
+        data = '{"count": 12345, "posts": [123, 4.5e10, -0.25, true, "x"]}'
+
+        for size in range(1, 8):
+            self.assertEqual(await decode(data, size), [123, 4.5e10, -0.25, True, "x"])
+
+    async def test_unicode_split_across_chunks(self) -> None:
+        data = '{"posts": ["café \U0001f969"]}'
+
+        self.assertEqual(await decode(data, 1), ["café \U0001f969"])
+
+    async def test_whitespace(self) -> None:
+        data = '\n{ "posts" :\n [ 1 ,\t2 ] \n}\n'
+
+        self.assertEqual(await decode(data, 4), [1, 2])
+
+    async def test_empty_array(self) -> None:
+        self.assertEqual(await decode('{"posts": []}'), [])
+
+    async def test_missing(self) -> None:
+        for data in ("{}", '{"other": []}', '{"posts": {}}'):
+            with self.assertRaises(ValueError):
+                await decode(data)
+
+    async def test_invalid(self) -> None:
+        for data in (
+            "",
+            "[]",
+            '{"posts": [1 2]}',
+            '{"posts": [1], "other" 2}',
+            '{"posts": [1] "other": 2}',
+            '{1: 2, "posts": []}',
+            '{"posts": [1',
+            '{"posts": [{"id": "a"',
+        ):
+            with self.assertRaises(ValueError, msg=data):
+                await decode(data, 3)
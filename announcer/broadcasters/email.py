@@ -1,19 +1,32 @@
 import asyncio
-from email.mime.text import MIMEText
-from typing import List
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
 
 import aiosmtplib
 from aiosmtplib.errors import (
     SMTPAuthenticationError,
     SMTPConnectError,
+    SMTPException,
+    SMTPRecipientRefused,
     SMTPRecipientsRefused,
     SMTPResponseException,
+    SMTPServerDisconnected,
     SMTPTimeoutError,
 )
 
+from dataclasses import dataclass, field
+
+from announcer import tracing
+from announcer.broadcasters.limiter import RateLimiter
+from announcer.broadcasters.pool import SMTPPool, is_disconnect_error
+from announcer.broadcasters.render import MessageRenderer
+from announcer.metrics import MetricsRegistry, track
+
 
 class EmailBroadcasterError(Exception):
-    pass
+    # What was sent before the error, so that it isn't sent again
+    report: Optional["DeliveryReport"] = None
 
 
 class BroadcasterTimeoutError(EmailBroadcasterError):
@@ -28,10 +41,6 @@ class LoginError(EmailBroadcasterError):
     pass
 
 
-class SendError(EmailBroadcasterError):
-    pass
-
-
 class BroadcastEmail:
     def __init__(self, recipients: List[str], subject: str, body: str):
         if len(recipients) is 0:
@@ -49,63 +58,367 @@ class BroadcastEmail:
         )
 
 
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Whether the server rejected a recipient for good (5xx), rather than
+    asking for it to be tried again later
+    """
+    if isinstance(error, SMTPRecipientsRefused):
+        # Refused recipients each carry their own code
+        return bool(error.recipients) and all(
+            is_permanent_error(refused) for refused in error.recipients
+        )
+    return isinstance(error, SMTPResponseException) and 500 <= error.code < 600
+
+
+@dataclass
+class SendFailure:
+    email: BroadcastEmail
+    recipient: str
+    error: Exception
+    permanent: bool = False
+
+
+@dataclass
+class DeliveryReport:
+    """
+    What happened to each recipient of each email in a send
+    """
+
+    DELIVERED = "delivered"
+    TEMPORARY_FAILURE = "temporary_failure"
+    PERMANENT_FAILURE = "permanent_failure"
+
+    delivered: List[Tuple[BroadcastEmail, str]] = field(default_factory=list)
+    failures: List[SendFailure] = field(default_factory=list)
+    # Over the recipient quota, so not tried
+    deferred: List[Tuple[BroadcastEmail, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    @property
+    def temporary_failures(self) -> List[SendFailure]:
+        return [failure for failure in self.failures if not failure.permanent]
+
+    @property
+    def permanent_failures(self) -> List[SendFailure]:
+        return [failure for failure in self.failures if failure.permanent]
+
+    def statuses(self, email: BroadcastEmail) -> Dict[str, str]:
+        """
+        The outcome for each recipient of `email` which was sent to
+        """
+        statuses = {
+            recipient: DeliveryReport.DELIVERED
+            for delivered, recipient in self.delivered
+            if delivered is email
+        }
+        for failure in self.failures:
+            if failure.email is email:
+                statuses[failure.recipient] = (
+                    DeliveryReport.PERMANENT_FAILURE
+                    if failure.permanent
+                    else DeliveryReport.TEMPORARY_FAILURE
+                )
+        return statuses
+
+
+_Job = Tuple[BroadcastEmail, Tuple[str, ...]]
+
+
 class EmailBroadcaster:
-    def __init__(self, host: str, port: int, username: str, password: str) -> None:
-        self._client = aiosmtplib.SMTP(hostname=host, port=port)
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        pool_size: int = 0,
+        idle_timeout: float = SMTPPool.IDLE_TIMEOUT,
+        concurrency: int = 1,
+        recipients_per_message: int = 1,
+        messages_per_second: float = 0,
+        recipients_per_day: int = 0,
+        connections_per_minute: int = 0,
+        metrics: Optional[MetricsRegistry] = None,
+        client_factory: Optional[Callable[..., aiosmtplib.SMTP]] = None,
+    ) -> None:
+        self._host = host
+        self._port = port
         self._username = username
         self._password = password
+        self._concurrency = concurrency
+        self._renderer = MessageRenderer(username)
+        # Builds SMTP clients from a hostname and port, such as those
+        # which record or replay traffic
+        self._client_factory = client_factory
+
+        # Above 1, recipients of an email share one transaction and
+        # are only named in the envelope, like Bcc
+        self._recipients_per_message = max(1, recipients_per_message)
 
-    def _generate_message(self, recipient: str, subject: str, body: str) -> str:
-        msg = MIMEText(body)
-        msg["To"] = recipient
-        msg["From"] = self._username
-        msg["Subject"] = subject
+        # Sends over the provider's quota wait rather than being refused
+        self._limiter = RateLimiter(
+            messages_per_second=messages_per_second,
+            recipients_per_day=recipients_per_day,
+            connections_per_minute=connections_per_minute,
+        )
+
+        metrics = metrics or MetricsRegistry()
+        latency = metrics.histogram(
+            "announcer_smtp_seconds", "Time taken by SMTP commands", ("operation",)
+        )
+        errors = metrics.counter(
+            "announcer_smtp_errors_total", "SMTP commands which failed", ("operation",)
+        )
+        self._metrics = {
+            operation: (latency.labels(operation), errors.labels(operation))
+            for operation in ("connect", "login", "send")
+        }
 
-        return msg.as_string()
+        # A pool size of 0 connects and logs in for every send
+        self._pool: Optional[SMTPPool] = None
+        if pool_size > 0:
+            self._pool = SMTPPool(self._open_client, pool_size, idle_timeout)
+        else:
+            self._client = self._new_client()
+
+    def _new_client(self) -> aiosmtplib.SMTP:
+        if self._client_factory is not None:
+            return self._client_factory(hostname=self._host, port=self._port)
+        return aiosmtplib.SMTP(hostname=self._host, port=self._port)
+
+    def _generate_message(self, recipient: str, subject: str, body: str) -> bytes:
+        with tracing.span("smtp.render"):
+            return self._renderer.render(recipient, subject, body)
+
+    def budget(self) -> Dict[str, Optional[float]]:
+        return self._limiter.budget()
+
+    @contextmanager
+    def _track(self, operation: str) -> Iterator[None]:
+        latency, errors = self._metrics[operation]
+        with tracing.span(f"smtp.{operation}"), track(latency, errors, SMTPException):
+            yield
+
+    async def _login(self, client: aiosmtplib.SMTP) -> None:
+        await self._limiter.acquire_connection()
 
-    async def _send(self, emails: List[BroadcastEmail]) -> None:
         try:
-            await self._client.connect()
-            await self._client.starttls()
+            with self._track("connect"):
+                await client.connect()
+                await client.starttls()
         except SMTPConnectError as e:
             raise ConnectError(e)
         except SMTPTimeoutError as e:
             raise BroadcasterTimeoutError(e)
 
         try:
-            await self._client.login(self._username, self._password)
+            with self._track("login"):
+                await client.login(self._username, self._password)
         except SMTPAuthenticationError as e:
             raise LoginError(e)
         except SMTPTimeoutError as e:
             raise BroadcasterTimeoutError(e)
 
+    async def _open_client(self) -> aiosmtplib.SMTP:
+        client = self._new_client()
+        try:
+            await self._login(client)
+        except:
+            client.close()
+            raise
+
+        return client
+
+    async def _sendmail(
+        self,
+        client: aiosmtplib.SMTP,
+        email: BroadcastEmail,
+        recipients: Tuple[str, ...],
+    ) -> Dict[str, Any]:
+        await self._limiter.acquire_message()
+
+        if len(recipients) == 1:
+            recipient: Union[str, List[str]] = recipients[0]
+            message = self._generate_message(recipients[0], email.subject, email.body)
+        else:
+            # One DATA payload for everyone, addressed to ourselves so
+            # that recipients can't see each other
+            recipient = list(recipients)
+            message = self._generate_message(self._username, email.subject, email.body)
+
+        with self._track("send"):
+            response = await client.sendmail(self._username, recipient, message)
+
+        if not response:
+            return {}
+
+        recipient_errors, _ = response
+        return recipient_errors
+
+    async def _send_job(
+        self, client: aiosmtplib.SMTP, job: _Job, report: DeliveryReport
+    ) -> None:
+        """
+        Send a single message, recording whether each recipient was
+        delivered to. Errors which leave the connection unusable are
+        raised.
+        """
+        email, recipients = job
+        try:
+            recipient_errors = await self._sendmail(client, email, recipients)
+        except SMTPRecipientsRefused as e:
+            recipient_errors = dict.fromkeys(recipients, e)
+            recipient_errors.update(
+                (refused.recipient, refused) for refused in e.recipients
+            )
+        except SMTPResponseException as e:
+            if is_disconnect_error(e):
+                raise
+            recipient_errors = dict.fromkeys(recipients, e)
+
+        for recipient in recipients:
+            error = recipient_errors.get(recipient)
+            if error is None:
+                report.delivered.append((email, recipient))
+                continue
+
+            if not isinstance(error, Exception):
+                code, message = error
+                error = SMTPRecipientRefused(code, message, recipient)
+            report.failures.append(
+                SendFailure(email, recipient, error, is_permanent_error(error))
+            )
+
+    def _generate_jobs(self, emails: List[BroadcastEmail]) -> Deque[_Job]:
+        jobs: Deque[_Job] = deque()
+        batch_size = self._recipients_per_message
+
         for email in emails:
-            for recipient in email.recipients:
-                try:
-                    await self._client.sendmail(
-                        self._username,
-                        recipient,
-                        self._generate_message(recipient, email.subject, email.body),
-                    )
-                except (SMTPRecipientsRefused, SMTPResponseException) as e:
-                    raise SendError(e)
-                except SMTPTimeoutError as e:
-                    raise BroadcasterTimeoutError(e)
+            recipients = sorted(email.recipients)
+            for i in range(0, len(recipients), batch_size):
+                jobs.append((email, tuple(recipients[i : i + batch_size])))
+
+        return jobs
+
+    async def _unpooled_worker(self, jobs: Deque[_Job], report: DeliveryReport) -> None:
+        await self._login(self._client)
+
+        while jobs:
+            try:
+                await self._send_job(self._client, jobs.popleft(), report)
+            except (SMTPResponseException, SMTPServerDisconnected) as e:
+                raise ConnectError(e)
+            except SMTPTimeoutError as e:
+                raise BroadcasterTimeoutError(e)
 
         try:
             await self._client.quit()
         except:
             pass
 
-    async def send(self, emails: List[BroadcastEmail]) -> None:
+    async def _pooled_worker(
+        self, pool: SMTPPool, jobs: Deque[_Job], report: DeliveryReport
+    ) -> None:
+        client = await pool.acquire()
+        held = True
+        try:
+            while jobs:
+                job = jobs.popleft()
+                try:
+                    try:
+                        await self._send_job(client, job, report)
+                    except (SMTPResponseException, SMTPServerDisconnected):
+                        # The server dropped us mid send, so retry
+                        # once on a fresh connection
+                        pool.discard(client)
+                        held = False
+                        client = await pool.acquire()
+                        held = True
+                        await self._send_job(client, job, report)
+                except (SMTPResponseException, SMTPServerDisconnected) as e:
+                    raise ConnectError(e)
+                except SMTPTimeoutError as e:
+                    raise BroadcasterTimeoutError(e)
+        except:
+            if held:
+                pool.discard(client)
+            raise
+
+        pool.release(client)
+
+    async def _send(self, emails: List[BroadcastEmail]) -> DeliveryReport:
+        jobs = self._generate_jobs(emails)
+        report = DeliveryReport()
+
+        # Messages over the recipient quota are held back before any
+        # connection is made, rather than waiting for it to refill
+        ready: Deque[_Job] = deque()
+        while jobs and self._limiter.reserve_recipients(len(jobs[0][1])):
+            ready.append(jobs.popleft())
+        report.deferred.extend(
+            (email, recipient) for email, recipients in jobs for recipient in recipients
+        )
+        jobs = ready
+        if not jobs:
+            return report
+
+        # Each worker owns one connection and pulls messages from the
+        # shared queue, so throughput scales with the number of connections
+        workers = []
+        pool = self._pool
+        if pool:
+            for _ in range(max(1, min(self._concurrency, pool.size, len(jobs)))):
+                workers.append(self._pooled_worker(pool, jobs, report))
+        else:
+            workers.append(self._unpooled_worker(jobs, report))
+
+        results = await asyncio.gather(*workers, return_exceptions=True)
+
+        if any(isinstance(result, BaseException) for result in results):
+            # Messages no worker got to were never sent, so their part
+            # of the quota is given back
+            self._limiter.release_recipients(
+                sum(len(recipients) for _, recipients in jobs)
+            )
+
+        for result in results:
+            if isinstance(result, EmailBroadcasterError):
+                # Other workers may have carried on sending after this
+                # one failed
+                result.report = report
+            if isinstance(result, BaseException):
+                raise result
+
+        return report
+
+    async def send(self, emails: List[BroadcastEmail]) -> DeliveryReport:
+        """
+        Send every email, carrying on past recipients the server refuses.
+        Recipients over the daily quota are `deferred` rather than waited
+        for. Errors with the connection itself are raised, with the
+        `report` of what was sent before them.
+        """
         error = None
+        report = DeliveryReport()
         try:
-            await self._send(emails)
+            report = await self._send(emails)
         except EmailBroadcasterError as e:
             error = e
 
-        self._client.close()
+        # Pooled connections are kept open between sends
+        if not self._pool:
+            self._client.close()
 
         if error:
             assert error is not None
             raise error
+
+        return report
+
+    async def close(self) -> None:
+        if self._pool:
+            await self._pool.close()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Allows `rate` tokens a second on average, with bursts of up to
+    `capacity` tokens. Callers which would take more tokens than are
+    left wait their turn, in the order they arrived.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Rate and capacity must be positive")
+
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def delay(self, tokens: float = 1) -> float:
+        """
+        Seconds until `tokens` tokens are available
+        """
+        self._refill()
+        return max(0.0, (min(tokens, self._capacity) - self._tokens) / self._rate)
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so that the lock belongs to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Take `tokens` tokens if they are available now, without waiting
+        or jumping ahead of callers which are
+        """
+        tokens = min(tokens, self._capacity)
+        if self._lock is not None and self._lock.locked():
+            return False
+        if self.delay(tokens) > 0:
+            return False
+
+        self._tokens -= tokens
+        return True
+
+    def release(self, tokens: float = 1) -> None:
+        """
+        Give back `tokens` tokens which were taken but not used
+        """
+        self._refill()
+        self._tokens = min(self._capacity, self._tokens + tokens)
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        Take `tokens` tokens, waiting until they are available. Returns
+        the number of seconds spent waiting.
+        """
+        # More than the bucket can ever hold would wait forever, so the
+        # request takes a full bucket instead
+        tokens = min(tokens, self._capacity)
+
+        waited = 0.0
+        async with self._get_lock():
+            delay = self.delay(tokens)
+            while delay > 0:
+                await self._sleep(delay)
+                waited += delay
+                delay = self.delay(tokens)
+
+            self._tokens -= tokens
+
+        return waited
+
+
+class RateLimiter:
+    """
+    Keeps sending within the limits of the SMTP provider: messages a
+    second, recipients a day and new connections a minute. A limit of
+    0 is unlimited. Recipients are reserved up front, and the other
+    limits are waited for.
+    """
+
+    DAY = 24 * 60 * 60.0
+    MINUTE = 60.0
+
+    def __init__(
+        self,
+        messages_per_second: float = 0,
+        recipients_per_day: int = 0,
+        connections_per_minute: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self._log = logging.getLogger(RateLimiter.__name__)
+
+        self._messages: Optional[TokenBucket] = None
+        if messages_per_second > 0:
+            self._messages = TokenBucket(
+                messages_per_second, max(1.0, messages_per_second), clock, sleep
+            )
+
+        self._recipients: Optional[TokenBucket] = None
+        if recipients_per_day > 0:
+            self._recipients = TokenBucket(
+                recipients_per_day / RateLimiter.DAY, recipients_per_day, clock, sleep
+            )
+
+        self._connections: Optional[TokenBucket] = None
+        if connections_per_minute > 0:
+            self._connections = TokenBucket(
+                connections_per_minute / RateLimiter.MINUTE,
+                connections_per_minute,
+                clock,
+                sleep,
+            )
+
+        self.waited = 0.0
+
+    async def _acquire(
+        self, name: str, bucket: Optional[TokenBucket], tokens: float
+    ) -> None:
+        if bucket is None:
+            return
+
+        delay = bucket.delay(tokens)
+        if delay > 0:
+            self._log.info(f"Over the {name} limit, waiting {delay:.1f}s")
+
+        self.waited += await bucket.acquire(tokens)
+
+    def reserve_recipients(self, recipients: int) -> bool:
+        """
+        Take `recipients` from the daily quota if they fit in it now.
+        The quota can take hours to refill, so this never waits.
+        """
+        if self._recipients is None:
+            return True
+        return self._recipients.try_acquire(recipients)
+
+    def release_recipients(self, recipients: int) -> None:
+        """
+        Return reserved recipients which were never sent to
+        """
+        if self._recipients is not None:
+            self._recipients.release(recipients)
+
+    async def acquire_message(self) -> None:
+        """
+        Wait until a message can be sent
+        """
+        await self._acquire("messages", self._messages, 1)
+
+    async def acquire_connection(self) -> None:
+        """
+        Wait until a new connection can be opened
+        """
+        await self._acquire("connections", self._connections, 1)
+
+    def budget(self) -> Dict[str, Optional[float]]:
+        """
+        What is left of each limit right now. Unlimited limits are None.
+        """
+        return {
+            "messages": self._messages.available if self._messages else None,
+            "recipients": self._recipients.available if self._recipients else None,
+            "connections": self._connections.available if self._connections else None,
+        }
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import aiosmtplib
+from aiosmtplib.errors import (
+    SMTPResponseException,
+    SMTPServerDisconnected,
+    SMTPTimeoutError,
+)
+
+
+def is_disconnect_error(error: Exception) -> bool:
+    """
+    Whether the error means the server has dropped the session, in
+    which case the command can be retried on a fresh connection
+    """
+    if isinstance(error, (SMTPServerDisconnected, ConnectionError)):
+        return True
+
+    # 421 is the server telling us it is closing the channel,
+    # usually because the session has been idle for too long
+    return isinstance(error, SMTPResponseException) and error.code == 421
+
+
+class _PooledConnection:
+    def __init__(self, client: aiosmtplib.SMTP) -> None:
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP sessions warm between sends.
+
+    Idle sessions are checked with a NOOP before they are handed out
+    and are transparently replaced if the server has dropped them.
+    Sessions which have been idle for longer than `idle_timeout` are
+    assumed dead and replaced without the NOOP round trip.
+    """
+
+    SIZE = 1
+    IDLE_TIMEOUT = 60.0
+
+    def __init__(
+        self,
+        opener: Callable[[], Awaitable[aiosmtplib.SMTP]],
+        size: int = SIZE,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self._opener = opener
+        self._size = size
+        self._idle_timeout = idle_timeout
+
+        self._idle: List[_PooledConnection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so that the semaphore belongs to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._size)
+        return self._semaphore
+
+    async def _is_alive(self, connection: _PooledConnection) -> bool:
+        if time.monotonic() - connection.last_used > self._idle_timeout:
+            return False
+
+        if not connection.client.is_connected:
+            return False
+
+        try:
+            await connection.client.noop()
+        except (SMTPResponseException, SMTPTimeoutError, ConnectionError):
+            return False
+
+        return True
+
+    async def _reuse_idle(self) -> Optional[aiosmtplib.SMTP]:
+        while self._idle:
+            connection = self._idle.pop()
+            if await self._is_alive(connection):
+                return connection.client
+            self._close_client(connection.client)
+
+        return None
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        """
+        Get a live, authenticated client from the pool, waiting if all
+        of the pool's connections are already in use
+        """
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+
+        try:
+            client = await self._reuse_idle()
+            if client is None:
+                client = await self._opener()
+        except:
+            semaphore.release()
+            raise
+
+        return client
+
+    def release(self, client: aiosmtplib.SMTP) -> None:
+        """
+        Return a healthy client to the pool for reuse
+        """
+        self._idle.append(_PooledConnection(client))
+        self._get_semaphore().release()
+
+    def discard(self, client: aiosmtplib.SMTP) -> None:
+        """
+        Drop a client which can no longer be used, freeing its slot
+        """
+        self._close_client(client)
+        self._get_semaphore().release()
+
+    def _close_client(self, client: aiosmtplib.SMTP) -> None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        idle = self._idle
+        self._idle = []
+
+        for connection in idle:
+            try:
+                await connection.client.quit()
+            except Exception:
+                pass
+            self._close_client(connection.client)
@@ -0,0 +1,88 @@
+import re
+from collections import OrderedDict
+from email.mime.text import MIMEText
+from typing import Optional, Tuple
+
+
+# Printable ASCII, which the email package writes into headers untouched
+_PLAIN_HEADER = re.compile(r"[\x20-\x7e]*")
+
+
+def _is_plain(value: str) -> bool:
+    return _PLAIN_HEADER.fullmatch(value) is not None
+
+
+class MessageRenderer:
+    """
+    Renders the email message sent to each recipient.
+
+    Only the `To` header differs between recipients of the same email,
+    so the rest of the message is generated and encoded once and the
+    recipient is spliced in as bytes. Rendered messages are kept in a
+    small LRU cache as the same body is sent to every admin.
+    """
+
+    CACHE_SIZE = 128
+    ENCODING = "utf-8"
+
+    # Stands in for the recipient while the shared part of the message
+    # is generated
+    _PLACEHOLDER = "\x00recipient\x00"
+
+    def __init__(self, sender: str, cache_size: int = CACHE_SIZE) -> None:
+        self._sender = sender
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], Optional[Tuple[bytes, bytes]]]" = (
+            OrderedDict()
+        )
+
+    def _generate(self, recipient: str, subject: str, body: str) -> str:
+        msg = MIMEText(body)
+        msg["To"] = recipient
+        msg["From"] = self._sender
+        msg["Subject"] = subject
+
+        return msg.as_string()
+
+    def _split(self, subject: str, body: str) -> Optional[Tuple[bytes, bytes]]:
+        message = self._generate(MessageRenderer._PLACEHOLDER, subject, body)
+        parts = message.split(MessageRenderer._PLACEHOLDER)
+
+        # Bodies which happen to contain the placeholder can't be spliced
+        if len(parts) != 2:
+            return None
+
+        prefix, suffix = parts
+        return (
+            prefix.encode(MessageRenderer.ENCODING),
+            suffix.encode(MessageRenderer.ENCODING),
+        )
+
+    def _template(self, subject: str, body: str) -> Optional[Tuple[bytes, bytes]]:
+        key = (subject, body)
+        try:
+            template = self._cache[key]
+            self._cache.move_to_end(key)
+            return template
+        except KeyError:
+            pass
+
+        template = self._split(subject, body)
+        self._cache[key] = template
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return template
+
+    def render(self, recipient: str, subject: str, body: str) -> bytes:
+        template = self._template(subject, body)
+
+        # Addresses which the email package would have to encode or
+        # fold take the slow path
+        if template is None or not _is_plain(recipient):
+            return self._generate(recipient, subject, body).encode(
+                MessageRenderer.ENCODING
+            )
+
+        prefix, suffix = template
+        return prefix + recipient.encode(MessageRenderer.ENCODING) + suffix
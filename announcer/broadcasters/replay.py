@@ -0,0 +1,180 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import aiosmtplib
+from aiosmtplib import errors
+from aiosmtplib.errors import (
+    SMTPConnectError,
+    SMTPException,
+    SMTPRecipientRefused,
+    SMTPRecipientsRefused,
+    SMTPServerDisconnected,
+)
+from aiosmtplib.response import SMTPResponse
+
+from announcer.replay import Recorder, ReplayError, Replayer
+
+KIND = "smtp"
+
+Recipients = Union[str, List[str]]
+
+
+def sendmail_key(recipients: Recipients) -> str:
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    return "sendmail " + ",".join(sorted(recipients))
+
+
+def _encode_error(error: SMTPException) -> Dict[str, Any]:
+    # Arguments are kept so that the error can be built again as it was
+    args: List[Any] = list(error.args)
+    if isinstance(error, SMTPRecipientsRefused):
+        args = [[list(refused.args) for refused in error.recipients]]
+    return {"error": type(error).__name__, "args": args}
+
+
+def _decode_error(exchange: Dict[str, Any]) -> SMTPException:
+    error_class = getattr(errors, exchange["error"], SMTPException)
+    args = exchange["args"]
+    if error_class is SMTPRecipientsRefused:
+        return SMTPRecipientsRefused(
+            [SMTPRecipientRefused(*refused) for refused in args[0]]
+        )
+    return error_class(*args)
+
+
+class RecordingSMTP:
+    """
+    An SMTP client which records each command the broadcaster sends,
+    and its outcome. Credentials and message content are not recorded.
+    """
+
+    def __init__(self, recorder: Recorder, hostname: str, port: int) -> None:
+        self._recorder = recorder
+        self._client = aiosmtplib.SMTP(hostname=hostname, port=port)
+
+    @property
+    def is_connected(self) -> bool:
+        return self._client.is_connected
+
+    async def _record(
+        self,
+        key: str,
+        command: Awaitable[Any],
+        encode: Callable[[Any], Dict[str, Any]] = lambda result: {},
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await command
+        except SMTPException as e:
+            self._recorder.record(KIND, key, start, **_encode_error(e))
+            raise
+
+        self._recorder.record(KIND, key, start, **encode(result))
+        return result
+
+    async def connect(self) -> None:
+        await self._record("connect", self._client.connect())
+
+    async def starttls(self) -> None:
+        await self._record("starttls", self._client.starttls())
+
+    async def login(self, username: str, password: str) -> None:
+        await self._record("login", self._client.login(username, password))
+
+    async def noop(self) -> None:
+        await self._record("noop", self._client.noop())
+
+    async def quit(self) -> None:
+        await self._record("quit", self._client.quit())
+
+    async def sendmail(self, sender: str, recipients: Recipients, message: Any) -> Any:
+        def encode(result: Any) -> Dict[str, Any]:
+            refused, response = result
+            return {
+                "refused": {
+                    recipient: list(error) for recipient, error in refused.items()
+                },
+                "response": response,
+            }
+
+        return await self._record(
+            sendmail_key(recipients),
+            self._client.sendmail(sender, recipients, message),
+            encode,
+        )
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class ReplaySMTP:
+    """
+    An SMTP client which answers each command from a recording, without
+    touching the network
+    """
+
+    def __init__(self, replayer: Replayer, hostname: str, port: int) -> None:
+        self._replayer = replayer
+        self._connected = False
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def _replay(self, key: str) -> Dict[str, Any]:
+        try:
+            exchange = await self._replayer.replay(KIND, key)
+        except ReplayError as e:
+            # Seen by the broadcaster like a server that can't be reached
+            if key == "connect":
+                raise SMTPConnectError(str(e))
+            raise SMTPServerDisconnected(str(e))
+
+        if "error" in exchange:
+            raise _decode_error(exchange)
+        return exchange
+
+    async def connect(self) -> None:
+        await self._replay("connect")
+        self._connected = True
+
+    async def starttls(self) -> None:
+        await self._replay("starttls")
+
+    async def login(self, username: str, password: str) -> None:
+        await self._replay("login")
+
+    async def noop(self) -> None:
+        await self._replay("noop")
+
+    async def quit(self) -> None:
+        try:
+            await self._replay("quit")
+        finally:
+            self._connected = False
+
+    async def sendmail(self, sender: str, recipients: Recipients, message: Any) -> Any:
+        exchange = await self._replay(sendmail_key(recipients))
+        refused = {
+            recipient: SMTPResponse(*error)
+            for recipient, error in exchange["refused"].items()
+        }
+        return refused, exchange["response"]
+
+    def close(self) -> None:
+        self._connected = False
+
+
+def recording_client(recorder: Recorder) -> Callable[..., Any]:
+    """
+    A client factory for `EmailBroadcaster` which records traffic
+    """
+    return lambda hostname, port: RecordingSMTP(recorder, hostname, port)
+
+
+def replay_client(replayer: Replayer) -> Callable[..., Any]:
+    """
+    A client factory for `EmailBroadcaster` which replays traffic
+    """
+    return lambda hostname, port: ReplaySMTP(replayer, hostname, port)
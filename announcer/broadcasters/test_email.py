@@ -1,5 +1,6 @@
 import asyncio
 import unittest
+from typing import Any, List
 from email.mime.text import MIMEText
 from unittest.mock import MagicMock, call, create_autospec, patch
 
@@ -8,8 +9,10 @@ import asynctest
 from aiosmtplib.errors import (
     SMTPAuthenticationError,
     SMTPConnectError,
+    SMTPRecipientRefused,
     SMTPRecipientsRefused,
     SMTPResponseException,
+    SMTPServerDisconnected,
     SMTPTimeoutError,
 )
 
@@ -17,11 +20,15 @@ from announcer.broadcasters.email import (
     BroadcastEmail,
     BroadcasterTimeoutError,
     ConnectError,
+    DeliveryReport,
     EmailBroadcaster,
     EmailBroadcasterError,
     LoginError,
-    SendError,
+    SendFailure,
+    is_permanent_error,
 )
+from announcer.metrics import MetricsRegistry
+from announcer.tracing import Tracer
 
 
 class TestEmailBroadcaster(asynctest.TestCase):
@@ -63,13 +70,23 @@ class TestEmailBroadcaster(asynctest.TestCase):
         self.assertIs(client._username, "test")
         self.assertIs(client._password, "testpass")
 
-    def generate_message(self, recipient: str, subject, body) -> str:
+    def test_init_client_factory(self) -> None:
+        factory = MagicMock()
+
+        client = EmailBroadcaster(
+            "localhost", 25, "test", "testpass", client_factory=factory
+        )
+
+        factory.assert_called_with(hostname="localhost", port=25)
+        self.assertIs(client._client, factory.return_value)
+
+    def generate_message(self, recipient: str, subject, body) -> bytes:
         msg = MIMEText(body)
         msg["To"] = recipient
         msg["From"] = TestEmailBroadcaster.TEST_EMAIL
         msg["Subject"] = subject
 
-        return msg.as_string()
+        return msg.as_string().encode()
 
     async def test_send(self) -> None:
         recipients = ["test@test.com", "test2@gmail.com"]
@@ -99,6 +116,51 @@ class TestEmailBroadcaster(asynctest.TestCase):
         self._mock_smtp.sendmail.assert_has_calls(expected_send_calls, any_order=True)
         self._mock_smtp.quit.assert_called()
 
+    async def test_send_metrics(self) -> None:
+        registry = MetricsRegistry()
+        self._client = EmailBroadcaster(
+            "localhost", 25, TestEmailBroadcaster.TEST_EMAIL, "test", metrics=registry
+        )
+        self._client._client = self._mock_smtp
+        self.setup_smtp_mocks()
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPRecipientsRefused([]))
+        self._mock_smtp.sendmail.side_effect = [mock_future, self.async_none()]
+
+        await self._client.send(
+            [BroadcastEmail(["test@test.com", "test2@test.com"], "subject", "body")]
+        )
+
+        metrics = registry.render()
+        for operation, count in (("connect", 1), ("login", 1), ("send", 2)):
+            self.assertIn(
+                f'announcer_smtp_seconds_count{{operation="{operation}"}} {count}\n',
+                metrics,
+            )
+        self.assertIn('announcer_smtp_errors_total{operation="send"} 1\n', metrics)
+
+    async def test_send_spans(self) -> None:
+        self._client._client = self._mock_smtp
+        self.setup_smtp_mocks()
+        tracer = Tracer()
+        tracer.enabled = True
+
+        with patch("announcer.tracing.tracer", tracer):
+            await self._client.send(
+                [BroadcastEmail(["test@test.com"], "subject", "body")]
+            )
+
+        self.assertEqual(
+            [span.name for span in tracer.spans],
+            ["smtp.connect", "smtp.login", "smtp.render", "smtp.send"],
+        )
+
+    def async_none(self) -> asyncio.Future:
+        future: asyncio.Future = asyncio.Future()
+        future.set_result(None)
+        return future
+
     async def test_send_login_failure(self) -> None:
         recipients = ["test@test.com", "test2@gmail.com"]
         subject = "A subject"
@@ -145,13 +207,8 @@ class TestEmailBroadcaster(asynctest.TestCase):
         mock_future.set_exception(SMTPResponseException(0, "An error"))
         self._mock_smtp.sendmail.return_value = mock_future
 
-        error = None
-        try:
-            await self._client.send([email])
-        except EmailBroadcasterError as e:
-            error = e
-
-        self.assertIs(type(error), SendError)
+        report = await self._client.send([email])
+        self.assertEqual(len(report.temporary_failures), 2)
 
         mock_future2: asyncio.Future = asyncio.Future()
         mock_future2.set_exception(SMTPTimeoutError("Timeout"))
@@ -166,16 +223,12 @@ class TestEmailBroadcaster(asynctest.TestCase):
         self.assertIs(type(error2), BroadcasterTimeoutError)
 
         mock_future3: asyncio.Future = asyncio.Future()
-        mock_future3.set_exception(SMTPRecipientsRefused("test@gmail.com"))
+        mock_future3.set_exception(SMTPRecipientsRefused([]))
         self._mock_smtp.sendmail.return_value = mock_future3
 
-        error3 = None
-        try:
-            await self._client.send([email])
-        except EmailBroadcasterError as e:
-            error3 = e
-
-        self.assertIs(type(error3), SendError)
+        report = await self._client.send([email])
+        self.assertEqual(len(report.failures), 2)
+        self.assertFalse(report.ok)
 
     async def test_send_connect_failure(self) -> None:
         recipients = ["test@test.com", "test2@gmail.com"]
@@ -233,6 +286,249 @@ class TestEmailBroadcaster(asynctest.TestCase):
         await self._client.send([email])
         self._mock_smtp.quit.assert_called()
 
+    async def test_send_continues_after_failure(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+        email2 = BroadcastEmail(["test2@test.com"], "Another subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        refusal = SMTPRecipientRefused(550, "No such user", "test@test.com")
+        refused: asyncio.Future = asyncio.Future()
+        refused.set_exception(SMTPRecipientsRefused([refusal]))
+        sent: asyncio.Future = asyncio.Future()
+        sent.set_result(None)
+        self._mock_smtp.sendmail.side_effect = [refused, sent]
+
+        report = await self._client.send([email, email2])
+
+        self.assertEqual(self._mock_smtp.sendmail.call_count, 2)
+        self.assertEqual(
+            report.permanent_failures,
+            [SendFailure(email, "test@test.com", refusal, permanent=True)],
+        )
+        self.assertEqual(report.temporary_failures, [])
+        self.assertEqual(report.delivered, [(email2, "test2@test.com")])
+        self._mock_smtp.quit.assert_called()
+
+    async def test_send_disconnect(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPServerDisconnected("Gone"))
+        self._mock_smtp.sendmail.return_value = mock_future
+
+        error = None
+        try:
+            await self._client.send([email])
+        except EmailBroadcasterError as e:
+            error = e
+
+        self.assertIs(type(error), ConnectError)
+
+    async def test_send_single_envelope(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestEmailBroadcaster.TEST_EMAIL,
+            "test",
+            recipients_per_message=2,
+        )
+        self._client._client = self._mock_smtp
+        recipients = ["a@test.com", "b@test.com", "c@test.com"]
+        email = BroadcastEmail(recipients, "A subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        await self._client.send([email])
+
+        message = self.generate_message(
+            TestEmailBroadcaster.TEST_EMAIL, "A subject", "A body"
+        )
+        self._mock_smtp.sendmail.assert_has_calls(
+            [
+                call(
+                    TestEmailBroadcaster.TEST_EMAIL,
+                    ["a@test.com", "b@test.com"],
+                    message,
+                ),
+                call(
+                    TestEmailBroadcaster.TEST_EMAIL,
+                    "c@test.com",
+                    self.generate_message("c@test.com", "A subject", "A body"),
+                ),
+            ]
+        )
+
+    async def test_send_single_envelope_partial_failure(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestEmailBroadcaster.TEST_EMAIL,
+            "test",
+            recipients_per_message=10,
+        )
+        self._client._client = self._mock_smtp
+        email = BroadcastEmail(["a@test.com", "b@test.com"], "A subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        response: asyncio.Future = asyncio.Future()
+        response.set_result(({"b@test.com": (550, "No such user")}, "OK"))
+        self._mock_smtp.sendmail.return_value = response
+
+        report = await self._client.send([email])
+
+        self.assertEqual(len(report.failures), 1)
+        self.assertEqual(report.failures[0].recipient, "b@test.com")
+        self.assertIsInstance(report.failures[0].error, SMTPRecipientRefused)
+        self.assertEqual(
+            report.statuses(email),
+            {
+                "a@test.com": DeliveryReport.DELIVERED,
+                "b@test.com": DeliveryReport.PERMANENT_FAILURE,
+            },
+        )
+
+        refused: asyncio.Future = asyncio.Future()
+        refused.set_exception(SMTPRecipientsRefused([]))
+        self._mock_smtp.sendmail.return_value = refused
+
+        report = await self._client.send([email])
+
+        self.assertEqual(
+            sorted(f.recipient for f in report.failures), ["a@test.com", "b@test.com"]
+        )
+        self.assertEqual(report.delivered, [])
+
+    async def test_send_rate_limited(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestEmailBroadcaster.TEST_EMAIL,
+            "test",
+            recipients_per_day=10,
+            connections_per_minute=5,
+        )
+        self._client._client = self._mock_smtp
+        email = BroadcastEmail(["a@test.com", "b@test.com"], "A subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        await self._client.send([email])
+
+        budget = self._client.budget()
+        self.assertAlmostEqual(budget["recipients"], 8, places=2)
+        self.assertAlmostEqual(budget["connections"], 4, places=2)
+        self.assertIsNone(budget["messages"])
+
+    async def test_send_over_quota_defers(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestEmailBroadcaster.TEST_EMAIL,
+            "test",
+            recipients_per_day=3,
+        )
+        self._client._client = self._mock_smtp
+        email = BroadcastEmail(["a@test.com", "b@test.com"], "A subject", "A body")
+        email2 = BroadcastEmail(["c@test.com", "d@test.com"], "A subject", "A body")
+
+        self.setup_smtp_mocks()
+
+        report = await self._client.send([email, email2])
+
+        self.assertEqual(self._mock_smtp.sendmail.call_count, 3)
+        self.assertEqual(len(report.delivered), 3)
+        self.assertEqual(report.deferred, [(email2, "d@test.com")])
+        self.assertTrue(report.ok)
+
+        # Nothing fits, so no connection is made
+        self._mock_smtp.reset_mock()
+        report = await self._client.send([email])
+
+        self.assertFalse(self._mock_smtp.connect.called)
+        self.assertEqual(
+            report.deferred, [(email, "a@test.com"), (email, "b@test.com")]
+        )
+
+    async def test_send_login_failure_returns_quota(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestEmailBroadcaster.TEST_EMAIL,
+            "test",
+            recipients_per_day=100,
+        )
+        self._client._client = self._mock_smtp
+        emails = [
+            BroadcastEmail(["user{}@test.com".format(i)], "A subject", "A body")
+            for i in range(60)
+        ]
+
+        self.setup_smtp_mocks()
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPAuthenticationError(535, "Bad credentials"))
+        self._mock_smtp.login.return_value = mock_future
+
+        with self.assertRaises(LoginError):
+            await self._client.send(emails)
+        with self.assertRaises(LoginError):
+            await self._client.send(emails)
+
+        # Nothing was sent, so none of the quota was spent
+        self.assertFalse(self._mock_smtp.sendmail.called)
+        self.assertEqual(self._client.budget()["recipients"], 100)
+
+    async def test_close_unpooled(self) -> None:
+        await self._client.close()
+        self.assertFalse(self._mock_smtp.quit.called)
+
+
+class TestDeliveryReport(unittest.TestCase):
+    def test_permanent_errors(self) -> None:
+        self.assertTrue(is_permanent_error(SMTPResponseException(550, "No such user")))
+        self.assertFalse(is_permanent_error(SMTPResponseException(452, "Try later")))
+        self.assertFalse(is_permanent_error(Exception("Unknown")))
+
+    def test_refused_recipients_permanence(self) -> None:
+        def refused(*codes: int) -> SMTPRecipientsRefused:
+            return SMTPRecipientsRefused(
+                [SMTPRecipientRefused(code, "Refused", "a@test.com") for code in codes]
+            )
+
+        self.assertTrue(is_permanent_error(refused(550)))
+        self.assertTrue(is_permanent_error(refused(550, 553)))
+        self.assertFalse(is_permanent_error(refused(550, 450)))
+        self.assertFalse(is_permanent_error(refused()))
+
+    def test_statuses(self) -> None:
+        email = BroadcastEmail(["a@test.com", "b@test.com"], "test", "test")
+        other = BroadcastEmail(["a@test.com", "b@test.com"], "test", "test")
+        error = SMTPResponseException(452, "Try later")
+        report = DeliveryReport(
+            delivered=[(email, "a@test.com"), (other, "a@test.com")],
+            failures=[
+                SendFailure(email, "b@test.com", error),
+                SendFailure(other, "b@test.com", error, permanent=True),
+            ],
+        )
+
+        # Emails are told apart by identity, not equality
+        self.assertEqual(
+            report.statuses(email),
+            {
+                "a@test.com": DeliveryReport.DELIVERED,
+                "b@test.com": DeliveryReport.TEMPORARY_FAILURE,
+            },
+        )
+        self.assertEqual(report.temporary_failures, [report.failures[0]])
+        self.assertEqual(report.permanent_failures, [report.failures[1]])
+
+    def test_ok(self) -> None:
+        self.assertTrue(DeliveryReport().ok)
+
 
 class TestBroadcastEmail(unittest.TestCase):
     def test_equality(self) -> None:
@@ -260,3 +556,293 @@ class TestBroadcastEmail(unittest.TestCase):
             error = e
 
         self.assertIsNotNone(error)
+
+
+class TestPooledEmailBroadcaster(asynctest.TestCase):
+    TEST_EMAIL = "test@email.com"
+    # Kept as aiosmtplib.SMTP is patched during the tests
+    SMTP = aiosmtplib.SMTP
+
+    def mock_client(self) -> MagicMock:
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_result(None)
+
+        client = create_autospec(TestPooledEmailBroadcaster.SMTP, instance=True)
+        client.is_connected = True
+        for method in ("connect", "starttls", "login", "noop", "sendmail", "quit"):
+            getattr(client, method).return_value = mock_future
+        return client
+
+    def setUp(self):
+        self._client = EmailBroadcaster(
+            "localhost", 25, TestPooledEmailBroadcaster.TEST_EMAIL, "test", pool_size=1
+        )
+        self._clients: List[MagicMock] = []
+
+        patcher = patch("aiosmtplib.SMTP")
+        self.MockSMTP = patcher.start()
+        self.MockSMTP.side_effect = self.new_client
+        self.addCleanup(patcher.stop)
+
+    def new_client(self, *args, **kwargs) -> MagicMock:
+        client = self.mock_client()
+        self._clients.append(client)
+        return client
+
+    async def test_send_keeps_connection_open(self) -> None:
+        email = BroadcastEmail(
+            ["test@test.com", "test2@gmail.com"], "A subject", "A body"
+        )
+
+        await self._client.send([email])
+        await self._client.send([email])
+
+        # One login serves both sends
+        self.assertEqual(len(self._clients), 1)
+        self.MockSMTP.assert_called_with(hostname="localhost", port=25)
+        client = self._clients[0]
+        client.login.assert_called_once_with(
+            TestPooledEmailBroadcaster.TEST_EMAIL, "test"
+        )
+        self.assertEqual(client.sendmail.call_count, 4)
+        self.assertFalse(client.quit.called)
+        self.assertFalse(client.close.called)
+
+        await self._client.close()
+        client.quit.assert_called()
+
+    async def test_send_reconnects_on_disconnect(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        await self._client.send([email])
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPResponseException(421, "Closing channel"))
+        self._clients[0].sendmail.return_value = mock_future
+
+        await self._client.send([email])
+
+        self.assertEqual(len(self._clients), 2)
+        self._clients[0].close.assert_called()
+        self._clients[1].sendmail.assert_called()
+
+    async def test_send_concurrently(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestPooledEmailBroadcaster.TEST_EMAIL,
+            "test",
+            pool_size=3,
+            concurrency=3,
+        )
+        emails = [
+            BroadcastEmail(
+                [f"test{i}@test.com", f"other{i}@test.com"], "Subject", "Body"
+            )
+            for i in range(5)
+        ]
+
+        # Hold every send open so we can see how many run at once
+        in_flight = []
+        release: asyncio.Future = asyncio.Future()
+
+        async def slow_sendmail(*args, **kwargs) -> None:
+            in_flight.append(args)
+            await release
+
+        def slow_client(*args, **kwargs) -> MagicMock:
+            client = self.new_client()
+            client.sendmail.side_effect = slow_sendmail
+            return client
+
+        self.MockSMTP.side_effect = slow_client
+
+        send = asyncio.ensure_future(self._client.send(emails))
+        for i in range(5):
+            await asyncio.sleep(0)
+
+        self.assertEqual(len(self._clients), 3)
+        self.assertEqual(len(in_flight), 3)
+
+        release.set_result(None)
+        await send
+
+        self.assertEqual(len(in_flight), 10)
+        pool: Any = self._client._pool
+        self.assertEqual(pool.idle, 3)
+
+    async def test_send_concurrently_collects_failures(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestPooledEmailBroadcaster.TEST_EMAIL,
+            "test",
+            pool_size=2,
+            concurrency=2,
+        )
+        emails = [
+            BroadcastEmail([f"test{i}@test.com"], "Subject", "Body") for i in range(4)
+        ]
+
+        async def refusing_sendmail(sender, recipient, message) -> None:
+            if recipient == "test2@test.com":
+                raise SMTPRecipientsRefused([])
+
+        def refusing_client(*args, **kwargs) -> MagicMock:
+            client = self.new_client()
+            client.sendmail.side_effect = refusing_sendmail
+            return client
+
+        self.MockSMTP.side_effect = refusing_client
+
+        report = await self._client.send(emails)
+
+        self.assertEqual([f.recipient for f in report.failures], ["test2@test.com"])
+        self.assertEqual(len(report.delivered), 3)
+        self.assertEqual(sum(client.sendmail.call_count for client in self._clients), 4)
+
+    async def test_send_failure_keeps_report(self) -> None:
+        self._client = EmailBroadcaster(
+            "localhost",
+            25,
+            TestPooledEmailBroadcaster.TEST_EMAIL,
+            "test",
+            pool_size=2,
+            concurrency=2,
+        )
+        emails = [
+            BroadcastEmail([f"test{i}@test.com"], "Subject", "Body") for i in range(4)
+        ]
+
+        async def timing_out_sendmail(sender, recipient, message) -> None:
+            if recipient == "test1@test.com":
+                raise SMTPTimeoutError("Timeout")
+
+        def timing_out_client(*args, **kwargs) -> MagicMock:
+            client = self.new_client()
+            client.sendmail.side_effect = timing_out_sendmail
+            return client
+
+        self.MockSMTP.side_effect = timing_out_client
+
+        with self.assertRaises(BroadcasterTimeoutError) as raised:
+            await self._client.send(emails)
+
+        # The other worker carried on, and what it sent is reported
+        report: Any = raised.exception.report
+        self.assertEqual(
+            sorted(recipient for _, recipient in report.delivered),
+            ["test0@test.com", "test2@test.com", "test3@test.com"],
+        )
+        self.assertEqual(report.failures, [])
+
+    async def test_send_timeout(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        await self._client.send([email])
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPTimeoutError("Timeout"))
+        self._clients[0].sendmail.return_value = mock_future
+
+        error = None
+        try:
+            await self._client.send([email])
+        except EmailBroadcasterError as e:
+            error = e
+
+        self.assertIs(type(error), BroadcasterTimeoutError)
+        self._clients[0].close.assert_called()
+
+    async def test_send_reconnect_login_failure(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        await self._client.send([email])
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPServerDisconnected("Gone"))
+        self._clients[0].sendmail.return_value = mock_future
+
+        login_future: asyncio.Future = asyncio.Future()
+        login_future.set_exception(SMTPConnectError("Refused"))
+
+        def failing_client(*args, **kwargs) -> MagicMock:
+            client = self.new_client()
+            client.connect.return_value = login_future
+            return client
+
+        self.MockSMTP.side_effect = failing_client
+
+        error = None
+        try:
+            await self._client.send([email])
+        except EmailBroadcasterError as e:
+            error = e
+
+        self.assertIs(type(error), ConnectError)
+
+        # The pool's only slot must have been freed
+        self.MockSMTP.side_effect = self.new_client
+        await self._client.send([email])
+
+    async def test_send_reconnect_failure(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        await self._client.send([email])
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(SMTPServerDisconnected("Gone"))
+        self._clients[0].sendmail.return_value = mock_future
+        self.MockSMTP.side_effect = lambda *args, **kwargs: self._clients[0]
+        self._clients[0].is_connected = False
+
+        error = None
+        try:
+            await self._client.send([email])
+        except EmailBroadcasterError as e:
+            error = e
+
+        self.assertIs(type(error), ConnectError)
+
+    async def test_send_error_releases_connection(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        await self._client.send([email])
+
+        mock_future: asyncio.Future = asyncio.Future()
+        mock_future.set_exception(
+            SMTPRecipientsRefused(
+                [SMTPRecipientRefused(550, "No such user", "test@test.com")]
+            )
+        )
+        self._clients[0].sendmail.return_value = mock_future
+
+        report = await self._client.send([email])
+        self.assertEqual(report.statuses(email), {"test@test.com": "permanent_failure"})
+
+        # The next send gets a working connection
+        self._clients[
+            0
+        ].sendmail.return_value = self.mock_client().sendmail.return_value
+        await self._client.send([email])
+
+    async def test_login_failure_closes_client(self) -> None:
+        email = BroadcastEmail(["test@test.com"], "A subject", "A body")
+
+        def failing_client(*args, **kwargs) -> MagicMock:
+            client = self.new_client()
+            mock_future: asyncio.Future = asyncio.Future()
+            mock_future.set_exception(SMTPAuthenticationError(535, "Bad credentials"))
+            client.login.return_value = mock_future
+            return client
+
+        self.MockSMTP.side_effect = failing_client
+
+        error = None
+        try:
+            await self._client.send([email])
+        except EmailBroadcasterError as e:
+            error = e
+
+        self.assertIs(type(error), LoginError)
+        self._clients[0].close.assert_called()
@@ -0,0 +1,175 @@
+import asyncio
+from typing import List
+
+import asynctest
+
+from announcer.broadcasters.limiter import RateLimiter, TokenBucket
+
+
+class FakeTime:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class TestTokenBucket(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.time = FakeTime()
+
+    def generate_bucket(self, rate: float, capacity: float) -> TokenBucket:
+        return TokenBucket(rate, capacity, self.time.clock, self.time.sleep)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            TokenBucket(0, 1)
+
+        with self.assertRaises(ValueError):
+            TokenBucket(1, 0)
+
+    async def test_burst(self) -> None:
+        bucket = self.generate_bucket(1, 3)
+
+        for _ in range(3):
+            self.assertEqual(await bucket.acquire(), 0)
+
+        self.assertEqual(self.time.sleeps, [])
+        self.assertEqual(bucket.available, 0)
+
+    async def test_waits_for_tokens(self) -> None:
+        bucket = self.generate_bucket(2, 2)
+        await bucket.acquire(2)
+
+        self.assertEqual(bucket.delay(1), 0.5)
+        self.assertEqual(await bucket.acquire(1), 0.5)
+        self.assertEqual(self.time.sleeps, [0.5])
+
+    async def test_refills_up_to_capacity(self) -> None:
+        bucket = self.generate_bucket(1, 5)
+        await bucket.acquire(5)
+
+        self.time.now += 2
+        self.assertEqual(bucket.available, 2)
+
+        self.time.now += 100
+        self.assertEqual(bucket.available, 5)
+
+    async def test_more_than_capacity_takes_full_bucket(self) -> None:
+        bucket = self.generate_bucket(1, 5)
+        await bucket.acquire(2)
+
+        self.assertEqual(await bucket.acquire(10), 2)
+        self.assertEqual(bucket.available, 0)
+
+    async def test_try_acquire(self) -> None:
+        bucket = self.generate_bucket(1, 2)
+
+        self.assertTrue(bucket.try_acquire(2))
+        self.assertFalse(bucket.try_acquire(1))
+
+        self.time.now += 2
+        self.assertTrue(bucket.try_acquire(10))
+        self.assertEqual(self.time.sleeps, [])
+
+    async def test_try_acquire_behind_waiters(self) -> None:
+        bucket = self.generate_bucket(1, 1)
+
+        # Callers already waiting are first in line for the tokens
+        async with bucket._get_lock():
+            self.assertFalse(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+
+    async def test_release(self) -> None:
+        bucket = self.generate_bucket(1, 5)
+        await bucket.acquire(4)
+
+        bucket.release(3)
+        self.assertEqual(bucket.available, 4)
+
+        # Never more than the bucket holds
+        bucket.release(10)
+        self.assertEqual(bucket.available, 5)
+
+    async def test_waiters_queue(self) -> None:
+        bucket = self.generate_bucket(1, 1)
+        order: List[int] = []
+
+        async def take(i: int) -> None:
+            await bucket.acquire()
+            order.append(i)
+
+        await asyncio.gather(*(take(i) for i in range(3)))
+
+        self.assertEqual(order, [0, 1, 2])
+        self.assertEqual(self.time.sleeps, [1, 1])
+
+
+class TestRateLimiter(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.time = FakeTime()
+
+    def generate_limiter(self, **kwargs) -> RateLimiter:
+        return RateLimiter(clock=self.time.clock, sleep=self.time.sleep, **kwargs)
+
+    async def test_unlimited(self) -> None:
+        limiter = self.generate_limiter()
+
+        for _ in range(100):
+            self.assertTrue(limiter.reserve_recipients(10))
+            await limiter.acquire_message()
+            await limiter.acquire_connection()
+
+        self.assertEqual(
+            limiter.budget(),
+            {"messages": None, "recipients": None, "connections": None},
+        )
+        self.assertEqual(limiter.waited, 0)
+
+    async def test_messages_per_second(self) -> None:
+        limiter = self.generate_limiter(messages_per_second=2)
+
+        for _ in range(6):
+            await limiter.acquire_message()
+
+        # The first two go straight away, then one every half second
+        self.assertEqual(limiter.waited, 2)
+
+    async def test_recipients_per_day(self) -> None:
+        limiter = self.generate_limiter(recipients_per_day=100)
+
+        self.assertTrue(limiter.reserve_recipients(60))
+        self.assertEqual(limiter.budget()["recipients"], 40)
+
+        # Refused until the quota has refilled, rather than waiting
+        self.assertFalse(limiter.reserve_recipients(50))
+        self.assertEqual(limiter.budget()["recipients"], 40)
+
+        self.time.now += 10 * RateLimiter.DAY / 100
+        self.assertTrue(limiter.reserve_recipients(50))
+        self.assertEqual(limiter.waited, 0)
+
+    async def test_release_recipients(self) -> None:
+        limiter = self.generate_limiter(recipients_per_day=100)
+
+        self.assertTrue(limiter.reserve_recipients(60))
+        limiter.release_recipients(60)
+        self.assertEqual(limiter.budget()["recipients"], 100)
+
+        # Nothing to give back without a quota
+        self.generate_limiter().release_recipients(10)
+
+    async def test_connections_per_minute(self) -> None:
+        limiter = self.generate_limiter(connections_per_minute=2)
+
+        await limiter.acquire_connection()
+        await limiter.acquire_connection()
+        self.assertEqual(limiter.budget()["connections"], 0)
+
+        await limiter.acquire_connection()
+        self.assertAlmostEqual(limiter.waited, 30)
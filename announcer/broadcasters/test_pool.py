@@ -0,0 +1,162 @@
+import asyncio
+import time
+from typing import Any, List
+from unittest.mock import create_autospec
+
+import aiosmtplib
+import asynctest
+from aiosmtplib.errors import (
+    SMTPResponseException,
+    SMTPServerDisconnected,
+    SMTPTimeoutError,
+)
+
+from announcer.broadcasters.email import ConnectError
+from announcer.broadcasters.pool import SMTPPool, is_disconnect_error
+
+
+def async_return(result: Any) -> asyncio.Future:
+    f: asyncio.Future = asyncio.Future()
+    f.set_result(result)
+    return f
+
+
+def async_exception(exception: Exception) -> asyncio.Future:
+    f: asyncio.Future = asyncio.Future()
+    f.set_exception(exception)
+    return f
+
+
+class TestSMTPPool(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.opened: List[Any] = []
+
+    def mock_client(self) -> Any:
+        client = create_autospec(aiosmtplib.SMTP, instance=True)
+        client.is_connected = True
+        client.noop.return_value = async_return(None)
+        client.quit.return_value = async_return(None)
+        return client
+
+    async def opener(self) -> Any:
+        client = self.mock_client()
+        self.opened.append(client)
+        return client
+
+    def test_invalid_size(self) -> None:
+        with self.assertRaises(ValueError):
+            SMTPPool(self.opener, size=0)
+
+    async def test_acquire_opens_connection(self) -> None:
+        pool = SMTPPool(self.opener, size=2)
+
+        client = await pool.acquire()
+
+        self.assertIs(client, self.opened[0])
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(pool.idle, 0)
+
+    async def test_release_reuses_connection(self) -> None:
+        pool = SMTPPool(self.opener, size=1)
+
+        client = await pool.acquire()
+        pool.release(client)
+        self.assertEqual(pool.idle, 1)
+
+        client2 = await pool.acquire()
+
+        self.assertIs(client2, client)
+        self.assertEqual(len(self.opened), 1)
+        client.noop.assert_called()
+
+    async def test_acquire_waits_for_free_connection(self) -> None:
+        pool = SMTPPool(self.opener, size=1)
+
+        client = await pool.acquire()
+
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        pool.release(client)
+        self.assertIs(await waiter, client)
+
+    async def test_idle_timeout_reconnects(self) -> None:
+        pool = SMTPPool(self.opener, size=1, idle_timeout=10)
+
+        client = await pool.acquire()
+        pool.release(client)
+
+        # Pretend the connection has been idle for longer than the timeout
+        pool._idle[0].last_used = time.monotonic() - 11
+
+        client2 = await pool.acquire()
+
+        self.assertIsNot(client2, client)
+        self.assertFalse(client.noop.called)
+        client.close.assert_called()
+
+    async def test_dead_connection_reconnects(self) -> None:
+        pool = SMTPPool(self.opener, size=1)
+
+        client = await pool.acquire()
+        pool.release(client)
+        client.noop.return_value = async_exception(
+            SMTPResponseException(421, "Idle timeout")
+        )
+
+        client2 = await pool.acquire()
+        self.assertIsNot(client2, client)
+        pool.release(client2)
+
+        client2.is_connected = False
+        client3 = await pool.acquire()
+        self.assertIsNot(client3, client2)
+        self.assertFalse(client2.noop.called)
+
+    async def test_discard_frees_slot(self) -> None:
+        pool = SMTPPool(self.opener, size=1)
+
+        client = await pool.acquire()
+        pool.discard(client)
+
+        client.close.assert_called()
+        self.assertEqual(pool.idle, 0)
+
+        client2 = await pool.acquire()
+        self.assertIsNot(client2, client)
+
+    async def test_open_failure_frees_slot(self) -> None:
+        async def failing_opener() -> Any:
+            raise ConnectError("Could not connect")
+
+        pool = SMTPPool(failing_opener, size=1)
+
+        with self.assertRaises(ConnectError):
+            await pool.acquire()
+
+        pool._opener = self.opener
+        await pool.acquire()
+
+    async def test_close(self) -> None:
+        pool = SMTPPool(self.opener, size=2)
+
+        client = await pool.acquire()
+        client2 = await pool.acquire()
+        client2.quit.return_value = async_exception(SMTPTimeoutError("Timeout"))
+        client2.close.side_effect = RuntimeError("Already closed")
+        pool.release(client)
+        pool.release(client2)
+
+        await pool.close()
+
+        client.quit.assert_called()
+        client.close.assert_called()
+        client2.quit.assert_called()
+        self.assertEqual(pool.idle, 0)
+
+    def test_is_disconnect_error(self) -> None:
+        self.assertTrue(is_disconnect_error(SMTPServerDisconnected("Gone")))
+        self.assertTrue(is_disconnect_error(SMTPResponseException(421, "Bye")))
+        self.assertFalse(is_disconnect_error(SMTPResponseException(550, "No")))
+        self.assertFalse(is_disconnect_error(SMTPTimeoutError("Timeout")))
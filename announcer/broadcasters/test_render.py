@@ -0,0 +1,73 @@
+import unittest
+from email.mime.text import MIMEText
+
+from announcer.broadcasters.render import MessageRenderer
+
+
+class TestMessageRenderer(unittest.TestCase):
+    SENDER = "test@email.com"
+
+    def generate_message(self, recipient: str, subject: str, body: str) -> bytes:
+        msg = MIMEText(body)
+        msg["To"] = recipient
+        msg["From"] = TestMessageRenderer.SENDER
+        msg["Subject"] = subject
+
+        return msg.as_string().encode()
+
+    def test_render_matches_email_package(self) -> None:
+        renderer = MessageRenderer(TestMessageRenderer.SENDER)
+
+        cases = [
+            ("test@test.com", "A subject", "A body"),
+            ("test2@test.com", "A subject", "A body"),
+            ("test@test.com", "Another subject", "Multi\nline\nbody\n"),
+            ("test@test.com", "A subject", "Non ascii body ☃"),
+            ("x" * 100 + "@test.com", "A subject " * 20, "A body"),
+        ]
+        for recipient, subject, body in cases:
+            self.assertEqual(
+                renderer.render(recipient, subject, body),
+                self.generate_message(recipient, subject, body),
+            )
+
+    def test_render_caches_template(self) -> None:
+        renderer = MessageRenderer(TestMessageRenderer.SENDER)
+
+        renderer.render("test@test.com", "A subject", "A body")
+        template = renderer._cache[("A subject", "A body")]
+        renderer.render("test2@test.com", "A subject", "A body")
+
+        self.assertIs(renderer._cache[("A subject", "A body")], template)
+        self.assertEqual(len(renderer._cache), 1)
+
+    def test_render_cache_is_lru(self) -> None:
+        renderer = MessageRenderer(TestMessageRenderer.SENDER, cache_size=2)
+
+        renderer.render("test@test.com", "Subject", "1")
+        renderer.render("test@test.com", "Subject", "2")
+        renderer.render("test@test.com", "Subject", "1")
+        renderer.render("test@test.com", "Subject", "3")
+
+        self.assertEqual(
+            list(renderer._cache.keys()), [("Subject", "1"), ("Subject", "3")]
+        )
+
+    def test_render_unusual_recipient(self) -> None:
+        renderer = MessageRenderer(TestMessageRenderer.SENDER)
+
+        recipient = "Snowman ☃ <test@test.com>"
+        self.assertEqual(
+            renderer.render(recipient, "A subject", "A body"),
+            self.generate_message(recipient, "A subject", "A body"),
+        )
+
+    def test_render_body_containing_placeholder(self) -> None:
+        renderer = MessageRenderer(TestMessageRenderer.SENDER)
+
+        body = "A body " + MessageRenderer._PLACEHOLDER
+        self.assertEqual(
+            renderer.render("test@test.com", "A subject", body),
+            self.generate_message("test@test.com", "A subject", body),
+        )
+        self.assertIsNone(renderer._cache[("A subject", body)])
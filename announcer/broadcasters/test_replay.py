@@ -0,0 +1,184 @@
+import asyncio
+import gzip
+import os
+import tempfile
+from typing import Any
+from unittest.mock import patch
+
+import aiosmtplib
+import asynctest
+from aiosmtplib.errors import (
+    SMTPAuthenticationError,
+    SMTPConnectError,
+    SMTPRecipientRefused,
+    SMTPRecipientsRefused,
+    SMTPServerDisconnected,
+)
+from aiosmtplib.response import SMTPResponse
+
+from announcer.broadcasters.email import BroadcastEmail, EmailBroadcaster
+from announcer.broadcasters.replay import (
+    RecordingSMTP,
+    ReplaySMTP,
+    recording_client,
+    replay_client,
+    sendmail_key,
+)
+from announcer.replay import Recorder, Replayer
+
+TEST_EMAIL = "announcer@test.com"
+
+
+def async_return(result: Any) -> asyncio.Future:
+    f: asyncio.Future = asyncio.Future()
+    f.set_result(result)
+    return f
+
+
+def async_exception(exception: Exception) -> asyncio.Future:
+    f: asyncio.Future = asyncio.Future()
+    f.set_exception(exception)
+    return f
+
+
+class TestReplaySMTP(asynctest.TestCase):
+    # Kept as aiosmtplib.SMTP is patched during the tests
+    SMTP = aiosmtplib.SMTP
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "traffic.jsonl.gz")
+
+        patcher = patch("aiosmtplib.SMTP")
+        self.MockSMTP = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        client = self.MockSMTP.return_value
+        client.is_connected = True
+        for method in ("connect", "starttls", "login", "noop", "quit"):
+            getattr(client, method).side_effect = lambda *args: async_return(None)
+        self.mock_client = client
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_sendmail_key(self) -> None:
+        self.assertEqual(sendmail_key("a@test.com"), "sendmail a@test.com")
+        self.assertEqual(
+            sendmail_key(["b@test.com", "a@test.com"]), "sendmail a@test.com,b@test.com"
+        )
+
+    async def test_record_and_replay(self) -> None:
+        refused = SMTPRecipientsRefused(
+            [SMTPRecipientRefused(550, "No such user", "b@test.com")]
+        )
+        self.mock_client.sendmail.side_effect = [
+            async_return(({}, "OK")),
+            async_return(({"c@test.com": SMTPResponse(450, "Busy")}, "OK")),
+            async_exception(refused),
+        ]
+
+        recorder = Recorder(self.path)
+        broadcaster = EmailBroadcaster(
+            "localhost",
+            25,
+            TEST_EMAIL,
+            "password",
+            recipients_per_message=2,
+            client_factory=recording_client(recorder),
+        )
+        self.MockSMTP.assert_called_with(hostname="localhost", port=25)
+
+        emails = [
+            BroadcastEmail(["a@test.com"], "subject", "body"),
+            BroadcastEmail(["c@test.com", "d@test.com"], "subject", "body"),
+            BroadcastEmail(["b@test.com"], "subject", "body"),
+        ]
+        recorded = await broadcaster.send(emails)
+        recorder.close()
+
+        broadcaster = EmailBroadcaster(
+            "localhost",
+            25,
+            TEST_EMAIL,
+            "password",
+            recipients_per_message=2,
+            client_factory=replay_client(Replayer(self.path, latency_scale=0)),
+        )
+        self.MockSMTP.reset_mock()
+        replayed = await broadcaster.send(emails)
+
+        # Without touching the network
+        self.MockSMTP.assert_not_called()
+        self.assertEqual(replayed.delivered, recorded.delivered)
+        self.assertEqual(
+            [failure.recipient for failure in replayed.failures],
+            ["c@test.com", "b@test.com"],
+        )
+        self.assertEqual(
+            [(repr(failure.error), failure.permanent) for failure in replayed.failures],
+            [(repr(failure.error), failure.permanent) for failure in recorded.failures],
+        )
+
+    async def test_pooled_replay(self) -> None:
+        self.mock_client.sendmail.side_effect = lambda *args: async_return(({}, "OK"))
+
+        recorder = Recorder(self.path)
+        client = RecordingSMTP(recorder, "localhost", 25)
+        await client.connect()
+        await client.noop()
+        self.assertTrue(client.is_connected)
+        await client.quit()
+        client.close()
+        recorder.close()
+
+        replayed = ReplaySMTP(Replayer(self.path, latency_scale=0), "localhost", 25)
+        self.assertFalse(replayed.is_connected)
+        await replayed.connect()
+        self.assertTrue(replayed.is_connected)
+        await replayed.noop()
+        await replayed.quit()
+        self.assertFalse(replayed.is_connected)
+
+        await replayed.connect()
+        replayed.close()
+        self.assertFalse(replayed.is_connected)
+
+    async def test_replays_errors(self) -> None:
+        self.mock_client.login.side_effect = lambda *args: async_exception(
+            SMTPAuthenticationError(535, "Bad credentials")
+        )
+        self.mock_client.quit.side_effect = lambda *args: async_exception(
+            SMTPServerDisconnected("Gone")
+        )
+
+        recorder = Recorder(self.path)
+        client = RecordingSMTP(recorder, "localhost", 25)
+        with self.assertRaises(SMTPAuthenticationError):
+            await client.login(TEST_EMAIL, "password")
+        with self.assertRaises(SMTPServerDisconnected):
+            await client.quit()
+        recorder.close()
+
+        replayed = ReplaySMTP(Replayer(self.path, latency_scale=0), "localhost", 25)
+        with self.assertRaises(SMTPAuthenticationError) as raised:
+            await replayed.login(TEST_EMAIL, "password")
+        self.assertEqual(raised.exception.code, 535)
+        with self.assertRaises(SMTPServerDisconnected):
+            await replayed.quit()
+
+        # Nothing recorded
+        with self.assertRaises(SMTPConnectError):
+            await replayed.connect()
+        with self.assertRaises(SMTPServerDisconnected):
+            await replayed.sendmail(TEST_EMAIL, "a@test.com", b"message")
+
+    async def test_credentials_not_recorded(self) -> None:
+        recorder = Recorder(self.path)
+        client = RecordingSMTP(recorder, "localhost", 25)
+        await client.starttls()
+        await client.login(TEST_EMAIL, "secret-password")
+        recorder.close()
+
+        with gzip.open(self.path) as recording:
+            self.assertNotIn(b"secret-password", recording.read())
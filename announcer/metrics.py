@@ -0,0 +1,319 @@
+import bisect
+import math
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from aiohttp import web
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class CounterValue:
+    """
+    One labelled series of a counter
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class GaugeValue(CounterValue):
+    """
+    One labelled series of a gauge
+    """
+
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class HistogramValue:
+    """
+    One labelled series of a histogram. Counts are kept per bucket, and
+    only made cumulative when scraped.
+    """
+
+    __slots__ = ("_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+V = TypeVar("V")
+
+
+class Metric(ABC, Generic[V]):
+    """
+    A metric and its series, one for each set of label values. Series
+    can be looked up once with `labels` and kept, to skip the lookup.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Labels, V] = {}
+
+    @abstractmethod
+    def _new_value(self) -> V:
+        """
+        The value of a new series
+        """
+
+    def labels(self, *values: str) -> V:
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(
+                    f"{self.name} takes labels {self.label_names}, got {values}"
+                )
+            value = self._values[values] = self._new_value()
+        return value
+
+    def _series(self, suffix: str, values: Labels, extra: str = "") -> str:
+        labels = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.label_names, values)
+        ]
+        if extra:
+            labels.append(extra)
+        if not labels:
+            return self.name + suffix
+        return f"{self.name}{suffix}{{{','.join(labels)}}}"
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """
+        The sample lines of every series
+        """
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.help)}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric[CounterValue]):
+    TYPE = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self._series('', labels)} {_format_value(value.value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric[GaugeValue]):
+    """
+    A value which can go up and down. Gauges of state which the service
+    already keeps are given a `function` instead, which returns the
+    value of every series and is only called when metrics are scraped.
+    """
+
+    TYPE = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        function: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self._function = function
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            values = self._function()
+        else:
+            values = {labels: value.value for labels, value in self._values.items()}
+
+        return [
+            f"{self._series('', labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram(Metric[HistogramValue]):
+    TYPE = "histogram"
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for labels, value in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), value.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(f"{self._series('_bucket', labels, le)} {cumulative}")
+
+            samples.append(f"{self._series('_sum', labels)} {_format_value(value.sum)}")
+            samples.append(f"{self._series('_count', labels)} {value.count}")
+        return samples
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class MetricsRegistry:
+    """
+    Metrics of one service, in the Prometheus text format.
+
+    Recording a value is an attribute update on the series, so metrics
+    are always recorded, whether or not anything scrapes them.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: M) -> M:
+        existing = self._metrics.get(metric.name)
+        if existing is None:
+            self._metrics[metric.name] = metric
+            return metric
+
+        # Clients of the same kind share their metrics, by label
+        if type(existing) is not type(metric) or (
+            existing.label_names != metric.label_names
+        ):
+            raise ValueError(f"{metric.name} is already registered differently")
+        return existing  # type: ignore
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        function: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, help, labels, function))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = Histogram.BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "".join(
+            metric.render() + "\n" for _, metric in sorted(self._metrics.items())
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.render().encode("utf-8"),
+            headers={"Content-Type": MetricsRegistry.CONTENT_TYPE},
+        )
+
+
+@contextmanager
+def track(
+    latency: HistogramValue,
+    errors: CounterValue,
+    exceptions: Union[Type[BaseException], Tuple[Type[BaseException], ...]],
+) -> Iterator[None]:
+    """
+    Time the block into `latency`, and count it in `errors` if it raises
+    one of `exceptions`
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except exceptions:
+        errors.inc()
+        raise
+    finally:
+        latency.observe(time.perf_counter() - start)
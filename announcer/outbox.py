@@ -0,0 +1,309 @@
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dataclasses import dataclass
+
+from announcer.broadcasters.email import BroadcastEmail, SendFailure
+
+
+class OutboxError(Exception):
+    pass
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    email: BroadcastEmail
+    priority: str = ""
+
+    @property
+    def cursor(self) -> Tuple[str, int]:
+        return (self.priority, self.id)
+
+
+class Outbox:
+    """
+    Durable queue of emails between the posts being fetched and the
+    admins being emailed about them.
+
+    Every email is stored with the posts it announces and a status for
+    each of its recipients. Recipients are `pending` until the email is
+    sent to them, until the server rejects them permanently, or until
+    they have failed `max_attempts` times. A recipient which fails is
+    held back for `retry_delay` seconds, doubling with each attempt,
+    before it is tried again. Once every email for a post is resolved
+    the post can be acknowledged upstream, after which it is removed
+    from the outbox.
+
+    Pending emails come out most urgent first, by their `priority` sort
+    key, and then in the order they were added.
+    """
+
+    MEMORY = ":memory:"
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 60.0
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    priority TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (message_id, recipient)
+);
+CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries(status, message_id);
+CREATE TABLE IF NOT EXISTS message_posts (
+    message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    post_id TEXT NOT NULL,
+    PRIMARY KEY (message_id, post_id)
+);
+CREATE INDEX IF NOT EXISTS message_posts_post ON message_posts(post_id);
+"""
+    PRIORITY_INDEX = (
+        "CREATE INDEX IF NOT EXISTS messages_priority ON messages(priority DESC, id)"
+    )
+
+    def __init__(
+        self,
+        path: str = MEMORY,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_delay: float = RETRY_DELAY,
+    ) -> None:
+        self._max_attempts = max(1, max_attempts)
+        self._retry_delay = max(0.0, retry_delay)
+
+        try:
+            self._db = sqlite3.connect(path, isolation_level=None)
+            self._db.execute("PRAGMA foreign_keys = ON")
+            if path != Outbox.MEMORY:
+                # Each status change is committed on its own, so the
+                # journal is kept out of the way of readers
+                self._db.execute("PRAGMA journal_mode = WAL")
+                self._db.execute("PRAGMA synchronous = NORMAL")
+            self._db.executescript(Outbox.SCHEMA)
+            self._migrate()
+        except sqlite3.Error as e:
+            raise OutboxError(e)
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(messages)")}
+        if "priority" not in columns:
+            self._db.execute(
+                "ALTER TABLE messages ADD COLUMN priority TEXT NOT NULL DEFAULT ''"
+            )
+        self._db.execute(Outbox.PRIORITY_INDEX)
+
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(deliveries)")}
+        if "next_attempt_at" not in columns:
+            self._db.execute(
+                "ALTER TABLE deliveries "
+                "ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0"
+            )
+
+    def _time(self) -> float:
+        # Wall clock time, as it is kept across restarts
+        return time.time()
+
+    def add(
+        self, email: BroadcastEmail, post_ids: Iterable[str], priority: str = ""
+    ) -> int:
+        """
+        Queue an email announcing the given posts
+        """
+        with self._db:
+            self._db.execute("BEGIN")
+            message_id = self._db.execute(
+                "INSERT INTO messages (subject, body, priority) VALUES (?, ?, ?)",
+                (email.subject, email.body, priority),
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO deliveries (message_id, recipient) VALUES (?, ?)",
+                ((message_id, recipient) for recipient in sorted(email.recipients)),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO message_posts (message_id, post_id) "
+                "VALUES (?, ?)",
+                ((message_id, post_id) for post_id in post_ids),
+            )
+
+        return message_id
+
+    def post_ids(self) -> Set[str]:
+        """
+        Posts which are queued or waiting to be acknowledged
+        """
+        rows = self._db.execute("SELECT DISTINCT post_id FROM message_posts")
+        return {post_id for post_id, in rows}
+
+    def pending(
+        self, after: Optional[Tuple[str, int]] = None, limit: int = 100
+    ) -> List[OutboxMessage]:
+        """
+        Up to `limit` emails which have recipients due to be sent to,
+        addressed to only those recipients. `after` is the `cursor` of
+        the last email of the previous page.
+        """
+        now = self._time()
+        where = ""
+        params: List[object] = []
+        if after is not None:
+            priority, message_id = after
+            where = "AND (priority < ? OR (priority = ? AND id > ?))"
+            params = [priority, priority, message_id]
+
+        rows = self._db.execute(
+            f"""
+SELECT m.id, m.subject, m.body, m.priority, d.recipient
+FROM messages m JOIN deliveries d ON d.message_id = m.id
+WHERE d.status = ? AND d.next_attempt_at <= ? AND m.id IN (
+    SELECT id FROM messages
+    WHERE EXISTS (
+        SELECT 1 FROM deliveries
+        WHERE message_id = messages.id AND status = ? AND next_attempt_at <= ?
+    ) {where}
+    ORDER BY priority DESC, id LIMIT ?
+)
+ORDER BY m.priority DESC, m.id, d.recipient
+""",
+            [Outbox.PENDING, now, Outbox.PENDING, now, *params, limit],
+        )
+
+        grouped: Dict[int, Tuple[str, str, str, List[str]]] = {}
+        for message_id, subject, body, priority, recipient in rows:
+            grouped.setdefault(message_id, (subject, body, priority, []))[3].append(
+                recipient
+            )
+
+        return [
+            OutboxMessage(
+                message_id, BroadcastEmail(recipients, subject, body), priority
+            )
+            for message_id, (subject, body, priority, recipients) in grouped.items()
+        ]
+
+    def record(
+        self,
+        messages: List[OutboxMessage],
+        failures: List[SendFailure],
+        delivered: Optional[List[Tuple[BroadcastEmail, str]]] = None,
+    ) -> None:
+        """
+        Record the outcome of sending `messages`. Recipients listed in
+        `failures` are tried again after a backoff, unless the failure is
+        permanent, and every other recipient is sent. If `delivered` is given, only
+        the recipients in it are sent and the rest are left pending.
+        """
+        message_ids = {id(message.email): message.id for message in messages}
+        now = self._time()
+        if delivered is None:
+            delivered = [
+                (message.email, recipient)
+                for message in messages
+                for recipient in message.email.recipients
+            ]
+
+        with self._db:
+            self._db.execute("BEGIN")
+
+            for failure in failures:
+                message_id = message_ids.get(id(failure.email))
+                if message_id is None:
+                    continue
+
+                self._db.execute(
+                    """
+UPDATE deliveries
+SET attempts = attempts + 1,
+    error = ?,
+    next_attempt_at = ? + ? * (1 << min(attempts, 20)),
+    status = CASE WHEN ? OR attempts + 1 >= ? THEN ? ELSE status END
+WHERE message_id = ? AND recipient = ? AND status = ?
+""",
+                    (
+                        str(failure.error),
+                        now,
+                        self._retry_delay,
+                        failure.permanent,
+                        self._max_attempts,
+                        Outbox.FAILED,
+                        message_id,
+                        failure.recipient,
+                        Outbox.PENDING,
+                    ),
+                )
+
+            failed = {
+                (message_ids.get(id(failure.email)), failure.recipient)
+                for failure in failures
+            }
+            sent = {
+                (message_ids[id(email)], recipient)
+                for email, recipient in delivered
+                if id(email) in message_ids
+            }
+            self._db.executemany(
+                "UPDATE deliveries SET status = ?, attempts = attempts + 1 "
+                "WHERE message_id = ? AND recipient = ? AND status = ?",
+                (
+                    (Outbox.SENT, message_id, recipient, Outbox.PENDING)
+                    for message_id, recipient in sorted(sent - failed)
+                ),
+            )
+
+    def resolved_post_ids(self) -> List[str]:
+        """
+        Posts whose emails have all been sent, or given up on
+        """
+        rows = self._db.execute(
+            """
+SELECT DISTINCT post_id FROM message_posts
+WHERE post_id NOT IN (
+    SELECT mp.post_id FROM message_posts mp
+    JOIN deliveries d ON d.message_id = mp.message_id
+    WHERE d.status = ?
+)
+ORDER BY post_id
+""",
+            (Outbox.PENDING,),
+        )
+        return [post_id for post_id, in rows]
+
+    def ack(self, post_ids: Iterable[str]) -> None:
+        """
+        Forget posts which have been acknowledged upstream, along with
+        any emails which no longer announce a post
+        """
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "DELETE FROM message_posts WHERE post_id = ?",
+                ((post_id,) for post_id in post_ids),
+            )
+            self._db.execute(
+                "DELETE FROM messages WHERE id NOT IN "
+                "(SELECT message_id FROM message_posts)"
+            )
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._db.execute(
+            "SELECT status, COUNT(*) FROM deliveries GROUP BY status"
+        )
+        stats = {Outbox.PENDING: 0, Outbox.SENT: 0, Outbox.FAILED: 0}
+        stats.update(rows)
+        return stats
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,72 @@
+from typing import Callable, Dict, Iterable, List, Sequence
+
+from announcer.api.posts import Post
+
+
+class PostPriority:
+    """
+    Orders posts by how urgently admins should hear about them.
+
+    Each key ranks posts on one property, and later keys break ties in
+    earlier ones:
+
+    - `pinned`: pinned posts first
+    - `author`: posts by one of `authors` first
+    - `newest`: newer posts first
+    - `oldest`: older posts first
+
+    Sort keys are fixed width strings, so they can be compared, and
+    stored, as plain text. Greater keys are more urgent.
+    """
+
+    PINNED = "pinned"
+    AUTHOR = "author"
+    NEWEST = "newest"
+    OLDEST = "oldest"
+
+    KEYS = (PINNED, NEWEST)
+
+    # Wide enough for any timestamp in seconds until the year 5138
+    _TIMESTAMP_WIDTH = 11
+
+    def __init__(self, keys: Sequence[str] = KEYS, authors: Iterable[str] = ()) -> None:
+        rankers: Dict[str, Callable[[Post], str]] = {
+            PostPriority.PINNED: self._pinned,
+            PostPriority.AUTHOR: self._author,
+            PostPriority.NEWEST: self._newest,
+            PostPriority.OLDEST: self._oldest,
+        }
+
+        self._rankers: List[Callable[[Post], str]] = []
+        for key in keys:
+            if key not in rankers:
+                raise ValueError(f"Unknown priority key: {key}")
+            self._rankers.append(rankers[key])
+
+        self._authors = set(authors)
+
+    def _pinned(self, post: Post) -> str:
+        return "1" if post.pinned else "0"
+
+    def _author(self, post: Post) -> str:
+        return "1" if post.author in self._authors else "0"
+
+    def _timestamp(self, post: Post) -> int:
+        return max(0, int(post.date.timestamp()))
+
+    def _newest(self, post: Post) -> str:
+        return str(self._timestamp(post)).zfill(PostPriority._TIMESTAMP_WIDTH)
+
+    def _oldest(self, post: Post) -> str:
+        remaining = 10 ** PostPriority._TIMESTAMP_WIDTH - 1 - self._timestamp(post)
+        return str(remaining).zfill(PostPriority._TIMESTAMP_WIDTH)
+
+    def key(self, post: Post) -> str:
+        return "".join(ranker(post) for ranker in self._rankers)
+
+    def key_for(self, posts: Iterable[Post]) -> str:
+        """
+        Key of an email announcing several posts, which is as urgent
+        as its most urgent post
+        """
+        return max((self.key(post) for post in posts), default="")
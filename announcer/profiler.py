@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import sys
+import threading
+from typing import Counter, List, Optional, Tuple
+
+from announcer.tracing import Tracer, tracer as default_tracer
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every `interval` seconds from a
+    background thread, counting how often each stack is seen.
+
+    Stacks are written in the collapsed format, one `root;...;leaf count`
+    line per stack, which flamegraph.pl and speedscope read.
+    """
+
+    INTERVAL = 0.005
+
+    def __init__(self, interval: float = INTERVAL) -> None:
+        self._interval = interval
+        self._stacks: Counter[Tuple[str, ...]] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def samples(self) -> int:
+        return sum(self._stacks.values())
+
+    def start(self) -> None:
+        """
+        Start sampling the calling thread
+        """
+        if self._thread is not None:
+            return
+
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="SamplingProfiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                return
+
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self._stacks[tuple(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self._stacks.items())
+        )
+
+    def clear(self) -> None:
+        self._stacks.clear()
+
+    def export(self, path: str) -> None:
+        with open(path, "w") as profile_file:
+            profile_file.write(self.collapsed())
+
+
+class ProfileCapture:
+    """
+    Captures the next few ticks when asked to, without a restart: trace
+    spans, as Chrome trace events, and sampled stacks, as collapsed
+    stacks, are written to `directory` once the ticks are done.
+    """
+
+    TICKS = 10
+    # Spans are kept in memory until the capture ends
+    MAX_TICKS = 1000
+
+    def __init__(
+        self,
+        directory: str,
+        tracer: Tracer = default_tracer,
+        interval: float = SamplingProfiler.INTERVAL,
+    ) -> None:
+        self._log = logging.getLogger(ProfileCapture.__name__)
+        self._directory = directory
+        self._tracer = tracer
+        self._profiler = SamplingProfiler(interval)
+
+        self._requested = 0
+        self._remaining = 0
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0
+
+    def request(self, ticks: int = TICKS) -> None:
+        """
+        Capture the next `ticks` ticks, up to `MAX_TICKS`. Asking again
+        during a capture does nothing.
+        """
+        if not self.active:
+            self._requested = min(max(1, ticks), ProfileCapture.MAX_TICKS)
+
+    def tick_started(self) -> None:
+        if self.active or not self._requested:
+            return
+
+        self._log.info(f"Capturing the next {self._requested} tick(s)")
+        self._remaining = self._requested
+        self._requested = 0
+
+        self._tracer.clear()
+        self._tracer.enabled = True
+        self._profiler.clear()
+        self._profiler.start()
+
+    def _write(self, trace_path: str, profile_path: str) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        self._tracer.export(trace_path)
+        self._profiler.export(profile_path)
+
+    async def tick_finished(self) -> Optional[Tuple[str, str]]:
+        """
+        Returns the paths of the trace and profile written, if this
+        tick was the last of a capture. A capture which can't be
+        written is logged and dropped.
+        """
+        if not self.active:
+            return None
+
+        self._remaining -= 1
+        if self._remaining:
+            return None
+
+        self._profiler.stop()
+        self._tracer.enabled = False
+
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        trace_path = os.path.join(self._directory, f"trace-{stamp}.json")
+        profile_path = os.path.join(self._directory, f"profile-{stamp}.txt")
+
+        # Nothing is recorded while the files are written, so they can
+        # be written off the event loop
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self._write, trace_path, profile_path
+            )
+        except OSError as e:
+            self._log.error(f"Could not write profile to {self._directory}: {e}")
+            return None
+        finally:
+            self._tracer.clear()
+            self._profiler.clear()
+
+        self._log.info(f"Wrote trace to {trace_path} and profile to {profile_path}")
+        return trace_path, profile_path
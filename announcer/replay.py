@@ -0,0 +1,92 @@
+import asyncio
+import collections
+import gzip
+import json
+import logging
+import time
+import zlib
+from typing import Any, Deque, Dict, Tuple
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Recorder:
+    """
+    Writes every exchange with another service, its response and how
+    long it took to a gzipped file of JSON lines, one per exchange.
+
+    Each line is flushed as it is written, so a recording is usable up
+    to the last exchange even if the service dies.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._log = logging.getLogger(Recorder.__name__)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._started = time.perf_counter()
+
+    def record(self, kind: str, key: str, start: float, **response: Any) -> None:
+        """
+        Record the `response` to the `kind` exchange identified by `key`,
+        which was started at `start` (by `time.perf_counter`) and has
+        just finished
+        """
+        end = time.perf_counter()
+        exchange = {
+            "kind": kind,
+            "key": key,
+            "at": round(start - self._started, 6),
+            "seconds": round(end - start, 6),
+            **response,
+        }
+        self._file.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+class Replayer:
+    """
+    Serves the exchanges of a recording back in the order they were
+    recorded, after as long as they originally took times
+    `latency_scale`.
+
+    Exchanges are matched by kind and key. Once every recorded response
+    to a key has been served, the last is served again, so a service
+    keeps polling as it would have at the end of the recording.
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0) -> None:
+        self._log = logging.getLogger(Replayer.__name__)
+        self._latency_scale = latency_scale
+        self._exchanges: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = (
+            collections.defaultdict(collections.deque)
+        )
+
+        count = 0
+        with gzip.open(path, "rt", encoding="utf-8") as recording:
+            try:
+                for line in recording:
+                    exchange = json.loads(line)
+                    self._exchanges[exchange["kind"], exchange["key"]].append(exchange)
+                    count += 1
+            except (EOFError, zlib.error, json.JSONDecodeError):
+                # Cut off by the recording service dying, keep what was
+                # written before then
+                self._log.warning(f"Recording ends early after {count} exchange(s)")
+
+        self._log.info(f"Loaded {count} recorded exchange(s)")
+
+    async def replay(self, kind: str, key: str) -> Dict[str, Any]:
+        exchanges = self._exchanges.get((kind, key))
+        if not exchanges:
+            raise ReplayError(f"Nothing recorded for {kind} {key}")
+
+        exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        delay = exchange["seconds"] * self._latency_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return exchange
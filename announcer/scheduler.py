@@ -0,0 +1,112 @@
+import enum
+import random
+import time
+from typing import Callable, Optional
+
+
+class TickOutcome(enum.Enum):
+    # Nothing to announce
+    IDLE = "idle"
+    # New posts were found and announced
+    ACTIVE = "active"
+    # An upstream service failed
+    FAILED = "failed"
+
+
+class PollScheduler:
+    """
+    Decides how long to wait before the next tick.
+
+    Ticks are scheduled on a fixed cadence from a monotonic clock, so
+    the time spent ticking doesn't stretch the period. Right after new
+    posts are found the scheduler polls every `min_interval` seconds,
+    slowing by `idle_growth` on every idle tick up to `max_interval`.
+    When upstreams fail it backs off exponentially, with jitter, up to
+    `max_backoff`.
+    """
+
+    MIN_INTERVAL = 1.0
+    MAX_INTERVAL = 5.0
+    IDLE_GROWTH = 1.5
+    BACKOFF_FACTOR = 2.0
+    MAX_BACKOFF = 300.0
+    JITTER = 0.1
+
+    def __init__(
+        self,
+        min_interval: float = MIN_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        idle_growth: float = IDLE_GROWTH,
+        backoff_factor: float = BACKOFF_FACTOR,
+        max_backoff: float = MAX_BACKOFF,
+        jitter: float = JITTER,
+        clock: Callable[[], float] = time.monotonic,
+        rand: Callable[[float, float], float] = random.uniform,
+    ) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Intervals must satisfy 0 < min_interval <= max_interval")
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._idle_growth = idle_growth
+        self._backoff_factor = backoff_factor
+        self._max_backoff = max(max_backoff, max_interval)
+        self._jitter = jitter
+        self._clock = clock
+        self._rand = rand
+
+        self._interval = max_interval
+        self._failures = 0
+        self._deadline: Optional[float] = None
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    def _backoff(self) -> float:
+        backoff = min(
+            self._max_backoff,
+            self._max_interval * self._backoff_factor ** (self._failures - 1),
+        )
+        return backoff * self._rand(1 - self._jitter, 1 + self._jitter)
+
+    def _next_interval(self, outcome: Optional[TickOutcome]) -> float:
+        if outcome == TickOutcome.FAILED:
+            self._failures += 1
+            return self._backoff()
+
+        self._failures = 0
+
+        if outcome == TickOutcome.ACTIVE:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._max_interval, self._interval * self._idle_growth)
+
+        return self._interval
+
+    def next_delay(self, outcome: Optional[TickOutcome]) -> float:
+        """
+        Seconds to sleep before the next tick, given how the last one went
+        """
+        now = self._clock()
+        if self._deadline is None:
+            self._deadline = now
+
+        self._deadline += self._next_interval(outcome)
+
+        # If ticking took longer than the interval, start a fresh cadence
+        # rather than firing a burst of ticks to catch up
+        if self._deadline < now:
+            self._deadline = now
+
+        return self._deadline - now
+
+    def reset(self) -> None:
+        """
+        Start the cadence from now
+        """
+        self._deadline = self._clock()
@@ -0,0 +1,43 @@
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+
+class HttpServer:
+    """
+    Optional embedded HTTP server, used to receive events from the other
+    Beefboard services. Routes are added to `app` before it is started.
+    """
+
+    HOST = "0.0.0.0"
+
+    def __init__(self, port: int, host: str = HOST) -> None:
+        self._log = logging.getLogger(HttpServer.__name__)
+        self._host = host
+        self._port = port
+
+        self.app = web.Application()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, self._host, self._port).start()
+
+        self._runner = runner
+        self._log.info(f"Listening on {self._host}:{self._port}")
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+
+        await self._runner.cleanup()
+        self._runner = None
@@ -1,15 +1,44 @@
 import asyncio
+import datetime
 import logging
-from typing import List
+import signal
+import time
+from contextlib import contextmanager
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from aiohttp import web
 
-from announcer.api.accounts import AccountsApi, AccountsApiError
-from announcer.api.posts import Post, PostsApi, PostsApiError
+from announcer import tracing
+from announcer.announced import AnnouncedIndex
+from announcer.api.accounts import AccountsApi, AccountsApiError, User
+from announcer.api.cache import RefreshingCache
+from announcer.api.posts import BulkUnsupported, Post, PostsApi, PostsApiError
+from announcer.api.replay import RecordingHttpPool, ReplayHttpPool
+from announcer.api.session import HttpPool
 from announcer.broadcasters.email import (
     BroadcastEmail,
     EmailBroadcaster,
     EmailBroadcasterError,
-    SendError,
 )
+from announcer.broadcasters.pool import SMTPPool
+from announcer.broadcasters.replay import recording_client, replay_client
+from announcer.metrics import MetricsRegistry
+from announcer.outbox import Outbox
+from announcer.priority import PostPriority
+from announcer.profiler import ProfileCapture
+from announcer.replay import Recorder, Replayer
+from announcer.scheduler import PollScheduler, TickOutcome
+from announcer.server import HttpServer
 
 
 class AnnouncerService:
@@ -22,6 +51,49 @@ Please review post here: {post_link}
 """
     EMAIL_POST_SUBJECT = "New Beef submitted - Please review"
 
+    EMAIL_DIGEST_TEMPLATE = """
+Hi,
+
+{num_posts} new posts have been submitted:
+
+{post_lines}
+Please review them here: {posts_link}
+"""
+    EMAIL_DIGEST_POST_TEMPLATE = "- {post_title} by {post_author}: {post_link}\n"
+    EMAIL_DIGEST_SUBJECT = "{num_posts} new Beefs submitted - Please review"
+
+    # One email per post, or one email per recipient covering all new posts
+    MODE_PER_POST = "post"
+    MODE_DIGEST = "digest"
+
+    DIGEST_MAX_POSTS = 50
+
+    # Posts the service still has to announce. The approvalRequested
+    # filter is applied again locally for servers which ignore it
+    NEW_POSTS_QUERY = {"approved": "false", "approvalRequested": "false"}
+    # Only what the emails, priorities and cursor need, so post
+    # content is never downloaded or decoded
+    NEW_POSTS_FIELDS = ("id", "author", "title", "date", "pinned", "approval_requested")
+
+    FULL_POLL_INTERVAL = 60
+
+    METRICS_PATH = "/metrics"
+    PROFILE_PATH = "/v1/profile"
+    PROFILE_SIGNAL = signal.SIGUSR1
+    TICK_PHASES = ("fetch_posts", "fetch_admins", "render", "send", "mark")
+
+    MARK_CONCURRENCY = 10
+    MARK_BATCH_SIZE = 100
+
+    # Emails sent between updates to the outbox. Only this many are
+    # sent twice if the service dies mid send
+    OUTBOX_BATCH_SIZE = 20
+
+    # With events pushed by the posts service, polling is only a safety
+    # net to reconcile anything the events missed
+    RECONCILE_INTERVAL = 60
+    WEBHOOK_DEBOUNCE = 0.5
+
     def __init__(
         self,
         posts_addr: str,
@@ -31,112 +103,702 @@ Please review post here: {post_link}
         email_host: str,
         email_port: int,
         view_posts_base_url: str = "https://beefboard.mooo.com/posts/",
+        http_limit: int = HttpPool.LIMIT,
+        http_limit_per_host: int = HttpPool.LIMIT_PER_HOST,
+        http_dns_cache_ttl: Optional[int] = HttpPool.DNS_CACHE_TTL,
+        smtp_pool_size: int = 0,
+        smtp_idle_timeout: float = SMTPPool.IDLE_TIMEOUT,
+        smtp_concurrency: int = 1,
+        smtp_recipients_per_message: int = 1,
+        smtp_messages_per_second: float = 0,
+        smtp_recipients_per_day: int = 0,
+        smtp_connections_per_minute: int = 0,
+        notification_mode: str = MODE_PER_POST,
+        digest_max_posts: int = DIGEST_MAX_POSTS,
+        digest_window: float = 0,
+        admin_cache_ttl: float = RefreshingCache.TTL,
+        admin_cache_max_stale: float = RefreshingCache.MAX_STALE,
+        incremental_polling: bool = False,
+        full_poll_interval: int = FULL_POLL_INTERVAL,
+        webhook_port: Optional[int] = None,
+        webhook_host: str = HttpServer.HOST,
+        webhook_debounce: float = WEBHOOK_DEBOUNCE,
+        reconcile_interval: float = RECONCILE_INTERVAL,
+        poll_min_interval: float = PollScheduler.MIN_INTERVAL,
+        poll_max_interval: float = PollScheduler.MAX_INTERVAL,
+        poll_max_backoff: float = PollScheduler.MAX_BACKOFF,
+        mark_concurrency: int = MARK_CONCURRENCY,
+        mark_batch_size: int = MARK_BATCH_SIZE,
+        outbox_path: str = Outbox.MEMORY,
+        outbox_max_attempts: int = Outbox.MAX_ATTEMPTS,
+        outbox_retry_delay: float = Outbox.RETRY_DELAY,
+        outbox_batch_size: int = OUTBOX_BATCH_SIZE,
+        announced_path: str = AnnouncedIndex.MEMORY,
+        priority_keys: Sequence[str] = PostPriority.KEYS,
+        priority_authors: Iterable[str] = (),
+        send_budget: int = 0,
+        metrics_port: Optional[int] = None,
+        metrics_host: str = HttpServer.HOST,
+        profile_dir: Optional[str] = None,
+        profile_ticks: int = ProfileCapture.TICKS,
+        record_path: Optional[str] = None,
+        replay_path: Optional[str] = None,
+        replay_latency_scale: float = 1.0,
     ):
         self._log = logging.getLogger(AnnouncerService.__name__)
-        self._posts_api = PostsApi(posts_addr)
-        self._accounts_api = AccountsApi(accounts_addr)
+        self._metrics = MetricsRegistry()
+
+        # Traffic with the posts and accounts services and the SMTP
+        # server can be recorded, or replayed from a recording instead
+        # of going over the network
+        if record_path is not None and replay_path is not None:
+            raise ValueError("Traffic can't be both recorded and replayed")
+
+        self._recorder: Optional[Recorder] = None
+        smtp_client_factory = None
+        if replay_path is not None:
+            replayer = Replayer(replay_path, replay_latency_scale)
+            self._http_pool: HttpPool = ReplayHttpPool(replayer)
+            smtp_client_factory = replay_client(replayer)
+        elif record_path is not None:
+            self._recorder = Recorder(record_path)
+            self._http_pool = RecordingHttpPool(
+                self._recorder,
+                limit=http_limit,
+                limit_per_host=http_limit_per_host,
+                dns_cache_ttl=http_dns_cache_ttl,
+            )
+            smtp_client_factory = recording_client(self._recorder)
+        else:
+            self._http_pool = HttpPool(
+                limit=http_limit,
+                limit_per_host=http_limit_per_host,
+                dns_cache_ttl=http_dns_cache_ttl,
+            )
+
+        self._posts_api = PostsApi(posts_addr, self._http_pool, self._metrics)
+        self._accounts_api = AccountsApi(accounts_addr, self._http_pool, self._metrics)
+        self._admin_cache: RefreshingCache[List[User]] = RefreshingCache(
+            self._load_admins,
+            ttl=admin_cache_ttl,
+            max_stale=admin_cache_max_stale,
+            name="admins",
+            metrics=self._metrics,
+        )
         self._email_broadcaster = EmailBroadcaster(
-            email_host, email_port, email_username, email_password
+            email_host,
+            email_port,
+            email_username,
+            email_password,
+            pool_size=smtp_pool_size,
+            idle_timeout=smtp_idle_timeout,
+            concurrency=smtp_concurrency,
+            recipients_per_message=smtp_recipients_per_message,
+            messages_per_second=smtp_messages_per_second,
+            recipients_per_day=smtp_recipients_per_day,
+            connections_per_minute=smtp_connections_per_minute,
+            metrics=self._metrics,
+            client_factory=smtp_client_factory,
         )
 
         self._posts_base_url = view_posts_base_url
 
+        if notification_mode not in (
+            AnnouncerService.MODE_PER_POST,
+            AnnouncerService.MODE_DIGEST,
+        ):
+            raise ValueError(f"Unknown notification mode: {notification_mode}")
+
+        self._notification_mode = notification_mode
+        self._digest_max_posts = max(1, digest_max_posts)
+        self._digest_window = digest_window
+        self._digest_opened: Optional[float] = None
+
+        # With incremental polling only posts since the newest fully
+        # announced post are requested, with a full poll every
+        # `full_poll_interval` polls as a safety net
+        self._incremental_polling = incremental_polling
+        self._full_poll_interval = full_poll_interval
+        self._posts_cursor: Optional[datetime.datetime] = None
+        self._polls_since_full_poll = 0
+
+        # Emails are queued in the outbox before they are sent, and their
+        # posts stay there until they have been marked upstream
+        self._outbox = Outbox(
+            outbox_path,
+            max_attempts=outbox_max_attempts,
+            retry_delay=outbox_retry_delay,
+        )
+        self._outbox_batch_size = max(1, outbox_batch_size)
+
+        # The most urgent emails are sent first, and at most
+        # `send_budget` emails are sent a tick, if set
+        self._priority = PostPriority(priority_keys, priority_authors)
+        self._send_budget = send_budget
+
+        # Every post ever announced, so that a post is never emailed
+        # twice however long the posts service takes to mark it
+        self._announced = AnnouncedIndex(announced_path, metrics=self._metrics)
+        # Announced posts which the posts service still has as unmarked
+        self._unmarked: Set[str] = set()
+        self._write_back_task: Optional[asyncio.Future] = None
+
+        self._mark_concurrency = max(1, mark_concurrency)
+        self._mark_batch_size = max(1, mark_batch_size)
+        # Cleared if the posts service turns out to have no bulk endpoint
+        self._bulk_marks = True
+
+        self._webhook_debounce = webhook_debounce
+        self._wake: Optional[asyncio.Event] = None
+        self._server: Optional[HttpServer] = None
+        if webhook_port is not None:
+            self._server = HttpServer(webhook_port, webhook_host)
+            self._server.app.router.add_post("/v1/events", self._handle_event)
+            poll_max_interval = reconcile_interval
+
+        # Metrics are served alongside events if they share a port
+        self._metrics_server: Optional[HttpServer] = None
+        admin_server = self._server
+        if metrics_port is not None:
+            if self._server is not None and metrics_port == webhook_port:
+                admin_server = self._server
+            else:
+                admin_server = self._metrics_server = HttpServer(
+                    metrics_port, metrics_host
+                )
+            admin_server.app.router.add_get(
+                AnnouncerService.METRICS_PATH, self._metrics.handle
+            )
+        self._register_metrics()
+
+        # The next `profile_ticks` ticks are traced and profiled into
+        # `profile_dir` on SIGUSR1, or when asked to over HTTP
+        self._capture: Optional[ProfileCapture] = None
+        self._profile_ticks = max(1, profile_ticks)
+        if profile_dir is not None:
+            self._capture = ProfileCapture(profile_dir)
+            if admin_server is not None:
+                admin_server.app.router.add_post(
+                    AnnouncerService.PROFILE_PATH, self._handle_profile
+                )
+
+        self._scheduler = PollScheduler(
+            min_interval=min(poll_min_interval, poll_max_interval),
+            max_interval=poll_max_interval,
+            max_backoff=poll_max_backoff,
+        )
+
+    def _register_metrics(self) -> None:
+        self._tick_latency = self._metrics.histogram(
+            "announcer_tick_seconds", "Time taken by each tick"
+        ).labels()
+        phases = self._metrics.histogram(
+            "announcer_tick_phase_seconds",
+            "Time taken by each phase of a tick",
+            ("phase",),
+        )
+        self._phases = {phase: phases.labels(phase) for phase in self.TICK_PHASES}
+        ticks = self._metrics.counter(
+            "announcer_ticks_total", "Ticks run, by outcome", ("outcome",)
+        )
+        self._tick_outcomes = {
+            outcome: ticks.labels(outcome.value) for outcome in TickOutcome
+        }
+
+        # Backlog gauges read state the service keeps anyway, so they
+        # cost nothing until they are scraped
+        self._metrics.gauge(
+            "announcer_outbox_deliveries",
+            "Deliveries in the outbox, by status",
+            ("status",),
+            lambda: {(status,): n for status, n in self._outbox.stats().items()},
+        )
+        self._metrics.gauge(
+            "announcer_outbox_posts",
+            "Posts queued in the outbox, or waiting to be marked",
+            function=lambda: {(): len(self._outbox.post_ids())},
+        )
+        self._metrics.gauge(
+            "announcer_unmarked_posts",
+            "Announced posts which the posts service has yet to mark",
+            function=lambda: {(): len(self._unmarked)},
+        )
+        self._metrics.gauge(
+            "announcer_announced_posts",
+            "Posts in the announced index",
+            function=lambda: {(): len(self._announced)},
+        )
+        self._metrics.gauge(
+            "announcer_cache_age_seconds",
+            "Age of the cached value, by cache",
+            ("cache",),
+            self._cache_ages,
+        )
+
+    def _cache_ages(self) -> Dict[Tuple[str, ...], float]:
+        # Nothing is reported until the cache has first been loaded
+        age = self._admin_cache.age
+        return {} if age is None else {("admins",): age}
+
+    @contextmanager
+    def _phase(self, phase: str) -> Iterator[None]:
+        with self._phases[phase].time(), tracing.span(phase):
+            yield
+
+    def _next_posts_cursor(self) -> Optional[datetime.datetime]:
+        if self._posts_cursor is None:
+            return None
+
+        self._polls_since_full_poll += 1
+        if self._polls_since_full_poll >= self._full_poll_interval:
+            self._polls_since_full_poll = 0
+            return None
+
+        return self._posts_cursor
+
+    def _advance_posts_cursor(self, announced_posts: List[Post]) -> None:
+        if not self._incremental_polling:
+            return
+
+        newest = max(post.date for post in announced_posts)
+        if self._posts_cursor is None or newest > self._posts_cursor:
+            self._posts_cursor = newest
+
     async def _get_new_posts(self) -> List[Post]:
-        all_new_posts = await self._posts_api.get_posts(query={"approved": "false"})
+        # Posts are filtered as they are read, so that only new ones are
+        # held on to
+        posts = self._posts_api.iter_posts(
+            query=AnnouncerService.NEW_POSTS_QUERY,
+            since=self._next_posts_cursor(),
+            fields=AnnouncerService.NEW_POSTS_FIELDS,
+        )
+
+        return [post async for post in self._filter_new_posts(posts)]
+
+    async def _filter_new_posts(
+        self, posts: AsyncIterator[Post]
+    ) -> AsyncIterator[Post]:
+        """
+        Posts where we haven't already sent out an email
+        """
+        queued = self._outbox.post_ids()
+
+        async for post in posts:
+            if post.approval_requested or post.id in queued:
+                continue
+
+            if post.id in self._announced:
+                # Announced, but the mark was lost, so it is only marked
+                self._unmarked.add(post.id)
+                continue
 
-        new_posts: List[Post] = []
+            yield post
 
-        # Filter new posts for posts where we haven't already
-        # sent out an email
-        for new_post in all_new_posts:
-            if not new_post.approval_requested:
-                new_posts.append(new_post)
-        return new_posts
+    async def _load_admins(self) -> List[User]:
+        return await self._accounts_api.get_accounts({"type": "admin"})
 
     async def _get_admin_emails(self) -> List[str]:
-        admin_users = await self._accounts_api.get_accounts({"type": "admin"})
+        # Admins rarely change, so the cached list is used, and refreshed
+        # in the background once it is stale
+        with self._phase("fetch_admins"):
+            admin_users = await self._admin_cache.get()
+        return [user.email for user in admin_users]
 
-        emails: List[str] = []
-        for user in admin_users:
-            emails.append(user.email)
+    def _post_link(self, post: Post) -> str:
+        return f"{self._posts_base_url}{post.id}"
+
+    def _generate_post_emails(
+        self, recipients: List[str], new_posts: List[Post]
+    ) -> List[Tuple[BroadcastEmail, List[str]]]:
+        emails = []
+        for post in new_posts:
+            email = BroadcastEmail(
+                recipients,
+                AnnouncerService.EMAIL_POST_SUBJECT,
+                AnnouncerService.EMAIL_POST_APPROVAL_TEMPLATE.format(
+                    post_author=post.author,
+                    post_title=post.title,
+                    post_link=self._post_link(post),
+                ),
+            )
+            emails.append((email, [post.id]))
 
         return emails
 
-    def _generate_emails(
+    def _generate_digest_emails(
         self, recipients: List[str], new_posts: List[Post]
-    ) -> List[BroadcastEmail]:
+    ) -> List[Tuple[BroadcastEmail, List[str]]]:
         emails = []
-        for post in new_posts:
-            emails.append(
-                BroadcastEmail(
-                    recipients,
-                    AnnouncerService.EMAIL_POST_SUBJECT,
-                    AnnouncerService.EMAIL_POST_APPROVAL_TEMPLATE.format(
-                        post_author=post.author,
-                        post_title=post.title,
-                        post_link=f"{self._posts_base_url}{post.id}",
-                    ),
+        for i in range(0, len(new_posts), self._digest_max_posts):
+            digest_posts = new_posts[i : i + self._digest_max_posts]
+
+            post_lines = "".join(
+                AnnouncerService.EMAIL_DIGEST_POST_TEMPLATE.format(
+                    post_author=post.author,
+                    post_title=post.title,
+                    post_link=self._post_link(post),
                 )
+                for post in digest_posts
             )
+            email = BroadcastEmail(
+                recipients,
+                AnnouncerService.EMAIL_DIGEST_SUBJECT.format(
+                    num_posts=len(digest_posts)
+                ),
+                AnnouncerService.EMAIL_DIGEST_TEMPLATE.format(
+                    num_posts=len(digest_posts),
+                    post_lines=post_lines,
+                    posts_link=self._posts_base_url,
+                ),
+            )
+            emails.append((email, [post.id for post in digest_posts]))
 
         return emails
 
-    async def _attempt_mark_post_requested(self, post: Post) -> None:
+    def _generate_emails(
+        self, recipients: List[str], new_posts: List[Post]
+    ) -> List[Tuple[BroadcastEmail, List[str]]]:
+        if self._notification_mode == AnnouncerService.MODE_DIGEST:
+            return self._generate_digest_emails(recipients, new_posts)
+        return self._generate_post_emails(recipients, new_posts)
+
+    def _digest_ready(self, new_posts: List[Post]) -> bool:
+        """
+        Whether the digest window has closed, so pending posts should be
+        sent. Held posts are not marked, so they will be collected again
+        on the next tick.
+        """
+        if self._notification_mode != AnnouncerService.MODE_DIGEST:
+            return True
+
+        now = self._time()
+        if self._digest_opened is None:
+            self._digest_opened = now
+
+        if len(new_posts) >= self._digest_max_posts:
+            return True
+
+        return now - self._digest_opened >= self._digest_window
+
+    async def _attempt_mark_post_requested(self, post_id: str) -> bool:
         try:
-            await self._posts_api.set_approval_requested(post.id, True)
+            marked = await self._posts_api.set_approval_requested(post_id, True)
         except PostsApiError as e:
-            self._log.error(f"Could not mark {post.id} as approval requested: {e}")
+            self._log.error(f"Could not mark {post_id} as approval requested: {e}")
+            return False
+
+        if not marked:
+            self._log.error(f"Posts service did not mark {post_id}")
+        return marked
+
+    async def _mark_individually(self, post_ids: List[str]) -> Set[str]:
+        semaphore = asyncio.Semaphore(self._mark_concurrency)
+
+        async def mark(post_id: str) -> bool:
+            async with semaphore:
+                return await self._attempt_mark_post_requested(post_id)
+
+        results = await asyncio.gather(*(mark(post_id) for post_id in post_ids))
+        return {post_id for post_id, marked in zip(post_ids, results) if marked}
+
+    async def _mark_in_bulk(self, post_ids: List[str]) -> Set[str]:
+        marked: Set[str] = set()
+
+        for i in range(0, len(post_ids), self._mark_batch_size):
+            batch = post_ids[i : i + self._mark_batch_size]
+            try:
+                if await self._posts_api.set_approval_requested_bulk(batch, True):
+                    marked.update(batch)
+            except BulkUnsupported:
+                self._log.info("Bulk marking not supported, marking posts one by one")
+                self._bulk_marks = False
+                return marked | await self._mark_individually(post_ids[i:])
+            except PostsApiError as e:
+                self._log.error(f"Could not mark {len(batch)} post(s): {e}")
+
+        return marked
+
+    async def _write_back(self) -> None:
+        """
+        Mark posts whose emails have all been sent as approval requested,
+        along with announced posts the posts service still has unmarked.
+        Posts which could not be marked are tried again after the next tick.
+        """
+        post_ids = sorted(set(self._outbox.resolved_post_ids()) | self._unmarked)
+        if not post_ids:
+            return
+
+        self._log.debug(f"Setting {len(post_ids)} post(s) as approval requested")
+
+        with self._phase("mark"):
+            if self._bulk_marks:
+                marked = await self._mark_in_bulk(post_ids)
+            else:
+                marked = await self._mark_individually(post_ids)
+
+        self._outbox.ack(marked)
+        self._unmarked -= marked
+
+    def _start_write_back(self) -> None:
+        # Marks are written in the background so that a slow posts
+        # service doesn't hold up sending, and only one write back
+        # runs at a time
+        if self._write_back_task is None or self._write_back_task.done():
+            self._write_back_task = asyncio.ensure_future(self._write_back())
+
+    async def _wait_for_write_back(self) -> None:
+        if self._write_back_task is not None:
+            await self._write_back_task
+
+    def _enqueue(self, recipients: List[str], new_posts: List[Post]) -> None:
+        with self._phase("render"):
+            emails = self._generate_emails(recipients, new_posts)
+        self._log.debug(f"Queueing {len(emails)} email(s) to admins")
+
+        posts = {post.id: post for post in new_posts}
+        for email, post_ids in emails:
+            priority = self._priority.key_for(posts[post_id] for post_id in post_ids)
+            self._outbox.add(email, post_ids, priority)
+        self._announced.add(post.id for post in new_posts)
+
+    async def _deliver(self) -> bool:
+        """
+        Send the emails waiting in the outbox, most urgent first and a
+        batch at a time, recording which recipients each was sent to as
+        each batch completes. Returns whether the send budget ran out
+        before the outbox was drained.
+        """
+        cursor: Optional[Tuple[str, int]] = None
+        sent = 0
+        while True:
+            limit = self._outbox_batch_size
+            if self._send_budget > 0:
+                if sent >= self._send_budget:
+                    return bool(self._outbox.pending(cursor, 1))
+                limit = min(limit, self._send_budget - sent)
+
+            messages = self._outbox.pending(cursor, limit)
+            if not messages:
+                return False
+            cursor = messages[-1].cursor
+            sent += len(messages)
+
+            self._log.debug(f"Broadcasting {len(messages)} email(s) to admins")
+            try:
+                report = await self._email_broadcaster.send(
+                    [message.email for message in messages]
+                )
+            except EmailBroadcasterError as e:
+                # Keep what was sent before the error, so it isn't sent
+                # again on the next tick
+                if e.report is not None:
+                    self._outbox.record(messages, e.report.failures, e.report.delivered)
+                raise
+
+            if not report.ok:
+                self._log.warning(
+                    f"Could not send {len(report.failures)} message(s), "
+                    f"{len(report.permanent_failures)} permanently"
+                )
+            self._log.debug(f"SMTP budget left: {self._email_broadcaster.budget()}")
+
+            if report.deferred:
+                # Deferred recipients are left pending for a later tick
+                self._outbox.record(messages, report.failures, report.delivered)
+                self._log.info(
+                    f"Over the SMTP quota, holding {len(report.deferred)} "
+                    "recipient(s) for later"
+                )
+                return False
+            self._outbox.record(messages, report.failures)
+
+    def _discard(self, task: asyncio.Future) -> None:
+        # Retrieve any error so it isn't reported as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        task.cancel()
+
+    async def _tick(self) -> TickOutcome:
+        if self._capture is not None:
+            self._capture.tick_started()
+
+        try:
+            with self._tick_latency.time(), tracing.span("tick"):
+                outcome = await self._run_tick()
+        finally:
+            if self._capture is not None:
+                await self._capture.tick_finished()
+
+        self._tick_outcomes[outcome].inc()
+        return outcome
+
+    async def _collect(self) -> TickOutcome:
+        # Admins are fetched at the same time as posts so that the tick
+        # only waits on the slower of the two services
+        self._log.debug("Collecting new posts and admin emails")
+        admins_task = asyncio.ensure_future(self._get_admin_emails())
 
-    async def _tick(self) -> None:
-        self._log.debug("Collecting new posts")
         try:
-            new_posts = await self._get_new_posts()
+            with self._phase("fetch_posts"):
+                new_posts = await self._get_new_posts()
         except PostsApiError as e:
             self._log.error(f"Could not get new posts: {e}")
-            return
+            self._discard(admins_task)
+            return TickOutcome.FAILED
 
         if not new_posts:
-            self._log.debug("No new posts, finishing tick")
-            return
+            self._log.debug("No new posts")
+            self._digest_opened = None
+            self._discard(admins_task)
+            return TickOutcome.IDLE
+
+        if not self._digest_ready(new_posts):
+            self._log.debug(f"Holding {len(new_posts)} post(s) for digest")
+            self._discard(admins_task)
+            return TickOutcome.IDLE
 
-        self._log.debug("Getting admin emails")
         try:
-            admin_emails = await self._get_admin_emails()
+            admin_emails = await admins_task
         except AccountsApiError as e:
             self._log.error(f"Could not get admin emails: {e}")
-            return
+            return TickOutcome.FAILED
 
         if not admin_emails:
-            return
+            return TickOutcome.IDLE
 
         self._log.debug(f"Got {len(admin_emails)} admin email(s)")
+        self._enqueue(admin_emails, new_posts)
+        self._digest_opened = None
+
+        # Queued posts are never collected again, so the cursor
+        # can move past them
+        self._advance_posts_cursor(new_posts)
+        return TickOutcome.ACTIVE
 
-        emails = self._generate_emails(admin_emails, new_posts)
+    async def _run_tick(self) -> TickOutcome:
+        outcome = await self._collect()
 
-        self._log.debug(f"Broadcasting {len(emails)} email(s) to admins")
+        # Emails left over from earlier ticks are sent along with new
+        # ones, even when the upstreams couldn't be reached this tick
         try:
-            await self._email_broadcaster.send(emails)
-        except SendError as e:
-            self._log.warning(
-                f"Could not send emails: ({e}). Marking emails as sent anyway"
-            )
+            with self._phase("send"):
+                budget_used = await self._deliver()
+            if budget_used and outcome != TickOutcome.FAILED:
+                # Come back soon for the rest of the backlog
+                self._log.debug("Send budget used up, holding the rest")
+                outcome = TickOutcome.ACTIVE
         except EmailBroadcasterError as e:
             self._log.error(f"Could not broadcast messages: {e}")
+            return TickOutcome.FAILED
+
+        self._start_write_back()
+        return outcome
+
+    def _time(self) -> float:
+        return time.monotonic()
+
+    def _get_wake_event(self) -> asyncio.Event:
+        # Created lazily so that the event belongs to the running loop
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def trigger(self) -> None:
+        """
+        Run the next tick as soon as possible instead of waiting for
+        the next poll
+        """
+        self._get_wake_event().set()
+
+    async def _handle_event(self, request: web.Request) -> web.Response:
+        self._log.debug("Received event, triggering tick")
+        self.trigger()
+        return web.json_response({"success": True}, status=202)
+
+    def profile(self, ticks: Optional[int] = None) -> None:
+        """
+        Trace and profile the next `ticks` ticks, if a profile directory
+        is set
+        """
+        if self._capture is None:
+            self._log.warning("No profile directory set, not profiling")
             return
 
-        self._log.debug(f"Setting {len(new_posts)} as approval requested")
-        tasks = []
-        for post in new_posts:
-            tasks.append(self._attempt_mark_post_requested(post))
+        self._capture.request(ticks or self._profile_ticks)
+
+    async def _handle_profile(self, request: web.Request) -> web.Response:
+        try:
+            ticks = int(request.query.get("ticks", self._profile_ticks))
+        except ValueError:
+            return web.json_response(
+                {"success": False, "error": "ticks must be a number"}, status=400
+            )
+        if not 1 <= ticks <= ProfileCapture.MAX_TICKS:
+            return web.json_response(
+                {
+                    "success": False,
+                    "error": f"ticks must be from 1 to {ProfileCapture.MAX_TICKS}",
+                },
+                status=400,
+            )
+
+        self.profile(ticks)
+        return web.json_response({"success": True, "ticks": ticks}, status=202)
+
+    async def _sleep(self, time: float) -> None:
+        if self._wake is None:
+            await asyncio.sleep(time)
+            return
 
-        await asyncio.wait(tasks)
+        try:
+            await asyncio.wait_for(self._wake.wait(), time)
+        except asyncio.TimeoutError:
+            return
 
-    async def _sleep(self, time: int) -> None:
-        await asyncio.sleep(time)
+        # Give a burst of events the chance to arrive, so they are
+        # all handled by a single tick
+        await asyncio.sleep(self._webhook_debounce)
+        self._wake.clear()
+        # The tick runs early, so the next one is due an interval after
+        # now rather than after the deadline we slept towards
+        self._scheduler.reset()
 
     async def main_loop(self) -> None:
         self._log.info("Starting main loop")
 
+        if self._server:
+            self._get_wake_event()
+            await self._server.start()
+        if self._metrics_server:
+            await self._metrics_server.start()
+        if self._capture is not None:
+            asyncio.get_event_loop().add_signal_handler(
+                AnnouncerService.PROFILE_SIGNAL, self.profile
+            )
+
+        self._scheduler.reset()
         while True:
-            await self._tick()
-            await self._sleep(5)
+            outcome = await self._tick()
+            await self._sleep(self._scheduler.next_delay(outcome))
+
+    async def close(self) -> None:
+        self._log.info("Closing connections")
+        if self._server:
+            await self._server.stop()
+        if self._metrics_server:
+            await self._metrics_server.stop()
+        if self._capture is not None:
+            asyncio.get_event_loop().remove_signal_handler(
+                AnnouncerService.PROFILE_SIGNAL
+            )
+        try:
+            await self._wait_for_write_back()
+        except Exception as e:
+            # Unmarked posts are marked again after a restart, so the
+            # rest of the service is still closed
+            self._log.error(f"Could not finish writing back: {e}")
+        await self._http_pool.close()
+        await self._email_broadcaster.close()
+        self._outbox.close()
+        self._announced.close()
+        if self._recorder is not None:
+            self._recorder.close()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from announcer.announced import AnnouncedIndex, AnnouncedIndexError, BloomFilter
+from announcer.metrics import MetricsRegistry
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self) -> None:
+        bloom = BloomFilter(1000)
+        keys = [f"post{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        for key in keys:
+            self.assertIn(key, bloom)
+
+    def test_false_positive_rate(self) -> None:
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"post{i}")
+
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_size(self) -> None:
+        # Around 1.2 bytes per key at a 1% error rate
+        self.assertLess(BloomFilter(100_000, error_rate=0.01).size, 125_000)
+
+    def test_only_strings(self) -> None:
+        self.assertNotIn(1, BloomFilter(10))
+
+
+class TestAnnouncedIndex(unittest.TestCase):
+    def test_invalid_path(self) -> None:
+        with self.assertRaises(AnnouncedIndexError):
+            AnnouncedIndex("/does/not/exist/announced.sqlite3")
+
+    def test_add(self) -> None:
+        index = AnnouncedIndex()
+        index.add(["post1", "post2", "post1"])
+
+        self.assertIn("post1", index)
+        self.assertIn("post2", index)
+        self.assertNotIn("post3", index)
+        self.assertEqual(len(index), 2)
+
+    def lookups(self, result: str) -> str:
+        return f'{AnnouncedIndex.LOOKUPS}{{result="{result}"}}'
+
+    def test_filter_avoids_lookups(self) -> None:
+        registry = MetricsRegistry()
+        index = AnnouncedIndex(metrics=registry)
+        index.add(["post1"])
+
+        self.assertNotIn("post2", index)
+        self.assertIn("post1", index)
+
+        metrics = registry.render()
+        self.assertIn(f"{self.lookups('filtered')} 1\n", metrics)
+        self.assertIn(f"{self.lookups('found')} 1\n", metrics)
+
+    def test_false_positives_are_checked(self) -> None:
+        registry = MetricsRegistry()
+        index = AnnouncedIndex(metrics=registry)
+        index._filter.add("post1")
+
+        self.assertNotIn("post1", index)
+        self.assertIn(f"{self.lookups('false_positive')} 1\n", registry.render())
+
+    def test_grows(self) -> None:
+        index = AnnouncedIndex(capacity=10)
+        index.add(f"post{i}" for i in range(25))
+
+        self.assertEqual(index._filter.capacity, 50)
+        for i in range(25):
+            self.assertIn(f"post{i}", index)
+
+    def test_durable(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "announced.sqlite3")
+
+            index = AnnouncedIndex(path, capacity=10)
+            index.add(f"post{i}" for i in range(20))
+            index.close()
+
+            index = AnnouncedIndex(path, capacity=10)
+            self.assertEqual(len(index), 20)
+            self.assertEqual(index._filter.capacity, 40)
+            self.assertIn("post19", index)
+            index.close()
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import Mock
+
+import asynctest
+
+from announcer.metrics import MetricsRegistry, track
+
+
+class TestMetricsRegistry(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+
+    def test_counter(self) -> None:
+        counter = self.registry.counter("test_total", "A counter", ("kind",))
+        counter.labels("a").inc()
+        counter.labels("a").inc(2)
+        counter.labels("b").inc(0.5)
+
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP test_total A counter\n"
+            "# TYPE test_total counter\n"
+            'test_total{kind="a"} 3\n'
+            'test_total{kind="b"} 0.5\n',
+        )
+
+    def test_unlabelled(self) -> None:
+        self.registry.counter("test_total", "A counter").inc()
+        gauge = self.registry.gauge("test_gauge", "A gauge")
+        gauge.set(5)
+        gauge.labels().dec(2)
+
+        rendered = self.registry.render()
+        self.assertIn("\ntest_total 1\n", rendered)
+        self.assertIn("\ntest_gauge 3\n", rendered)
+
+    def test_gauge_function(self) -> None:
+        backlog = {"pending": 2, "sent": 5}
+        self.registry.gauge(
+            "test_backlog",
+            "A backlog",
+            ("status",),
+            lambda: {(status,): n for status, n in backlog.items()},
+        )
+
+        self.assertIn('test_backlog{status="pending"} 2\n', self.registry.render())
+
+        backlog["pending"] = 0
+        self.assertIn('test_backlog{status="pending"} 0\n', self.registry.render())
+
+    def test_histogram(self) -> None:
+        histogram = self.registry.histogram(
+            "test_seconds", "A histogram", ("phase",), buckets=(1, 0.1)
+        )
+        series = histogram.labels("send")
+        for value in (0.05, 0.1, 0.5, 2):
+            series.observe(value)
+
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP test_seconds A histogram\n"
+            "# TYPE test_seconds histogram\n"
+            'test_seconds_bucket{phase="send",le="0.1"} 2\n'
+            'test_seconds_bucket{phase="send",le="1"} 3\n'
+            'test_seconds_bucket{phase="send",le="+Inf"} 4\n'
+            'test_seconds_sum{phase="send"} 2.65\n'
+            'test_seconds_count{phase="send"} 4\n',
+        )
+
+    def test_histogram_time(self) -> None:
+        histogram = self.registry.histogram("test_seconds", "A histogram")
+
+        with self.assertRaises(KeyError):
+            with histogram.labels().time():
+                raise KeyError()
+        histogram.observe(1)
+
+        self.assertEqual(histogram.labels().count, 2)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 2\n', self.registry.render())
+
+    def test_escapes_labels(self) -> None:
+        counter = self.registry.counter("test_total", 'Help with "quotes"', ("name",))
+        counter.labels('a "b"\\\n').inc()
+
+        rendered = self.registry.render()
+        self.assertIn('# HELP test_total Help with \\"quotes\\"\n', rendered)
+        self.assertIn('test_total{name="a \\"b\\"\\\\\\n"} 1\n', rendered)
+
+    def test_wrong_labels(self) -> None:
+        counter = self.registry.counter("test_total", "A counter", ("kind",))
+
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_shared_metrics(self) -> None:
+        first = self.registry.counter("test_total", "A counter", ("kind",))
+        self.assertIs(
+            self.registry.counter("test_total", "A counter", ("kind",)), first
+        )
+
+        with self.assertRaises(ValueError):
+            self.registry.counter("test_total", "A counter", ("other",))
+        with self.assertRaises(ValueError):
+            self.registry.gauge("test_total", "A gauge", ("kind",))
+
+    async def test_handle(self) -> None:
+        self.registry.counter("test_total", "A counter").inc()
+
+        response = await self.registry.handle(Mock())
+
+        self.assertEqual(response.headers["Content-Type"], MetricsRegistry.CONTENT_TYPE)
+        self.assertEqual(response.body, self.registry.render().encode())
+
+
+class TestTrack(unittest.TestCase):
+    def test_track(self) -> None:
+        registry = MetricsRegistry()
+        latency = registry.histogram("test_seconds", "Latency").labels()
+        errors = registry.counter("test_errors_total", "Errors").labels()
+
+        with track(latency, errors, KeyError):
+            pass
+
+        with self.assertRaises(KeyError):
+            with track(latency, errors, KeyError):
+                raise KeyError()
+
+        with self.assertRaises(ValueError):
+            with track(latency, errors, KeyError):
+                raise ValueError()
+
+        self.assertEqual(latency.count, 3)
+        self.assertEqual(errors.value, 1)
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from aiosmtplib.errors import SMTPRecipientRefused
+
+from announcer.broadcasters.email import BroadcastEmail, SendFailure
+from announcer.outbox import Outbox, OutboxError
+
+
+class TestOutbox(unittest.TestCase):
+    def generate_email(self, subject: str = "subject") -> BroadcastEmail:
+        return BroadcastEmail(["b@test.com", "a@test.com"], subject, "body")
+
+    def test_invalid_path(self) -> None:
+        with self.assertRaises(OutboxError):
+            Outbox("/does/not/exist/outbox.sqlite3")
+
+    def test_add(self) -> None:
+        outbox = Outbox()
+        email = self.generate_email()
+
+        message_id = outbox.add(email, ["post1", "post2"])
+
+        self.assertEqual(outbox.post_ids(), {"post1", "post2"})
+        pending = outbox.pending()
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0].id, message_id)
+        self.assertEqual(pending[0].email, email)
+        self.assertEqual(outbox.stats(), {"pending": 2, "sent": 0, "failed": 0})
+
+    def test_pending_pages(self) -> None:
+        outbox = Outbox()
+        ids = [outbox.add(self.generate_email(str(i)), [f"post{i}"]) for i in range(5)]
+
+        first = outbox.pending(limit=2)
+        self.assertEqual([message.id for message in first], ids[:2])
+
+        rest = outbox.pending(after=first[-1].cursor, limit=10)
+        self.assertEqual([message.id for message in rest], ids[2:])
+
+    def test_pending_by_priority(self) -> None:
+        outbox = Outbox()
+        low = outbox.add(self.generate_email("low"), ["post1"], "0")
+        high = outbox.add(self.generate_email("high"), ["post2"], "2")
+        medium = outbox.add(self.generate_email("medium"), ["post3"], "1")
+        medium2 = outbox.add(self.generate_email("medium2"), ["post4"], "1")
+
+        first = outbox.pending(limit=2)
+        self.assertEqual([message.id for message in first], [high, medium])
+
+        rest = outbox.pending(after=first[-1].cursor)
+        self.assertEqual([message.id for message in rest], [medium2, low])
+
+    def test_adds_priority_to_old_outboxes(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.sqlite3")
+
+            db = sqlite3.connect(path)
+            db.execute(
+                "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "subject TEXT NOT NULL, body TEXT NOT NULL)"
+            )
+            db.commit()
+            db.close()
+
+            outbox = Outbox(path)
+            outbox.add(self.generate_email(), ["post1"], "1")
+            self.assertEqual(outbox.pending()[0].priority, "1")
+            outbox.close()
+
+    def test_adds_retries_to_old_outboxes(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.sqlite3")
+
+            db = sqlite3.connect(path)
+            db.execute(
+                "CREATE TABLE deliveries (message_id INTEGER NOT NULL, "
+                "recipient TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "PRIMARY KEY (message_id, recipient))"
+            )
+            db.commit()
+            db.close()
+
+            outbox = Outbox(path)
+            outbox.add(self.generate_email(), ["post1"])
+            self.assertEqual(len(outbox.pending()), 1)
+            outbox.close()
+
+    def test_record_sent(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email(), ["post1"])
+
+        self.assertEqual(outbox.resolved_post_ids(), [])
+        outbox.record(outbox.pending(), [])
+
+        self.assertEqual(outbox.pending(), [])
+        self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+        self.assertEqual(outbox.stats(), {"pending": 0, "sent": 2, "failed": 0})
+
+    def test_record_failures_are_retried(self) -> None:
+        outbox = Outbox(max_attempts=2, retry_delay=0)
+        outbox.add(self.generate_email(), ["post1"])
+
+        error = SMTPRecipientRefused(550, "No such user", "b@test.com")
+        messages = outbox.pending()
+        outbox.record(messages, [SendFailure(messages[0].email, "b@test.com", error)])
+
+        # Only the failed recipient is left to send to
+        messages = outbox.pending()
+        self.assertEqual(messages[0].email.recipients, {"b@test.com"})
+        self.assertEqual(outbox.resolved_post_ids(), [])
+
+        outbox.record(messages, [SendFailure(messages[0].email, "b@test.com", error)])
+
+        # Until it has failed too many times
+        self.assertEqual(outbox.pending(), [])
+        self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+        self.assertEqual(outbox.stats(), {"pending": 0, "sent": 1, "failed": 1})
+
+    def test_record_failures_back_off(self) -> None:
+        outbox = Outbox(max_attempts=5, retry_delay=10)
+        outbox.add(self.generate_email(), ["post1"])
+
+        error = SMTPRecipientRefused(450, "Busy", "b@test.com")
+        with patch.object(outbox, "_time", return_value=1000):
+            messages = outbox.pending()
+            outbox.record(
+                messages, [SendFailure(messages[0].email, "b@test.com", error)]
+            )
+
+        # Held back until the delay has passed
+        with patch.object(outbox, "_time", return_value=1009):
+            self.assertEqual(outbox.pending(), [])
+        with patch.object(outbox, "_time", return_value=1010):
+            messages = outbox.pending()
+            self.assertEqual(messages[0].email.recipients, {"b@test.com"})
+            outbox.record(
+                messages, [SendFailure(messages[0].email, "b@test.com", error)]
+            )
+
+        # And the delay doubles with each attempt
+        with patch.object(outbox, "_time", return_value=1029):
+            self.assertEqual(outbox.pending(), [])
+        with patch.object(outbox, "_time", return_value=1030):
+            self.assertEqual(len(outbox.pending()), 1)
+        self.assertEqual(outbox.resolved_post_ids(), [])
+
+    def test_record_permanent_failures(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email(), ["post1"])
+
+        error = SMTPRecipientRefused(550, "No such user", "b@test.com")
+        messages = outbox.pending()
+        outbox.record(
+            messages,
+            [SendFailure(messages[0].email, "b@test.com", error, permanent=True)],
+        )
+
+        self.assertEqual(outbox.pending(), [])
+        self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+        self.assertEqual(outbox.stats(), {"pending": 0, "sent": 1, "failed": 1})
+
+    def test_record_partial_delivery(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email("1"), ["post1"])
+        outbox.add(self.generate_email("2"), ["post2"])
+
+        messages = outbox.pending()
+        outbox.record(
+            messages,
+            [],
+            [(messages[0].email, "a@test.com"), (self.generate_email(), "a@test.com")],
+        )
+
+        # Recipients missing from the report are still to be sent to
+        self.assertEqual(
+            [message.email.recipients for message in outbox.pending()],
+            [{"b@test.com"}, {"a@test.com", "b@test.com"}],
+        )
+        self.assertEqual(outbox.stats(), {"pending": 3, "sent": 1, "failed": 0})
+
+    def test_record_ignores_unknown_emails(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email(), ["post1"])
+
+        error = SMTPRecipientRefused(550, "No such user", "b@test.com")
+        outbox.record(
+            outbox.pending(), [SendFailure(self.generate_email(), "b@test.com", error)]
+        )
+
+        self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+
+    def test_post_waits_for_all_its_emails(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email("1"), ["post1", "post2"])
+        outbox.add(self.generate_email("2"), ["post2"])
+
+        outbox.record(outbox.pending(limit=1), [])
+
+        self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+
+    def test_ack(self) -> None:
+        outbox = Outbox()
+        outbox.add(self.generate_email("1"), ["post1", "post2"])
+        outbox.add(self.generate_email("2"), ["post3"])
+        outbox.record(outbox.pending(), [])
+
+        outbox.ack(["post1"])
+        self.assertEqual(outbox.post_ids(), {"post2", "post3"})
+        self.assertEqual(outbox.stats()["sent"], 4)
+
+        # Emails are forgotten once none of their posts are left
+        outbox.ack(["post2", "post3"])
+        self.assertEqual(outbox.post_ids(), set())
+        self.assertEqual(outbox.stats(), {"pending": 0, "sent": 0, "failed": 0})
+
+    def test_durable(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.sqlite3")
+
+            outbox = Outbox(path)
+            outbox.add(self.generate_email("1"), ["post1"])
+            outbox.add(self.generate_email("2"), ["post2"])
+            outbox.record(outbox.pending(limit=1), [])
+            outbox.close()
+
+            outbox = Outbox(path)
+            self.assertEqual(outbox.post_ids(), {"post1", "post2"})
+            self.assertEqual(outbox.resolved_post_ids(), ["post1"])
+            self.assertEqual(
+                [message.email.subject for message in outbox.pending()], ["2"]
+            )
+            outbox.close()
@@ -0,0 +1,61 @@
+import datetime
+import unittest
+
+from announcer.api.posts import Post
+from announcer.priority import PostPriority
+
+
+class TestPostPriority(unittest.TestCase):
+    def generate_post(
+        self, post_id: str, days_old: int = 0, pinned: bool = False, author: str = "me"
+    ) -> Post:
+        return Post(
+            id=post_id,
+            date=datetime.datetime(2018, 10, 20) - datetime.timedelta(days=days_old),
+            title="test",
+            author=author,
+            content="test",
+            num_images=0,
+            pinned=pinned,
+        )
+
+    def order(self, priority: PostPriority, posts) -> list:
+        return [post.id for post in sorted(posts, key=priority.key, reverse=True)]
+
+    def test_unknown_key(self) -> None:
+        with self.assertRaises(ValueError):
+            PostPriority(["loudest"])
+
+    def test_default(self) -> None:
+        posts = [
+            self.generate_post("old", days_old=2),
+            self.generate_post("new"),
+            self.generate_post("pinned", days_old=5, pinned=True),
+        ]
+
+        self.assertEqual(self.order(PostPriority(), posts), ["pinned", "new", "old"])
+
+    def test_oldest(self) -> None:
+        posts = [self.generate_post("new"), self.generate_post("old", days_old=2)]
+
+        self.assertEqual(
+            self.order(PostPriority([PostPriority.OLDEST]), posts), ["old", "new"]
+        )
+
+    def test_author(self) -> None:
+        posts = [
+            self.generate_post("new"),
+            self.generate_post("boss", days_old=2, author="boss"),
+        ]
+        priority = PostPriority(
+            [PostPriority.AUTHOR, PostPriority.NEWEST], authors=["boss"]
+        )
+
+        self.assertEqual(self.order(priority, posts), ["boss", "new"])
+
+    def test_key_for_several_posts(self) -> None:
+        priority = PostPriority()
+        posts = [self.generate_post("a", days_old=2), self.generate_post("b")]
+
+        self.assertEqual(priority.key_for(posts), priority.key(posts[1]))
+        self.assertEqual(priority.key_for([]), "")
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import asynctest
+
+from announcer.profiler import ProfileCapture, SamplingProfiler
+from announcer.tracing import Tracer
+
+
+def busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_calling_thread(self) -> None:
+        profiler = SamplingProfiler(interval=0.001)
+
+        profiler.start()
+        # Starting twice does nothing
+        profiler.start()
+        self.assertTrue(profiler.running)
+        busy(0.05)
+        profiler.stop()
+        profiler.stop()
+        self.assertFalse(profiler.running)
+
+        self.assertGreater(profiler.samples, 0)
+        collapsed = profiler.collapsed()
+        self.assertIn("busy (test_profiler.py:", collapsed)
+
+        line = collapsed.splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn(";", stack)
+
+        profiler.clear()
+        self.assertEqual(profiler.samples, 0)
+        self.assertEqual(profiler.collapsed(), "")
+
+    def test_stops_when_thread_exits(self) -> None:
+        profiler = SamplingProfiler(interval=0.001)
+
+        thread = threading.Thread(target=profiler.start)
+        thread.start()
+        thread.join()
+        assert profiler._thread is not None
+        profiler._thread.join(1)
+
+        self.assertFalse(profiler._thread.is_alive())
+        profiler.stop()
+
+    def test_export(self) -> None:
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy(0.01)
+        profiler.stop()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.txt")
+            profiler.export(path)
+
+            with open(path) as profile_file:
+                self.assertEqual(profile_file.read(), profiler.collapsed())
+
+
+class TestProfileCapture(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.tracer = Tracer()
+        self.capture = ProfileCapture(
+            os.path.join(self.directory.name, "profiles"), self.tracer, 0.001
+        )
+
+    def tearDown(self) -> None:
+        self.capture._profiler.stop()
+        self.directory.cleanup()
+
+    def tick(self) -> None:
+        self.capture.tick_started()
+        with self.tracer.span("tick"):
+            busy(0.01)
+
+    async def test_idle_without_request(self) -> None:
+        self.tick()
+
+        self.assertIsNone(await self.capture.tick_finished())
+        self.assertFalse(self.tracer.enabled)
+        self.assertEqual(self.tracer.spans, [])
+
+    async def test_captures_requested_ticks(self) -> None:
+        self.capture.request(2)
+        self.assertFalse(self.capture.active)
+
+        self.tick()
+        self.assertTrue(self.capture.active)
+        self.assertTrue(self.tracer.enabled)
+        self.assertIsNone(await self.capture.tick_finished())
+
+        # Requests during a capture are ignored
+        self.capture.request(5)
+
+        self.tick()
+        paths = await self.capture.tick_finished()
+        assert paths is not None
+        trace_path, profile_path = paths
+
+        self.assertFalse(self.capture.active)
+        self.assertFalse(self.tracer.enabled)
+        self.assertFalse(self.capture._profiler.running)
+
+        with open(trace_path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+        self.assertEqual([event["name"] for event in events], ["tick", "tick"])
+        with open(profile_path) as profile_file:
+            self.assertIn("busy (test_profiler.py:", profile_file.read())
+
+        # Nothing more is captured until asked again
+        self.tick()
+        self.assertIsNone(await self.capture.tick_finished())
+
+    async def test_captures_at_least_one_tick(self) -> None:
+        self.capture.request(0)
+
+        self.tick()
+
+        self.assertIsNotNone(await self.capture.tick_finished())
+
+    def test_captures_at_most_max_ticks(self) -> None:
+        self.capture.request(10 ** 9)
+
+        self.assertEqual(self.capture._requested, ProfileCapture.MAX_TICKS)
+
+    async def test_write_failure_is_logged(self) -> None:
+        # A file where the directory should be
+        path = os.path.join(self.directory.name, "profiles")
+        with open(path, "w"):
+            pass
+
+        self.capture.request(1)
+        self.tick()
+        with self.assertLogs("ProfileCapture", "ERROR"):
+            self.assertIsNone(await self.capture.tick_finished())
+
+        self.assertFalse(self.capture.active)
+        self.assertFalse(self.tracer.enabled)
+        self.assertEqual(self.tracer.spans, [])
+        self.assertEqual(self.capture._profiler.samples, 0)
@@ -0,0 +1,84 @@
+import gzip
+import os
+import tempfile
+import time
+
+import asynctest
+
+from announcer.replay import Recorder, ReplayError, Replayer
+
+
+class TestRecordReplay(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "traffic.jsonl.gz")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def record(self, *exchanges) -> None:
+        recorder = Recorder(self.path)
+        for kind, key, response in exchanges:
+            recorder.record(kind, key, time.perf_counter(), **response)
+        recorder.close()
+        recorder.close()
+
+    async def test_replays_in_order(self) -> None:
+        self.record(
+            ("http", "GET /posts", {"status": 200}),
+            ("smtp", "connect", {}),
+            ("http", "GET /posts", {"status": 304}),
+        )
+        replayer = Replayer(self.path, latency_scale=0)
+
+        first = await replayer.replay("http", "GET /posts")
+        self.assertEqual(first["status"], 200)
+        self.assertGreaterEqual(first["seconds"], 0)
+        self.assertIn("at", first)
+        self.assertEqual((await replayer.replay("http", "GET /posts"))["status"], 304)
+
+        # The last response is served again once the recording runs out
+        self.assertEqual((await replayer.replay("http", "GET /posts"))["status"], 304)
+        self.assertEqual((await replayer.replay("smtp", "connect"))["kind"], "smtp")
+
+    async def test_nothing_recorded(self) -> None:
+        self.record(("http", "GET /posts", {"status": 200}))
+        replayer = Replayer(self.path)
+
+        with self.assertRaises(ReplayError):
+            await replayer.replay("http", "GET /accounts")
+
+    async def test_scales_latency(self) -> None:
+        recorder = Recorder(self.path)
+        recorder.record("http", "GET /posts", time.perf_counter() - 0.5, status=200)
+        recorder.close()
+
+        with asynctest.patch("asyncio.sleep") as sleep:
+            await Replayer(self.path, latency_scale=2).replay("http", "GET /posts")
+
+        (delay,), _ = sleep.call_args
+        self.assertGreaterEqual(delay, 1)
+        self.assertLess(delay, 2)
+
+    async def test_recording_cut_off(self) -> None:
+        self.record(
+            ("http", "GET /posts", {"status": 200}),
+            ("http", "GET /accounts", {"status": 200, "body": "x" * 1000}),
+        )
+        with open(self.path, "rb") as recording:
+            data = recording.read()
+        with open(self.path, "wb") as recording:
+            recording.write(data[: len(data) - 20])
+
+        replayer = Replayer(self.path, latency_scale=0)
+
+        self.assertEqual((await replayer.replay("http", "GET /posts"))["status"], 200)
+        with self.assertRaises(ReplayError):
+            await replayer.replay("http", "GET /accounts")
+
+    def test_recording_is_compressed(self) -> None:
+        self.record(*[("http", "GET /posts", {"body": "post " * 100})] * 10)
+
+        with gzip.open(self.path, "rt") as recording:
+            self.assertEqual(len(recording.readlines()), 10)
+        self.assertLess(os.path.getsize(self.path), 1000)
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import Mock
+
+from announcer.scheduler import PollScheduler, TickOutcome
+
+
+class TestPollScheduler(unittest.TestCase):
+    def generate_scheduler(self, **kwargs) -> PollScheduler:
+        self.clock = Mock(return_value=100.0)
+        # No jitter unless a test asks for it
+        self.rand = Mock(side_effect=lambda low, high: 1.0)
+        return PollScheduler(clock=self.clock, rand=self.rand, **kwargs)
+
+    def test_invalid_intervals(self) -> None:
+        with self.assertRaises(ValueError):
+            PollScheduler(min_interval=0)
+
+        with self.assertRaises(ValueError):
+            PollScheduler(min_interval=10, max_interval=5)
+
+    def test_fixed_cadence(self) -> None:
+        scheduler = self.generate_scheduler(min_interval=1, max_interval=5)
+        scheduler.reset()
+
+        # The tick took 2 seconds, which comes out of the sleep
+        self.clock.return_value = 102.0
+        self.assertEqual(scheduler.next_delay(TickOutcome.IDLE), 3)
+
+        self.clock.return_value = 105.5
+        self.assertEqual(scheduler.next_delay(TickOutcome.IDLE), 4.5)
+
+    def test_slow_tick_does_not_catch_up(self) -> None:
+        scheduler = self.generate_scheduler(min_interval=1, max_interval=5)
+        scheduler.reset()
+
+        self.clock.return_value = 120.0
+        self.assertEqual(scheduler.next_delay(TickOutcome.IDLE), 0)
+
+        self.clock.return_value = 121.0
+        self.assertEqual(scheduler.next_delay(TickOutcome.IDLE), 4)
+
+    def test_next_delay_without_reset(self) -> None:
+        scheduler = self.generate_scheduler(min_interval=1, max_interval=5)
+
+        self.assertEqual(scheduler.next_delay(None), 5)
+
+    def test_burst_after_new_posts(self) -> None:
+        scheduler = self.generate_scheduler(
+            min_interval=1, max_interval=5, idle_growth=2
+        )
+        scheduler.reset()
+
+        self.assertEqual(scheduler.next_delay(TickOutcome.ACTIVE), 1)
+        self.assertEqual(scheduler.interval, 1)
+
+        # Slows back down while idle
+        intervals = []
+        for i in range(4):
+            scheduler.next_delay(TickOutcome.IDLE)
+            intervals.append(scheduler.interval)
+
+        self.assertEqual(intervals, [2, 4, 5, 5])
+
+    def test_backoff_on_failure(self) -> None:
+        scheduler = self.generate_scheduler(
+            min_interval=1, max_interval=5, backoff_factor=2, max_backoff=30
+        )
+        scheduler.reset()
+
+        delays = []
+        for i in range(5):
+            delays.append(scheduler.next_delay(TickOutcome.FAILED))
+            self.clock.return_value += delays[-1]
+
+        self.assertEqual(delays, [5, 10, 20, 30, 30])
+        self.assertEqual(scheduler.failures, 5)
+
+        # Recovers as soon as the upstreams do
+        scheduler.next_delay(TickOutcome.ACTIVE)
+        self.assertEqual(scheduler.failures, 0)
+
+    def test_backoff_jitter(self) -> None:
+        scheduler = self.generate_scheduler(max_interval=5, jitter=0.2)
+        self.rand.side_effect = lambda low, high: high
+        scheduler.reset()
+
+        self.assertEqual(scheduler.next_delay(TickOutcome.FAILED), 6)
+        self.rand.assert_called_with(0.8, 1.2)
+
+    def test_default_jitter_in_bounds(self) -> None:
+        scheduler = PollScheduler(max_interval=5, jitter=0.1)
+
+        for i in range(20):
+            scheduler.reset()
+            delay = scheduler.next_delay(TickOutcome.FAILED)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, 5 * 2 ** i * 1.1)
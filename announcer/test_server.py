@@ -0,0 +1,40 @@
+import socket
+
+import aiohttp
+import asynctest
+from aiohttp import web
+
+from announcer.server import HttpServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestHttpServer(asynctest.TestCase):
+    async def test_start_and_stop(self) -> None:
+        port = free_port()
+        server = HttpServer(port, "127.0.0.1")
+
+        async def handler(request: web.Request) -> web.Response:
+            return web.json_response({"hello": "world"})
+
+        server.app.router.add_get("/test", handler)
+
+        self.assertFalse(server.running)
+        await server.start()
+        # Starting twice does nothing
+        await server.start()
+        self.assertTrue(server.running)
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/test") as response:
+                self.assertEqual(await response.json(), {"hello": "world"})
+
+        await server.stop()
+        self.assertFalse(server.running)
+
+        # Stopping twice does nothing
+        await server.stop()
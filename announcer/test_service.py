@@ -1,21 +1,35 @@
 import asyncio
 import datetime
+import json
+import os
 import random
+import re
+import signal
 import string
+import tempfile
 import time
-from typing import Any
+from typing import Any, AsyncIterator, List
 from unittest.mock import MagicMock, Mock, call, patch
 
 import asynctest
 
 from announcer.api.accounts import AccountsApi, AccountsApiError, User
-from announcer.api.posts import Post, PostsApi, PostsApiError
+from announcer.api.posts import BulkUnsupported, Post, PostsApi, PostsApiError
+from announcer.api.replay import RecordingHttpPool, ReplayHttpPool
 from announcer.broadcasters.email import (
     BroadcastEmail,
+    DeliveryReport,
     EmailBroadcaster,
     EmailBroadcasterError,
-    SendError,
+    SendFailure,
 )
+from announcer.broadcasters.pool import SMTPPool
+from announcer.broadcasters.replay import RecordingSMTP, ReplaySMTP
+from announcer.outbox import OutboxError
+from announcer.profiler import ProfileCapture
+from announcer.replay import Recorder
+from announcer import tracing
+from announcer.scheduler import TickOutcome
 from announcer.service import AnnouncerService
 
 
@@ -91,7 +105,7 @@ class TestAnnouncerService(asynctest.TestCase):
         ),
     ]
 
-    def generate_service(self) -> Any:
+    def generate_service(self, **kwargs) -> Any:
         posts_addr = "http://localhost:3929"
         accounts_addr = "http://localhost:3923"
         email_username = "test@test.com"
@@ -106,20 +120,52 @@ class TestAnnouncerService(asynctest.TestCase):
             email_password,
             email_host,
             email_port,
+            **kwargs,
         )
 
         service._posts_api = Mock(spec_set=service._posts_api)
         service._posts_api.get_posts.return_value = async_return([])
+
+        # Posts are streamed from whatever get_posts is set to return
+        async def iter_posts(*args, **kwargs) -> AsyncIterator[Post]:
+            for post in await service._posts_api.get_posts(*args, **kwargs):
+                yield post
+
+        service._posts_api.iter_posts.side_effect = iter_posts
         service._posts_api.set_approval_requested.return_value = async_return(True)
+        service._posts_api.set_approval_requested_bulk.return_value = async_exception(
+            BulkUnsupported("Not found")
+        )
 
         service._accounts_api = Mock(spec_set=service._accounts_api)
         service._accounts_api.get_accounts.return_value = async_return([])
 
         service._email_broadcaster = Mock(spec_set=service._email_broadcaster)
-        service._email_broadcaster.send.return_value = async_return(None)
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
 
         return service
 
+    def generate_posts(self, count: int, prefix: str = "post") -> List[Post]:
+        return [
+            Post(
+                id=f"{prefix}{i}",
+                date=datetime.datetime.now(),
+                title="test",
+                author="me",
+                content="test",
+                num_images=0,
+            )
+            for i in range(count)
+        ]
+
+    async def tick(self, service: Any) -> TickOutcome:
+        """
+        Tick, and wait for the marks it writes back in the background
+        """
+        outcome = await service._tick()
+        await service._wait_for_write_back()
+        return outcome
+
     @patch("announcer.service.PostsApi", autospec=True)
     @patch("announcer.service.EmailBroadcaster", autospec=True)
     @patch("announcer.service.AccountsApi", autospec=True)
@@ -150,12 +196,129 @@ class TestAnnouncerService(asynctest.TestCase):
 
         self.assertIs(service._posts_base_url, posts_base_url)
 
-        MockPostsApi.assert_called_with(posts_addr)
-        MockAccountsApi.assert_called_with(accounts_addr)
+        MockPostsApi.assert_called_with(
+            posts_addr, service._http_pool, service._metrics
+        )
+        MockAccountsApi.assert_called_with(
+            accounts_addr, service._http_pool, service._metrics
+        )
         MockEmailBroadcaster.assert_called_with(
-            email_host, email_port, email_username, email_password
+            email_host,
+            email_port,
+            email_username,
+            email_password,
+            pool_size=0,
+            idle_timeout=SMTPPool.IDLE_TIMEOUT,
+            concurrency=1,
+            recipients_per_message=1,
+            messages_per_second=0,
+            recipients_per_day=0,
+            connections_per_minute=0,
+            metrics=service._metrics,
+            client_factory=None,
+        )
+
+    @patch("announcer.service.HttpPool", autospec=True)
+    def test_init_http_pool(self, MockHttpPool: MagicMock) -> None:
+        service = AnnouncerService(
+            "http://localhost:3929",
+            "http://localhost:3923",
+            "test@test.com",
+            "test",
+            "smtp.gmail.com",
+            23,
+            http_limit=10,
+            http_limit_per_host=5,
+            http_dns_cache_ttl=60,
+        )
+
+        MockHttpPool.assert_called_with(limit=10, limit_per_host=5, dns_cache_ttl=60)
+        self.assertIs(service._posts_api._pool, service._http_pool)
+        self.assertIs(service._accounts_api._pool, service._http_pool)
+
+    def generate_traffic_service(self, **kwargs) -> Any:
+        return AnnouncerService(
+            "http://localhost:3929",
+            "http://localhost:3923",
+            "test@test.com",
+            "test",
+            "smtp.gmail.com",
+            23,
+            **kwargs,
         )
 
+    async def test_init_record(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl.gz")
+            service = self.generate_traffic_service(record_path=path, http_limit=10)
+
+            self.assertIsInstance(service._http_pool, RecordingHttpPool)
+            self.assertEqual(service._http_pool._limit, 10)
+            self.assertIs(service._posts_api._pool, service._http_pool)
+            self.assertIsInstance(service._email_broadcaster._client, RecordingSMTP)
+
+            await service.close()
+            self.assertTrue(service._recorder._file.closed)
+
+    async def test_init_replay(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl.gz")
+            Recorder(path).close()
+            service = self.generate_traffic_service(
+                replay_path=path, replay_latency_scale=0.5
+            )
+
+            self.assertIsInstance(service._http_pool, ReplayHttpPool)
+            self.assertIs(service._accounts_api._pool, service._http_pool)
+            self.assertIsInstance(service._email_broadcaster._client, ReplaySMTP)
+            self.assertIsNone(service._recorder)
+
+            # Nothing recorded, so the tick fails without going anywhere
+            self.assertEqual(await service._tick(), TickOutcome.FAILED)
+            await service.close()
+
+    def test_init_record_and_replay(self) -> None:
+        with self.assertRaises(ValueError):
+            self.generate_traffic_service(record_path="a", replay_path="b")
+
+    async def test_close(self) -> None:
+        service = self.generate_service()
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+
+        await service.close()
+
+        service._http_pool.close.assert_called()
+        service._email_broadcaster.close.assert_called()
+
+    async def test_close_waits_for_write_back(self) -> None:
+        service = self.generate_service()
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+        service._posts_api.get_posts.return_value = async_return(self.generate_posts(1))
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await service._tick()
+        await service.close()
+
+        service._posts_api.set_approval_requested.assert_called_with("post0", True)
+
+    async def test_close_after_failed_write_back(self) -> None:
+        service = self.generate_service()
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+        service._write_back_task = async_exception(OutboxError("disk I/O error"))
+
+        await service.close()
+
+        service._http_pool.close.assert_called()
+        service._email_broadcaster.close.assert_called()
+
     async def test_tick(self) -> None:
         service = self.generate_service()
         service._posts_api.get_posts.return_value = async_return(
@@ -166,7 +329,7 @@ class TestAnnouncerService(asynctest.TestCase):
             TestAnnouncerService.MOCK_USERS_LIST
         )
 
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.ACTIVE)
 
         admin_emails = []
 
@@ -188,7 +351,11 @@ class TestAnnouncerService(asynctest.TestCase):
                     )
                 )
 
-        service._posts_api.get_posts.assert_called_with(query={"approved": "false"})
+        service._posts_api.get_posts.assert_called_with(
+            query={"approved": "false", "approvalRequested": "false"},
+            since=None,
+            fields=AnnouncerService.NEW_POSTS_FIELDS,
+        )
         service._accounts_api.get_accounts.assert_called_with({"type": "admin"})
         service._email_broadcaster.send.assert_called_with(expected_emails)
 
@@ -201,26 +368,278 @@ class TestAnnouncerService(asynctest.TestCase):
             expected_calls, any_order=True
         )
 
+    def test_init_invalid_notification_mode(self) -> None:
+        with self.assertRaises(ValueError):
+            self.generate_service(notification_mode="carrier pigeon")
+
+    async def test_tick_digest(self) -> None:
+        service = self.generate_service(
+            notification_mode=AnnouncerService.MODE_DIGEST, digest_max_posts=2
+        )
+        posts = [
+            post
+            for post in TestAnnouncerService.MOCK_POSTS_LIST
+            if not post.approval_requested
+        ]
+        service._posts_api.get_posts.return_value = async_return(posts * 2)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+
+        # 4 posts split into digests of at most 2
+        sent_emails = service._email_broadcaster.send.call_args[0][0]
+        self.assertEqual(len(sent_emails), 2)
+
+        admin_emails = [user.email for user in TestAnnouncerService.MOCK_USERS_LIST]
+        post_lines = "".join(
+            AnnouncerService.EMAIL_DIGEST_POST_TEMPLATE.format(
+                post_author=post.author,
+                post_title=post.title,
+                post_link=f"{service._posts_base_url}{post.id}",
+            )
+            for post in posts
+        )
+        self.assertEqual(
+            sent_emails[0],
+            BroadcastEmail(
+                admin_emails,
+                AnnouncerService.EMAIL_DIGEST_SUBJECT.format(num_posts=2),
+                AnnouncerService.EMAIL_DIGEST_TEMPLATE.format(
+                    num_posts=2,
+                    post_lines=post_lines,
+                    posts_link=service._posts_base_url,
+                ),
+            ),
+        )
+        # Each post is only marked once
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 2)
+
+    async def test_tick_digest_window(self) -> None:
+        service = self.generate_service(
+            notification_mode=AnnouncerService.MODE_DIGEST,
+            digest_max_posts=3,
+            digest_window=60,
+        )
+        service._time = Mock(return_value=100)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        post = TestAnnouncerService.MOCK_POSTS_LIST[1]
+
+        # Posts are held until the window has passed
+        service._posts_api.get_posts.return_value = async_return([post])
+        await self.tick(service)
+        service._time.return_value = 159
+        await self.tick(service)
+
+        self.assertFalse(service._email_broadcaster.send.called)
+        self.assertFalse(service._posts_api.set_approval_requested.called)
+
+        service._time.return_value = 160
+        await self.tick(service)
+
+        self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 1)
+
+        # A new window opens for the next posts, unless the digest is full
+        service._email_broadcaster.send.reset_mock()
+        posts = self.generate_posts(3)
+        service._posts_api.get_posts.return_value = async_return(posts[:1])
+        await self.tick(service)
+        self.assertFalse(service._email_broadcaster.send.called)
+
+        service._posts_api.get_posts.return_value = async_return(posts)
+        await self.tick(service)
+        self.assertTrue(service._email_broadcaster.send.called)
+
+    async def test_tick_digest_window_resets_without_posts(self) -> None:
+        service = self.generate_service(
+            notification_mode=AnnouncerService.MODE_DIGEST, digest_window=60
+        )
+        service._time = Mock(return_value=100)
+        post = TestAnnouncerService.MOCK_POSTS_LIST[1]
+
+        service._posts_api.get_posts.return_value = async_return([post])
+        await self.tick(service)
+        self.assertEqual(service._digest_opened, 100)
+
+        service._posts_api.get_posts.return_value = async_return([])
+        await self.tick(service)
+        self.assertIsNone(service._digest_opened)
+
+    def test_time_is_monotonic(self) -> None:
+        service = self.generate_service()
+        self.assertLessEqual(service._time(), service._time())
+
+    async def test_tick_caches_admins(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+        service._accounts_api.get_accounts.return_value = async_exception(
+            AccountsApiError("Down")
+        )
+        service._posts_api.get_posts.return_value = async_return(self.generate_posts(1))
+        await self.tick(service)
+
+        self.assertEqual(service._accounts_api.get_accounts.call_count, 1)
+        self.assertEqual(service._email_broadcaster.send.call_count, 2)
+        self.assertIn(
+            'announcer_cache_lookups_total{cache="admins",result="hit"} 1\n',
+            service._metrics.render(),
+        )
+
+    async def test_tick_incremental_polling(self) -> None:
+        service = self.generate_service(incremental_polling=True, full_poll_interval=3)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        older = TestAnnouncerService.MOCK_POSTS_LIST[1]
+        newer = TestAnnouncerService.MOCK_POSTS_LIST[2]
+        service._posts_api.get_posts.return_value = async_return([newer, older])
+
+        await self.tick(service)
+        self.assertIsNone(service._posts_api.get_posts.call_args[1]["since"])
+
+        # Later polls only ask for posts since the newest announced post
+        service._posts_api.get_posts.return_value = async_return([])
+        await self.tick(service)
+        self.assertEqual(service._posts_api.get_posts.call_args[1]["since"], newer.date)
+        await self.tick(service)
+        self.assertEqual(service._posts_api.get_posts.call_args[1]["since"], newer.date)
+
+        # Until it is time for a full poll
+        await self.tick(service)
+        self.assertIsNone(service._posts_api.get_posts.call_args[1]["since"])
+        await self.tick(service)
+        self.assertEqual(service._posts_api.get_posts.call_args[1]["since"], newer.date)
+
+        # The cursor never moves backwards
+        service._posts_api.get_posts.return_value = async_return([older])
+        await self.tick(service)
+        self.assertEqual(service._posts_cursor, newer.date)
+
+    async def test_tick_incremental_polling_mark_failure(self) -> None:
+        service = self.generate_service(incremental_polling=True)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._posts_api.set_approval_requested.return_value = async_exception(
+            PostsApiError("Some error")
+        )
+
+        await self.tick(service)
+
+        # Posts which aren't marked yet are held in the outbox, so they
+        # don't need to be collected again
+        self.assertEqual(
+            service._posts_cursor,
+            max(post.date for post in TestAnnouncerService.MOCK_POSTS_LIST[1:]),
+        )
+        self.assertEqual(
+            service._outbox.post_ids(),
+            {post.id for post in TestAnnouncerService.MOCK_POSTS_LIST[1:]},
+        )
+
+    async def test_tick_mark_refused(self) -> None:
+        service = self.generate_service()
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._posts_api.set_approval_requested.return_value = async_return(False)
+
+        await self.tick(service)
+
+        # Posts the service didn't mark are kept, to be marked again
+        self.assertEqual(
+            service._outbox.post_ids(),
+            {post.id for post in TestAnnouncerService.MOCK_POSTS_LIST[1:]},
+        )
+
+    async def test_tick_streams_posts(self) -> None:
+        service = self.generate_service()
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        async def iter_posts(*args, **kwargs) -> AsyncIterator[Post]:
+            for post in TestAnnouncerService.MOCK_POSTS_LIST:
+                yield post
+
+        service._posts_api.iter_posts.side_effect = iter_posts
+
+        self.assertEqual(await self.tick(service), TickOutcome.ACTIVE)
+
+        # Only the new posts are collected, without reading the whole list
+        self.assertFalse(service._posts_api.get_posts.called)
+        self.assertEqual(
+            len(service._email_broadcaster.send.call_args[0][0]),
+            len(TestAnnouncerService.MOCK_POSTS_LIST) - 1,
+        )
+
     async def test_tick_no_new_posts(self) -> None:
         service = self.generate_service()
 
         service._posts_api.get_posts.return_value = async_return([])
 
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
 
-        self.assertFalse(service._accounts_api.get_accounts.called)
         self.assertFalse(service._email_broadcaster.send.called)
         self.assertFalse(service._posts_api.set_approval_requested.called)
 
+    async def test_tick_fetches_in_parallel(self) -> None:
+        service = self.generate_service()
+        posts_future: asyncio.Future = asyncio.Future()
+        service._posts_api.get_posts.return_value = posts_future
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        tick = asyncio.ensure_future(service._tick())
+        for i in range(5):
+            await asyncio.sleep(0)
+
+        # Admins are requested while posts are still loading
+        self.assertFalse(posts_future.done())
+        service._accounts_api.get_accounts.assert_called()
+
+        posts_future.set_result(TestAnnouncerService.MOCK_POSTS_LIST)
+        self.assertEqual(await tick, TickOutcome.ACTIVE)
+        service._email_broadcaster.send.assert_called()
+
+    async def test_tick_discards_admins_without_posts(self) -> None:
+        service = self.generate_service()
+        accounts_future: asyncio.Future = asyncio.Future()
+        service._accounts_api.get_accounts.return_value = accounts_future
+
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        # The admins request is left to fill the cache for later ticks
+        accounts_future.set_exception(AccountsApiError("Down"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertFalse(service._email_broadcaster.send.called)
+
     async def test_tick_post_api_failure(self) -> None:
         service = self.generate_service()
 
         service._posts_api.get_posts.return_value = async_exception(
             PostsApiError("Some error")
         )
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
 
-        self.assertFalse(service._accounts_api.get_accounts.called)
         self.assertFalse(service._email_broadcaster.send.called)
         self.assertFalse(service._posts_api.set_approval_requested.called)
 
@@ -234,7 +653,7 @@ class TestAnnouncerService(asynctest.TestCase):
             AccountsApiError("Another error")
         )
 
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
         self.assertFalse(service._email_broadcaster.send.called)
         self.assertFalse(service._posts_api.set_approval_requested.called)
 
@@ -246,7 +665,7 @@ class TestAnnouncerService(asynctest.TestCase):
         )
         service._accounts_api.get_accounts.return_value = async_return([])
 
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
         self.assertFalse(service._email_broadcaster.send.called)
         self.assertFalse(service._posts_api.set_approval_requested.called)
 
@@ -260,13 +679,309 @@ class TestAnnouncerService(asynctest.TestCase):
             TestAnnouncerService.MOCK_USERS_LIST
         )
 
+        def refuse_everyone(emails: List[BroadcastEmail]) -> asyncio.Future:
+            failures = [
+                SendFailure(email, recipient, Exception("Refused"), permanent=True)
+                for email in emails
+                for recipient in email.recipients
+            ]
+            return async_return(DeliveryReport(failures=failures))
+
+        service._email_broadcaster.send.side_effect = refuse_everyone
+
+        await self.tick(service)
+
+        # Permanent failures are given up on straight away
+        service._posts_api.set_approval_requested.assert_called()
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_retries_failed_recipients(self) -> None:
+        service = self.generate_service(outbox_retry_delay=0)
+        post = TestAnnouncerService.MOCK_POSTS_LIST[1]
+        service._posts_api.get_posts.return_value = async_return([post])
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        def fail_first_recipient(emails: List[BroadcastEmail]) -> asyncio.Future:
+            failures = [
+                SendFailure(email, min(email.recipients), Exception("Refused"))
+                for email in emails
+            ]
+            return async_return(DeliveryReport(failures=failures))
+
+        service._email_broadcaster.send.side_effect = fail_first_recipient
+        self.assertEqual(await self.tick(service), TickOutcome.ACTIVE)
+
+        # The post isn't marked until every admin has been emailed
+        self.assertFalse(service._posts_api.set_approval_requested.called)
+
+        # Only the admin who wasn't emailed is tried again
+        service._email_broadcaster.send.side_effect = None
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
+        service._posts_api.get_posts.return_value = async_return([])
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        admin_emails = sorted(
+            user.email for user in TestAnnouncerService.MOCK_USERS_LIST
+        )
+        sent_emails = service._email_broadcaster.send.call_args[0][0]
+        self.assertEqual(len(sent_emails), 1)
+        self.assertEqual(sent_emails[0].recipients, {admin_emails[0]})
+
+        service._posts_api.set_approval_requested.assert_called_with(post.id, True)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_sends_queued_emails_after_failure(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
         service._email_broadcaster.send.return_value = async_exception(
-            SendError("Could not send")
+            EmailBroadcasterError("Some error")
         )
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
 
-        await service._tick()
+        # The posts aren't collected again, but their emails are sent
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
 
-        service._posts_api.set_approval_requested.assert_called()
+        self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 2)
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 2)
+
+    async def test_tick_sends_queued_emails_when_fetch_fails(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        service._email_broadcaster.send.return_value = async_exception(
+            EmailBroadcasterError("Some error")
+        )
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
+
+        # The posts API is down, but emails already queued still go out
+        # and their posts are marked
+        service._posts_api.get_posts.return_value = async_exception(
+            PostsApiError("Some error")
+        )
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
+
+        self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 2)
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 2)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_keeps_partial_delivery_after_failure(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        def failing_send(emails):
+            error = EmailBroadcasterError("Some error")
+            error.report = DeliveryReport(
+                delivered=[(emails[0], recipient) for recipient in emails[0].recipients]
+            )
+            return async_exception(error)
+
+        service._email_broadcaster.send.side_effect = failing_send
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
+
+        # Only the email which wasn't delivered is sent again
+        service._email_broadcaster.send.side_effect = None
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 1)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_holds_emails_over_quota(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        def over_quota(emails):
+            return async_return(
+                DeliveryReport(
+                    delivered=[(emails[0], r) for r in emails[0].recipients],
+                    deferred=[
+                        (email, r) for email in emails[1:] for r in email.recipients
+                    ],
+                )
+            )
+
+        service._email_broadcaster.send.side_effect = over_quota
+        self.assertEqual(await self.tick(service), TickOutcome.ACTIVE)
+        self.assertEqual(service._email_broadcaster.send.call_count, 1)
+
+        # The held email is sent on a later tick
+        service._email_broadcaster.send.side_effect = None
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 1)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_sends_in_batches(self) -> None:
+        service = self.generate_service(outbox_batch_size=2)
+        posts = self.generate_posts(5)
+        service._posts_api.get_posts.return_value = async_return(posts)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+
+        self.assertEqual(
+            [len(c[0][0]) for c in service._email_broadcaster.send.call_args_list],
+            [2, 2, 1],
+        )
+
+    async def test_tick_sends_most_urgent_first(self) -> None:
+        service = self.generate_service(send_budget=2, outbox_batch_size=1)
+        posts = self.generate_posts(4)
+        now = datetime.datetime.now()
+        for i, post in enumerate(posts):
+            post.date = now - datetime.timedelta(days=i)
+        posts[3].pinned = True
+
+        service._posts_api.get_posts.return_value = async_return(posts)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        # The pinned post, then the newest. The rest are held for later
+        # ticks, which come round quickly while there is a backlog
+        self.assertEqual(await self.tick(service), TickOutcome.ACTIVE)
+
+        def sent_links() -> List[str]:
+            return [
+                link
+                for c in service._email_broadcaster.send.call_args_list
+                for email in c[0][0]
+                for link in re.findall(r"posts/(post\d)", email.body)
+            ]
+
+        self.assertEqual(sent_links(), ["post3", "post0"])
+
+        service._posts_api.get_posts.return_value = async_return([])
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+        self.assertEqual(sent_links(), ["post3", "post0", "post1", "post2"])
+
+    async def test_tick_resumes_from_outbox(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.sqlite3")
+
+            service = self.generate_service(outbox_path=path)
+            service._posts_api.get_posts.return_value = async_return(
+                TestAnnouncerService.MOCK_POSTS_LIST
+            )
+            service._accounts_api.get_accounts.return_value = async_return(
+                TestAnnouncerService.MOCK_USERS_LIST
+            )
+            service._email_broadcaster.send.return_value = async_exception(
+                EmailBroadcasterError("Some error")
+            )
+            await self.tick(service)
+            service._outbox.close()
+
+            # A restarted service picks up the queued emails without
+            # emailing about the same posts twice
+            service = self.generate_service(outbox_path=path)
+            service._posts_api.get_posts.return_value = async_return(
+                TestAnnouncerService.MOCK_POSTS_LIST
+            )
+            await self.tick(service)
+
+            self.assertEqual(service._email_broadcaster.send.call_count, 1)
+            self.assertEqual(len(service._email_broadcaster.send.call_args[0][0]), 2)
+            self.assertFalse(service._accounts_api.get_accounts.called)
+            service._outbox.close()
+
+    async def test_tick_does_not_reannounce_unmarked_posts(self) -> None:
+        service = self.generate_service()
+        post = TestAnnouncerService.MOCK_POSTS_LIST[1]
+        service._posts_api.get_posts.return_value = async_return([post])
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        await self.tick(service)
+
+        # The posts service lost the mark, so the post is marked again
+        # without emailing the admins again
+        service._posts_api.set_approval_requested.reset_mock()
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        self.assertEqual(service._email_broadcaster.send.call_count, 1)
+        service._posts_api.set_approval_requested.assert_called_once_with(post.id, True)
+        self.assertEqual(service._unmarked, set())
+
+    async def test_tick_writes_back_in_background(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(self.generate_posts(1))
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+        mark_future: asyncio.Future = asyncio.Future()
+        service._posts_api.set_approval_requested.return_value = mark_future
+
+        # The tick doesn't wait for the posts service to mark the post
+        self.assertEqual(await service._tick(), TickOutcome.ACTIVE)
+        for i in range(5):
+            await asyncio.sleep(0)
+        service._posts_api.set_approval_requested.assert_called_once_with("post0", True)
+
+        # Only one write back runs at a time
+        service._posts_api.get_posts.return_value = async_return(
+            self.generate_posts(1, "other")
+        )
+        await service._tick()
+        for i in range(5):
+            await asyncio.sleep(0)
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 1)
+
+        mark_future.set_result(True)
+        await service._wait_for_write_back()
+        self.assertEqual(service._outbox.post_ids(), {"other0"})
+
+    async def test_tick_remembers_announced_posts(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "announced.sqlite3")
+            post = TestAnnouncerService.MOCK_POSTS_LIST[1]
+
+            service = self.generate_service(announced_path=path)
+            service._posts_api.get_posts.return_value = async_return([post])
+            service._accounts_api.get_accounts.return_value = async_return(
+                TestAnnouncerService.MOCK_USERS_LIST
+            )
+            service._posts_api.set_approval_requested.return_value = async_exception(
+                PostsApiError("Some error")
+            )
+            await self.tick(service)
+            service._announced.close()
+
+            # Even without the outbox, a restarted service knows the post
+            # has been announced
+            service = self.generate_service(announced_path=path)
+            service._posts_api.get_posts.return_value = async_return([post])
+            await self.tick(service)
+
+            self.assertFalse(service._email_broadcaster.send.called)
+            service._posts_api.set_approval_requested.assert_called_with(post.id, True)
+            service._announced.close()
 
     async def test_tick_email_broadcaster_other_error(self) -> None:
         service = self.generate_service()
@@ -282,7 +997,7 @@ class TestAnnouncerService(asynctest.TestCase):
             EmailBroadcasterError("Some error")
         )
 
-        await service._tick()
+        self.assertEqual(await self.tick(service), TickOutcome.FAILED)
 
         self.assertFalse(service._posts_api.set_approval_requested.called)
 
@@ -296,13 +1011,113 @@ class TestAnnouncerService(asynctest.TestCase):
             TestAnnouncerService.MOCK_USERS_LIST
         )
 
-        service._email_broadcaster.send.return_value = async_return(None)
+        service._email_broadcaster.send.return_value = async_return(DeliveryReport())
 
         service._posts_api.set_approval_requested.return_value = async_exception(
             PostsApiError("Some error")
         )
 
-        await service._tick()
+        await self.tick(service)
+
+    async def test_tick_marks_in_bulk(self) -> None:
+        service = self.generate_service(mark_batch_size=2)
+        service._posts_api.set_approval_requested_bulk.return_value = async_return(True)
+        posts = self.generate_posts(3)
+        service._posts_api.get_posts.return_value = async_return(posts)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+
+        service._posts_api.set_approval_requested_bulk.assert_has_calls(
+            [call(["post0", "post1"], True), call(["post2"], True)]
+        )
+        self.assertFalse(service._posts_api.set_approval_requested.called)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_bulk_unsupported_falls_back(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 2)
+        self.assertFalse(service._bulk_marks)
+
+        # Bulk isn't attempted again
+        await self.tick(service)
+        self.assertEqual(service._posts_api.set_approval_requested_bulk.call_count, 1)
+
+    async def test_tick_retries_failed_marks(self) -> None:
+        service = self.generate_service()
+        service._posts_api.set_approval_requested_bulk.return_value = async_exception(
+            PostsApiError("Some error")
+        )
+        service._posts_api.get_posts.return_value = async_return(
+            TestAnnouncerService.MOCK_POSTS_LIST
+        )
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+
+        new_post_ids = {
+            post.id
+            for post in TestAnnouncerService.MOCK_POSTS_LIST
+            if not post.approval_requested
+        }
+        self.assertEqual(service._outbox.post_ids(), new_post_ids)
+
+        # While the marks keep failing the posts are not emailed again
+        service._posts_api.set_approval_requested_bulk.return_value = async_exception(
+            PostsApiError("Some error")
+        )
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+        self.assertEqual(service._email_broadcaster.send.call_count, 1)
+        self.assertEqual(service._outbox.post_ids(), new_post_ids)
+
+        # Once marked, the posts no longer come back as new
+        service._posts_api.set_approval_requested_bulk.return_value = async_return(True)
+        service._posts_api.get_posts.return_value = async_return([])
+        self.assertEqual(await self.tick(service), TickOutcome.IDLE)
+
+        service._posts_api.set_approval_requested_bulk.assert_called_with(
+            sorted(new_post_ids), True
+        )
+        self.assertEqual(service._email_broadcaster.send.call_count, 1)
+        self.assertEqual(service._outbox.post_ids(), set())
+
+    async def test_tick_marks_with_bounded_concurrency(self) -> None:
+        service = self.generate_service(mark_concurrency=2)
+        posts = self.generate_posts(5)
+        service._posts_api.get_posts.return_value = async_return(posts)
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        in_flight = 0
+        max_in_flight = 0
+
+        async def set_approval_requested(post_id: str, requested: bool) -> bool:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return True
+
+        service._posts_api.set_approval_requested.side_effect = set_approval_requested
+
+        await self.tick(service)
+
+        self.assertEqual(service._posts_api.set_approval_requested.call_count, 5)
+        self.assertEqual(max_in_flight, 2)
 
     async def test_sleep_sleeps_for_given_time(self) -> None:
         service = self.generate_service()
@@ -325,6 +1140,8 @@ class TestAnnouncerService(asynctest.TestCase):
 
         service._tick = Mock(spec_set=service._tick)
         service._sleep = Mock(spec_set=service._sleep)
+        service._scheduler = Mock(spec_set=service._scheduler)
+        service._scheduler.next_delay.return_value = 5
 
         tick_future: asyncio.Future = asyncio.Future()
         sleep_future: asyncio.Future = asyncio.Future()
@@ -337,12 +1154,275 @@ class TestAnnouncerService(asynctest.TestCase):
         # Hand control to loop
         await asyncio.sleep(0)
 
+        service._scheduler.reset.assert_called()
         service._tick.assert_called()
-        tick_future.set_result(None)
+        tick_future.set_result(TickOutcome.ACTIVE)
 
         await asyncio.sleep(0)
+        service._scheduler.next_delay.assert_called_with(TickOutcome.ACTIVE)
         service._sleep.assert_called_with(5)
 
+    def test_init_webhook(self) -> None:
+        service = self.generate_service(webhook_port=8080, reconcile_interval=30)
+
+        self.assertIsNotNone(service._server)
+        self.assertEqual(service._scheduler._max_interval, 30)
+
+    async def test_handle_event_triggers_tick(self) -> None:
+        service = self.generate_service(webhook_port=8080, webhook_debounce=0.01)
+        service._get_wake_event()
+
+        sleep = asyncio.ensure_future(service._sleep(60))
+        await asyncio.sleep(0)
+        self.assertFalse(sleep.done())
+
+        response = await service._handle_event(Mock())
+        self.assertEqual(response.status, 202)
+
+        # Bursts of events are handled by one tick
+        service.trigger()
+        await asyncio.wait_for(sleep, 1)
+        self.assertFalse(service._wake.is_set())
+
+    async def test_sleep_times_out_without_events(self) -> None:
+        service = self.generate_service(webhook_port=8080)
+        service._get_wake_event()
+
+        start = time.time()
+        await service._sleep(0.1)
+
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+    async def test_event_during_tick_is_not_lost(self) -> None:
+        service = self.generate_service(webhook_port=8080, webhook_debounce=0)
+
+        service.trigger()
+        await asyncio.wait_for(service._sleep(60), 1)
+
+        # An event arriving while ticking wakes the next sleep immediately
+        service.trigger()
+        await asyncio.wait_for(service._sleep(60), 1)
+
+    async def test_early_wake_restarts_cadence(self) -> None:
+        service = self.generate_service(
+            webhook_port=8080, reconcile_interval=30, webhook_debounce=0
+        )
+        now = [0.0]
+        service._scheduler._clock = lambda: now[0]
+        service._scheduler.reset()
+
+        self.assertEqual(service._scheduler.next_delay(TickOutcome.IDLE), 30)
+
+        # Woken by an event 10 seconds into a 30 second sleep
+        now[0] = 10
+        service.trigger()
+        await asyncio.wait_for(service._sleep(30), 1)
+
+        self.assertEqual(service._scheduler.next_delay(TickOutcome.IDLE), 30)
+
+    async def test_main_loop_starts_server(self) -> None:
+        service = self.generate_service(webhook_port=8080, reconcile_interval=30)
+        service._server = Mock(spec_set=service._server)
+        service._server.start.return_value = async_return(None)
+        service._server.stop.return_value = async_return(None)
+        service._tick = Mock(spec_set=service._tick)
+        service._sleep = Mock(spec_set=service._sleep)
+        service._tick.return_value = async_return(TickOutcome.IDLE)
+        service._sleep.return_value = asyncio.Future()
+        service._scheduler._clock = Mock(return_value=100)
+
+        loop = asyncio.ensure_future(service.main_loop())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        service._server.start.assert_called()
+        service._sleep.assert_called_with(30)
+        loop.cancel()
+
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+        await service.close()
+        service._server.stop.assert_called()
+
+    async def test_main_loop_starts_metrics_server(self) -> None:
+        service = self.generate_service(metrics_port=9090)
+        self.assertIsNone(service._server)
+        service._metrics_server = Mock(spec_set=service._metrics_server)
+        service._metrics_server.start.return_value = async_return(None)
+        service._metrics_server.stop.return_value = async_return(None)
+        service._tick = Mock(spec_set=service._tick)
+        service._sleep = Mock(spec_set=service._sleep)
+        service._tick.return_value = async_return(TickOutcome.IDLE)
+        service._sleep.return_value = asyncio.Future()
+
+        loop = asyncio.ensure_future(service.main_loop())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        service._metrics_server.start.assert_called()
+        loop.cancel()
+
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+        await service.close()
+        service._metrics_server.stop.assert_called()
+
+    def test_metrics_share_webhook_port(self) -> None:
+        service = self.generate_service(webhook_port=8080, metrics_port=8080)
+
+        self.assertIsNone(service._metrics_server)
+        assert service._server is not None
+        paths = {
+            resource.canonical for resource in service._server.app.router.resources()
+        }
+        self.assertEqual(paths, {"/v1/events", AnnouncerService.METRICS_PATH})
+
+    async def test_tick_metrics(self) -> None:
+        service = self.generate_service()
+        service._posts_api.get_posts.return_value = async_return(self.generate_posts(2))
+        service._accounts_api.get_accounts.return_value = async_return(
+            TestAnnouncerService.MOCK_USERS_LIST
+        )
+
+        await self.tick(service)
+
+        metrics = service._metrics.render()
+        self.assertIn("announcer_tick_seconds_count 1\n", metrics)
+        for phase in AnnouncerService.TICK_PHASES:
+            self.assertIn(
+                f'announcer_tick_phase_seconds_count{{phase="{phase}"}} 1\n', metrics
+            )
+        self.assertIn('announcer_ticks_total{outcome="active"} 1\n', metrics)
+        self.assertIn('announcer_outbox_deliveries{status="pending"} 0\n', metrics)
+        self.assertIn("announcer_outbox_posts 0\n", metrics)
+        self.assertIn("announcer_unmarked_posts 0\n", metrics)
+        self.assertIn("announcer_announced_posts 2\n", metrics)
+        self.assertIn('announcer_cache_age_seconds{cache="admins"} ', metrics)
+
+    def test_cache_age_metric(self) -> None:
+        service = self.generate_service()
+        service._admin_cache._clock = Mock(return_value=100)
+
+        self.assertNotIn("announcer_cache_age_seconds{", service._metrics.render())
+
+        service._admin_cache._loaded_at = 40
+        self.assertIn(
+            'announcer_cache_age_seconds{cache="admins"} 60\n',
+            service._metrics.render(),
+        )
+
+    async def test_tick_profile(self) -> None:
+        service = self.generate_service(profile_ticks=2)
+        service.profile()
+        self.assertIsNone(service._capture)
+
+        with tempfile.TemporaryDirectory() as directory:
+            service = self.generate_service(profile_dir=directory, profile_ticks=2)
+            service._posts_api.get_posts.return_value = async_return(
+                self.generate_posts(2)
+            )
+            service._accounts_api.get_accounts.return_value = async_return(
+                TestAnnouncerService.MOCK_USERS_LIST
+            )
+
+            service.profile()
+            await self.tick(service)
+            self.assertEqual(os.listdir(directory), [])
+            service._posts_api.get_posts.return_value = async_return([])
+            await self.tick(service)
+
+            traces = [name for name in os.listdir(directory) if name.endswith(".json")]
+            self.assertEqual(len(traces), 1)
+            with open(os.path.join(directory, traces[0])) as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+
+        self.assertFalse(tracing.tracer.enabled)
+        names = [event["name"] for event in events]
+        self.assertEqual(names.count("tick"), 2)
+        for phase in AnnouncerService.TICK_PHASES:
+            self.assertIn(phase, names)
+
+        ticks = {event["args"]["id"] for event in events if event["name"] == "tick"}
+        for event in events:
+            if event["name"] in ("fetch_posts", "fetch_admins", "render", "send"):
+                self.assertIn(event["args"]["parent"], ticks)
+
+    async def test_tick_profile_ends_on_error(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            service = self.generate_service(profile_dir=directory, profile_ticks=1)
+            service._posts_api.get_posts.side_effect = KeyError()
+
+            service.profile()
+            with self.assertRaises(KeyError):
+                await service._tick()
+
+            self.assertFalse(service._capture.active)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    async def test_handle_profile(self) -> None:
+        service = self.generate_service(
+            metrics_port=9090, profile_dir="profiles", profile_ticks=3
+        )
+        paths = {
+            resource.canonical
+            for resource in service._metrics_server.app.router.resources()
+        }
+        self.assertIn(AnnouncerService.PROFILE_PATH, paths)
+
+        request = Mock()
+        request.query = {}
+        response = await service._handle_profile(request)
+        self.assertEqual(response.status, 202)
+        self.assertEqual(service._capture._requested, 3)
+
+        service._capture._requested = 0
+        request.query = {"ticks": "5"}
+        response = await service._handle_profile(request)
+        self.assertEqual(response.status, 202)
+        self.assertEqual(service._capture._requested, 5)
+
+        request.query = {"ticks": "many"}
+        response = await service._handle_profile(request)
+        self.assertEqual(response.status, 400)
+
+        for ticks in ("0", str(ProfileCapture.MAX_TICKS + 1)):
+            request.query = {"ticks": ticks}
+            response = await service._handle_profile(request)
+            self.assertEqual(response.status, 400)
+
+    def test_profile_served_with_events(self) -> None:
+        service = self.generate_service(webhook_port=8080, profile_dir="profiles")
+
+        paths = {
+            resource.canonical for resource in service._server.app.router.resources()
+        }
+        self.assertEqual(paths, {"/v1/events", AnnouncerService.PROFILE_PATH})
+
+    async def test_main_loop_profiles_on_signal(self) -> None:
+        service = self.generate_service(profile_dir="profiles", profile_ticks=4)
+        service._tick = Mock(spec_set=service._tick)
+        service._sleep = Mock(spec_set=service._sleep)
+        service._tick.return_value = async_return(TickOutcome.IDLE)
+        service._sleep.return_value = asyncio.Future()
+
+        loop = asyncio.ensure_future(service.main_loop())
+        await asyncio.sleep(0)
+
+        os.kill(os.getpid(), AnnouncerService.PROFILE_SIGNAL)
+        await asyncio.sleep(0.01)
+        self.assertEqual(service._capture._requested, 4)
+        loop.cancel()
+
+        service._http_pool = Mock(spec_set=service._http_pool)
+        service._http_pool.close.return_value = async_return(None)
+        service._email_broadcaster.close.return_value = async_return(None)
+        await service.close()
+        self.assertEqual(
+            signal.getsignal(AnnouncerService.PROFILE_SIGNAL), signal.SIG_DFL
+        )
+
     async def test_main_loop_runs_forever(self) -> None:
         service = self.generate_service()
 
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import asynctest
+
+from announcer import tracing
+from announcer.tracing import Tracer
+
+
+class TestTracer(asynctest.TestCase):
+    def setUp(self) -> None:
+        self.tracer = Tracer()
+        self.tracer.enabled = True
+
+    def test_disabled(self) -> None:
+        self.tracer.enabled = False
+
+        with self.tracer.span("tick") as span:
+            self.assertIsNone(span)
+
+        self.assertEqual(self.tracer.spans, [])
+
+    def test_nested_spans(self) -> None:
+        with self.tracer.span("tick") as tick:
+            with self.tracer.span("send", emails=2) as send:
+                pass
+        with self.tracer.span("tick") as next_tick:
+            pass
+
+        self.assertEqual(self.tracer.spans, [send, tick, next_tick])
+        self.assertIsNone(tick.parent)
+        self.assertIs(send.parent, tick)
+        self.assertIsNone(next_tick.parent)
+        self.assertEqual(send.args, {"emails": 2})
+        self.assertLessEqual(tick.start, send.start)
+        self.assertLessEqual(send.end, tick.end)
+
+    def test_span_ends_on_error(self) -> None:
+        with self.assertRaises(KeyError):
+            with self.tracer.span("tick"):
+                raise KeyError()
+
+        (span,) = self.tracer.spans
+        self.assertIsNotNone(span.end)
+
+        with self.tracer.span("next") as next_span:
+            pass
+        self.assertIsNone(next_span.parent)
+
+    async def test_tasks_inherit_parent(self) -> None:
+        async def fetch(name: str) -> tracing.Span:
+            with self.tracer.span(name) as span:
+                await asyncio.sleep(0)
+            return span
+
+        with self.tracer.span("tick") as tick:
+            posts, admins = await asyncio.gather(fetch("posts"), fetch("admins"))
+
+        self.assertIs(posts.parent, tick)
+        self.assertIs(admins.parent, tick)
+        self.assertNotEqual(posts.task, admins.task)
+        self.assertNotEqual(posts.task, tick.task)
+
+    def test_max_spans(self) -> None:
+        tracer = Tracer(max_spans=2)
+        tracer.enabled = True
+
+        for name in ("a", "b", "c"):
+            with tracer.span(name):
+                pass
+
+        self.assertEqual([span.name for span in tracer.spans], ["b", "c"])
+
+        tracer.clear()
+        self.assertEqual(tracer.spans, [])
+
+    async def test_chrome_trace(self) -> None:
+        async def fetch() -> None:
+            with self.tracer.span("posts.list"):
+                pass
+
+        with self.tracer.span("tick", tick=1) as tick:
+            await asyncio.ensure_future(fetch())
+
+        events = self.tracer.chrome_trace()["traceEvents"]
+
+        self.assertEqual([event["name"] for event in events], ["tick", "posts.list"])
+        tick_event, fetch_event = events
+        self.assertEqual(tick_event["ph"], "X")
+        self.assertEqual(tick_event["pid"], os.getpid())
+        self.assertEqual(tick_event["ts"], tick.start * 1e6)
+        self.assertEqual(tick_event["dur"], (tick.end - tick.start) * 1e6)
+        self.assertEqual(tick_event["args"], {"tick": 1, "id": tick.id})
+        self.assertEqual(fetch_event["args"]["parent"], tick.id)
+
+        # Each task is its own thread
+        self.assertEqual(tick_event["tid"], 1)
+        self.assertEqual(fetch_event["tid"], 2)
+
+    def test_export(self) -> None:
+        with self.tracer.span("tick"):
+            pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            self.tracer.export(path)
+
+            with open(path) as trace_file:
+                self.assertEqual(json.load(trace_file), self.tracer.chrome_trace())
+
+
+class TestSpan(unittest.TestCase):
+    def test_global_tracer(self) -> None:
+        tracer = Tracer()
+
+        with patch("announcer.tracing.tracer", tracer):
+            with tracing.span("off"):
+                pass
+            tracer.enabled = True
+            with tracing.span("on", key="value"):
+                pass
+
+        (span,) = tracer.spans
+        self.assertEqual(span.name, "on")
+        self.assertEqual(span.args, {"key": "value"})
+        # Outside of a loop there is no task
+        self.assertEqual(span.task, 0)
+
+    def test_global_tracer_is_off(self) -> None:
+        self.assertFalse(tracing.tracer.enabled)
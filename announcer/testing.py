@@ -0,0 +1,21 @@
+"""
+Helpers shared by the tests
+"""
+import tracemalloc
+from typing import Any, Callable, List
+
+
+def allocated_per_object(make: Callable[[int], Any], count: int = 1000) -> float:
+    """
+    Average bytes allocated by `make`, not counting the objects it is
+    given, such as shared strings
+    """
+    objects: List[Any] = [None] * count
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            objects[i] = make(i)
+        return (tracemalloc.get_traced_memory()[0] - before) / count
+    finally:
+        tracemalloc.stop()
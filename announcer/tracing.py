@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+
+class Span:
+    """
+    A named, timed piece of work. Spans started while another span is
+    open, in the same task or a task it created, are its children.
+    """
+
+    __slots__ = ("id", "parent", "name", "args", "task", "start", "end")
+
+    def __init__(
+        self, id: int, parent: Optional["Span"], name: str, args: Dict[str, Any]
+    ) -> None:
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.args = args
+        self.task = _current_task_id()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+
+def _current_task_id() -> int:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        # Not in a running loop
+        return 0
+    return id(task) if task is not None else 0
+
+
+class _NoSpan:
+    """
+    Stands in for a span while tracing is off, so that instrumented code
+    pays for one attribute check and nothing else
+    """
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _OpenSpan:
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._span: Optional[Span] = None
+        self._token: Any = None
+
+    def __enter__(self) -> Span:
+        span = Span(next(self._tracer._ids), _current.get(), self._name, self._args)
+        self._span = span
+        self._token = _current.set(span)
+        return span
+
+    def __exit__(self, *exc_info: Any) -> None:
+        span = self._span
+        assert span is not None
+        span.end = time.perf_counter()
+        _current.reset(self._token)
+        self._tracer._finished.append(span)
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("announcer_span", default=None)
+
+
+class Tracer:
+    """
+    Records nested spans while `enabled`, keeping the most recent
+    `max_spans`, and exports them as Chrome trace events, which can be
+    opened in chrome://tracing or Perfetto.
+
+    Each asyncio task is shown as its own thread, so spans running
+    concurrently don't overlap on one track.
+    """
+
+    MAX_SPANS = 100000
+
+    def __init__(self, max_spans: int = MAX_SPANS) -> None:
+        self.enabled = False
+        self._ids = itertools.count(1)
+        self._finished: Deque[Span] = deque(maxlen=max_spans)
+
+    def span(self, name: str, **args: Any) -> Any:
+        if not self.enabled:
+            return _NO_SPAN
+        return _OpenSpan(self, name, args)
+
+    @property
+    def spans(self) -> List[Span]:
+        return list(self._finished)
+
+    def clear(self) -> None:
+        self._finished.clear()
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        # Small thread ids, in the order tasks were first seen
+        threads: Dict[int, int] = {}
+
+        events = []
+        for span in sorted(self._finished, key=lambda span: span.start):
+            assert span.end is not None
+            tid = threads.setdefault(span.task, len(threads) + 1)
+            args = dict(span.args, id=span.id)
+            if span.parent is not None:
+                args["parent"] = span.parent.id
+
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "announcer",
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": (span.end - span.start) * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str) -> None:
+        with open(path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+# Spans cross every part of the service, so like logging there is one
+# tracer, which is off until a capture turns it on
+tracer = Tracer()
+
+
+def span(name: str, **args: Any) -> Any:
+    """
+    Context manager which records a span named `name` on the tracer,
+    if it is enabled
+    """
+    return tracer.span(name, **args)
@@ -0,0 +1,61 @@
+"""
+Microbenchmark of decoding posts, with dates parsed by dateutil and by
+the ISO-8601 fast path.
+
+    python -m benchmarks.dates [--posts N] [--repeat N]
+"""
+import argparse
+import datetime
+import timeit
+from typing import Any, Callable, Dict, List
+from unittest.mock import patch
+
+from dateutil.parser import parse
+
+from announcer.api.dates import parse_date
+from announcer.api.posts import PostsApi
+from benchmarks.stubs import generate_posts
+
+
+def time_decode(
+    api: PostsApi,
+    posts: List[Dict[str, Any]],
+    parser: Callable[[str], datetime.datetime],
+    repeat: int,
+) -> float:
+    """
+    Best time in seconds to decode every post and read its date
+    """
+
+    def decode() -> None:
+        for post_data in posts:
+            api._decode_post(post_data).date
+
+    with patch("announcer.api.posts.parse_date", parser):
+        return min(timeit.repeat(decode, number=1, repeat=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    api = PostsApi("http://localhost")
+    posts = generate_posts(args.posts)
+
+    results = {
+        "dateutil": time_decode(api, posts, parse, args.repeat),
+        "parse_date": time_decode(api, posts, parse_date, args.repeat),
+    }
+
+    for name, seconds in results.items():
+        print(
+            f"{name:>10}: {seconds / args.posts * 1e6:8.2f} us/post "
+            f"{args.posts / seconds:10.0f} posts/s"
+        )
+    print(f"   speedup: {results['dateutil'] / results['parse_date']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+End-to-end benchmark of the announcer, polling local stand-ins for the
+posts and accounts services and sending to a local SMTP sink.
+
+    python -m benchmarks.e2e [--scale 1000x10 ...] [--output FILE]
+                             [--compare FILE]
+
+Each scale is N posts announced to M admins. The service and the stubs
+run in separate processes, so that peak RSS is the service's alone.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from announcer.scheduler import TickOutcome
+from announcer.service import AnnouncerService
+from benchmarks import stubs
+
+SCALES = ["100x5", "1000x5", "1000x50"]
+
+# Ticks for all the posts to arrive, unless set by --arrivals
+ARRIVAL_TICKS = 20
+
+# Metrics compared between runs, and whether higher is better
+COMPARED = {
+    "ticks_per_second": True,
+    "emails_per_second": True,
+    "tick_p50": False,
+    "tick_p99": False,
+    "peak_rss_bytes": False,
+}
+
+
+def parse_scale(scale: str) -> Tuple[int, int]:
+    posts, admins = scale.lower().split("x")
+    return int(posts), int(admins)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest rank percentile
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+async def measure(settings: Dict[str, Any], api_port: int, smtp_port: int) -> dict:
+    address = f"http://{stubs.Stubs.HOST}:{api_port}"
+    service = AnnouncerService(
+        address,
+        address,
+        "announcer@localhost",
+        "password",
+        "localhost",
+        smtp_port,
+        smtp_pool_size=settings["smtp_pool_size"],
+        smtp_concurrency=settings["smtp_pool_size"],
+        smtp_recipients_per_message=settings["recipients_per_message"],
+        notification_mode=settings["mode"],
+    )
+
+    latencies: List[float] = []
+    failed = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(settings["max_ticks"]):
+            tick_start = time.perf_counter()
+            outcome = await service._tick()
+            latencies.append(time.perf_counter() - tick_start)
+
+            if outcome is TickOutcome.FAILED:
+                failed += 1
+            elif outcome is TickOutcome.IDLE:
+                break
+
+        await service._wait_for_write_back()
+        seconds = time.perf_counter() - start
+    finally:
+        await service.close()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{address}/stats") as response:
+            sink = await response.json()
+
+    # Kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return {
+        "ticks": len(latencies),
+        "failed_ticks": failed,
+        "seconds": seconds,
+        "ticks_per_second": len(latencies) / seconds,
+        "emails_per_second": sink["recipients"] / seconds,
+        "tick_p50": percentile(latencies, 50),
+        "tick_p99": percentile(latencies, 99),
+        "tick_max": max(latencies, default=0.0),
+        "peak_rss_bytes": peak_rss,
+        **sink,
+    }
+
+
+def run_service(
+    settings: Dict[str, Any],
+    certificate: str,
+    api_port: int,
+    smtp_port: int,
+    connection: Any,
+) -> None:
+    # Trust the sink's self-signed certificate for STARTTLS
+    os.environ["SSL_CERT_FILE"] = certificate
+    logging.basicConfig(level=logging.CRITICAL)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        connection.send(loop.run_until_complete(measure(settings, api_port, smtp_port)))
+    finally:
+        loop.close()
+
+
+def run_scale(
+    posts: int, admins: int, settings: Dict[str, Any], certificate: Tuple[str, str]
+) -> Dict[str, Any]:
+    arrivals = settings["arrivals"] or max(1, posts // ARRIVAL_TICKS)
+
+    stubs_connection, stubs_end = multiprocessing.Pipe()
+    stubs_process = multiprocessing.Process(
+        target=stubs.serve,
+        args=(
+            posts,
+            admins,
+            *certificate,
+            arrivals,
+            settings["api_latency"],
+            settings["smtp_latency"],
+            stubs_end,
+        ),
+    )
+    stubs_process.start()
+    try:
+        api_port, smtp_port = stubs_connection.recv()
+
+        results, results_end = multiprocessing.Pipe()
+        service_process = multiprocessing.Process(
+            target=run_service,
+            args=(settings, certificate[0], api_port, smtp_port, results_end),
+        )
+        service_process.start()
+        result = results.recv()
+        service_process.join()
+    finally:
+        stubs_connection.send("stop")
+        stubs_process.join()
+
+    return {"posts": posts, "admins": admins, "arrivals": arrivals, **result}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    results = {
+        (result["posts"], result["admins"]): result for result in previous["results"]
+    }
+
+    print(f"\nCompared to {previous.get('commit') or 'previous run'}:")
+    for result in current["results"]:
+        old = results.get((result["posts"], result["admins"]))
+        if old is None:
+            continue
+
+        print(f"  {result['posts']}x{result['admins']}")
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old[metric], result[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            worse = change < 0 if higher_is_better else change > 0
+            flag = " (worse)" if worse and abs(change) >= 5 else ""
+            print(
+                f"    {metric:>18}: {before:12.4f} -> {after:12.4f} "
+                f"{change:+7.1f}%{flag}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scale",
+        action="append",
+        help=f"posts x admins, may be repeated (default: {' '.join(SCALES)})",
+    )
+    parser.add_argument(
+        "--arrivals", type=int, default=0, help="new posts a tick (default: 1/20th)"
+    )
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--smtp-latency", type=float, default=0.0)
+    parser.add_argument("--smtp-pool-size", type=int, default=4)
+    parser.add_argument("--recipients-per-message", type=int, default=1)
+    parser.add_argument(
+        "--mode",
+        choices=[AnnouncerService.MODE_PER_POST, AnnouncerService.MODE_DIGEST],
+        default=AnnouncerService.MODE_PER_POST,
+    )
+    parser.add_argument("--max-ticks", type=int, default=1000)
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--compare", help="results of an earlier run to compare to")
+    args = parser.parse_args()
+
+    settings = {
+        "arrivals": args.arrivals,
+        "api_latency": args.api_latency,
+        "smtp_latency": args.smtp_latency,
+        "smtp_pool_size": args.smtp_pool_size,
+        "recipients_per_message": args.recipients_per_message,
+        "mode": args.mode,
+        "max_ticks": args.max_ticks,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Made for each run, so that no key is kept in the repository
+        certificate = stubs.generate_certificate(directory)
+
+        for scale in args.scale or SCALES:
+            posts, admins = parse_scale(scale)
+            result = run_scale(posts, admins, settings, certificate)
+            results.append(result)
+            print(
+                f"{posts:>7} posts x {admins:>4} admins: "
+                f"{result['ticks_per_second']:8.1f} ticks/s "
+                f"{result['emails_per_second']:8.1f} emails/s "
+                f"p50 {result['tick_p50'] * 1000:8.1f}ms "
+                f"p99 {result['tick_p99'] * 1000:8.1f}ms "
+                f"rss {result['peak_rss_bytes'] / 2 ** 20:6.1f}MiB",
+                file=sys.stderr,
+            )
+
+    document = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": settings,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), document)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Microbenchmarks of the code run for every post or recipient each tick.
+
+    python -m benchmarks.micro [--repeat N] [--only NAME ...]
+                               [--output FILE] [--compare FILE]
+
+Payloads are generated from fixed seeds, so runs of the same commit
+time the same work.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from announcer.api.accounts import AccountsApi
+from announcer.api.posts import Post, PostsApi
+from announcer.broadcasters.email import BroadcastEmail, EmailBroadcaster
+from announcer.service import AnnouncerService
+from benchmarks import stubs
+from benchmarks.e2e import git_commit
+
+POSTS = 1000
+ADMINS = 20
+SEED = 0
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Runs the benchmark once, over `items` posts, users or messages
+    run: Callable[[], Any]
+    items: int
+
+
+def generate_service(mode: str) -> AnnouncerService:
+    return AnnouncerService(
+        "http://localhost:2833",
+        "http://localhost:2832",
+        "announcer@localhost",
+        "password",
+        "localhost",
+        25,
+        notification_mode=mode,
+    )
+
+
+def decode_posts(fields: Optional[List[str]] = None) -> Benchmark:
+    api = PostsApi("http://localhost:2833")
+    payloads = stubs.generate_posts(POSTS, SEED)
+
+    def run() -> None:
+        for payload in payloads:
+            api._decode_post(payload, fields).date
+
+    name = "decode_post" if fields is None else "decode_post_fields"
+    return Benchmark(name, run, len(payloads))
+
+
+def decode_users() -> Benchmark:
+    api = AccountsApi("http://localhost:2832")
+    payloads = stubs.generate_admins(ADMINS * 10)
+
+    def run() -> None:
+        for payload in payloads:
+            api._decode_user(payload)
+
+    return Benchmark("decode_user", run, len(payloads))
+
+
+def generated_posts() -> List[Post]:
+    api = PostsApi("http://localhost:2833")
+    return [api._decode_post(payload) for payload in stubs.generate_posts(POSTS, SEED)]
+
+
+def generate_emails(mode: str) -> Benchmark:
+    service = generate_service(mode)
+    posts = generated_posts()
+    recipients = [admin["email"] for admin in stubs.generate_admins(ADMINS)]
+
+    def run() -> None:
+        service._generate_emails(recipients, posts)
+
+    return Benchmark(f"generate_emails_{mode}", run, len(posts))
+
+
+def broadcast_emails() -> Benchmark:
+    rng = random.Random(SEED)
+    admins = [admin["email"] for admin in stubs.generate_admins(ADMINS)]
+    emails = [
+        (rng.sample(admins, rng.randint(1, ADMINS)), f"Subject {i}", f"Body {i}" * 50)
+        for i in range(POSTS)
+    ]
+
+    def run() -> None:
+        for recipients, subject, body in emails:
+            BroadcastEmail(recipients, subject, body)
+
+    return Benchmark("broadcast_email", run, len(emails))
+
+
+def generate_messages() -> Benchmark:
+    service = generate_service(AnnouncerService.MODE_PER_POST)
+    recipients = [admin["email"] for admin in stubs.generate_admins(ADMINS)]
+    emails = [
+        email for email, _ in service._generate_emails(recipients, generated_posts())
+    ]
+
+    # Every admin is sent each email in turn, as the broadcaster does
+    messages = [
+        (recipient, email.subject, email.body)
+        for email in emails[: POSTS // 10]
+        for recipient in sorted(email.recipients)
+    ]
+
+    def run() -> None:
+        # A new broadcaster each run, so that its message cache starts
+        # empty
+        broadcaster = EmailBroadcaster(
+            "localhost", 25, "announcer@localhost", "password"
+        )
+        for recipient, subject, body in messages:
+            broadcaster._generate_message(recipient, subject, body)
+
+    return Benchmark("generate_message", run, len(messages))
+
+
+BENCHMARKS: Dict[str, Callable[[], Benchmark]] = {
+    "decode_post": decode_posts,
+    "decode_post_fields": lambda: decode_posts(list(AnnouncerService.NEW_POSTS_FIELDS)),
+    "decode_user": decode_users,
+    "generate_emails_post": lambda: generate_emails(AnnouncerService.MODE_PER_POST),
+    "generate_emails_digest": lambda: generate_emails(AnnouncerService.MODE_DIGEST),
+    "broadcast_email": broadcast_emails,
+    "generate_message": generate_messages,
+}
+
+
+def measure(benchmark: Benchmark, repeat: int) -> Dict[str, Any]:
+    """
+    Best time of `repeat` runs, each of as many loops as fit in about
+    0.2 seconds
+    """
+    timer = timeit.Timer(benchmark.run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    return {
+        "name": benchmark.name,
+        "items": benchmark.items,
+        "seconds": best,
+        "us_per_item": best / benchmark.items * 1e6,
+        "items_per_second": benchmark.items / best,
+    }
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    results = {result["name"]: result for result in previous["results"]}
+
+    print(f"\nCompared to {previous.get('commit') or 'previous run'}:")
+    for result in current["results"]:
+        old = results.get(result["name"])
+        if old is None:
+            continue
+
+        before, after = old["us_per_item"], result["us_per_item"]
+        change = (after - before) / before * 100
+        flag = " (worse)" if change >= 5 else ""
+        print(
+            f"  {result['name']:>24}: {before:10.2f} -> {after:10.2f} us/item "
+            f"{change:+7.1f}%{flag}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", action="append", choices=list(BENCHMARKS), help="may be repeated"
+    )
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--compare", help="results of an earlier run to compare to")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        result = measure(BENCHMARKS[name](), args.repeat)
+        results.append(result)
+        print(
+            f"{name:>24}: {result['us_per_item']:10.2f} us/item "
+            f"{result['items_per_second']:12.0f} items/s",
+            file=sys.stderr,
+        )
+
+    document = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "seed": SEED,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), document)
+
+
+if __name__ == "__main__":
+    main()
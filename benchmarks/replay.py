@@ -0,0 +1,111 @@
+"""
+Offline benchmark of the announcer over recorded traffic, replaying the
+posts service, accounts service and SMTP server from a recording made
+with RECORD_PATH.
+
+    python -m benchmarks.replay RECORDING [--latency-scale X] [--ticks N]
+                                [--smtp-pool-size N] [--output FILE]
+
+A latency scale of 1 waits as long as each exchange originally took,
+0 times the service alone.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Any, Dict, List
+
+from announcer.scheduler import TickOutcome
+from announcer.service import AnnouncerService
+from benchmarks.e2e import git_commit, percentile
+
+
+async def measure(
+    recording: str, latency_scale: float, ticks: int, smtp_pool_size: int
+) -> Dict[str, Any]:
+    service = AnnouncerService(
+        "http://posts",
+        "http://accounts",
+        "announcer@localhost",
+        "password",
+        "localhost",
+        25,
+        smtp_pool_size=smtp_pool_size,
+        smtp_concurrency=smtp_pool_size,
+        replay_path=recording,
+        replay_latency_scale=latency_scale,
+    )
+
+    latencies: List[float] = []
+    outcomes = {outcome.value: 0 for outcome in TickOutcome}
+    start = time.perf_counter()
+    try:
+        for _ in range(ticks):
+            tick_start = time.perf_counter()
+            outcome = await service._tick()
+            latencies.append(time.perf_counter() - tick_start)
+            outcomes[outcome.value] += 1
+
+        await service._wait_for_write_back()
+        seconds = time.perf_counter() - start
+    finally:
+        await service.close()
+
+    return {
+        "ticks": len(latencies),
+        "outcomes": outcomes,
+        "seconds": seconds,
+        "ticks_per_second": len(latencies) / seconds,
+        "tick_p50": percentile(latencies, 50),
+        "tick_p99": percentile(latencies, 99),
+        "tick_max": max(latencies, default=0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("recording")
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--smtp-pool-size", type=int, default=1)
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    loop = asyncio.get_event_loop()
+    result = loop.run_until_complete(
+        measure(args.recording, args.latency_scale, args.ticks, args.smtp_pool_size)
+    )
+    print(
+        f"{result['ticks']} ticks: {result['ticks_per_second']:8.1f} ticks/s "
+        f"p50 {result['tick_p50'] * 1000:8.1f}ms "
+        f"p99 {result['tick_p99'] * 1000:8.1f}ms",
+        file=sys.stderr,
+    )
+
+    document = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "recording": args.recording,
+        "latency_scale": args.latency_scale,
+        "smtp_pool_size": args.smtp_pool_size,
+        "result": result,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Local stand-ins for the posts and accounts services, and an SMTP sink,
+for benchmarking the announcer without touching anything real.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import random
+import ssl
+import subprocess
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from announcer.api.dates import parse_date
+
+
+def generate_certificate(directory: str) -> Tuple[str, str]:
+    """
+    Write a throwaway self-signed certificate and key for localhost, for
+    STARTTLS, to `directory`, returning their paths. Needs openssl.
+    """
+    certificate = os.path.join(directory, "localhost.crt")
+    key = os.path.join(directory, "localhost.key")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout",
+            key,
+            "-out",
+            certificate,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return certificate, key
+
+
+def generate_posts(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Posts as the posts service sends them, with realistic content sizes
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2018, 1, 1)
+    words = ["beef", "brisket", "rump", "sirloin", "mince", "steak", "roast"]
+
+    return [
+        {
+            "id": f"post{i}",
+            "author": f"author{rng.randrange(max(1, count // 20))}",
+            "title": " ".join(rng.choice(words) for _ in range(rng.randint(2, 8))),
+            "content": " ".join(rng.choice(words) for _ in range(rng.randint(50, 500))),
+            "numImages": rng.randint(0, 4),
+            "date": (
+                start + datetime.timedelta(seconds=rng.randrange(10 ** 8))
+            ).isoformat(timespec="milliseconds")
+            + "Z",
+            "approved": False,
+            "pinned": rng.random() < 0.05,
+            "notified": False,
+            "approvalRequested": False,
+        }
+        for i in range(count)
+    ]
+
+
+def generate_admins(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "username": f"admin{i}",
+            "email": f"admin{i}@localhost",
+            "admin": True,
+            "firstName": "Admin",
+            "lastName": str(i),
+        }
+        for i in range(count)
+    ]
+
+
+class StubApis:
+    """
+    The parts of the posts and accounts services the announcer uses, on
+    one aiohttp app. Posts arrive `arrivals` at a time, one batch each
+    time posts are listed, or all at once if 0. Every response is
+    delayed by `latency` seconds.
+    """
+
+    def __init__(
+        self, posts: int, admins: int, arrivals: int = 0, latency: float = 0
+    ) -> None:
+        self._posts = generate_posts(posts)
+        self._arrivals = arrivals or posts
+        self._arrived = 0
+        self._dates = {post["id"]: parse_date(post["date"]) for post in self._posts}
+        self._admins = generate_admins(admins)
+        self._latency = latency
+        self.requests = 0
+
+        self.app = web.Application()
+        self.app.router.add_get("/v1/posts", self._get_posts)
+        self.app.router.add_put("/v1/posts/approvalRequested", self._mark_bulk)
+        self.app.router.add_put("/v1/posts/{id}/approvalRequested", self._mark)
+        self.app.router.add_get("/v1/accounts", self._get_accounts)
+
+    @property
+    def unmarked(self) -> int:
+        return sum(1 for post in self._posts if not post["approvalRequested"])
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+    async def _get_posts(self, request: web.Request) -> web.Response:
+        await self._delay()
+
+        self._arrived = min(len(self._posts), self._arrived + self._arrivals)
+
+        posts = self._posts[: self._arrived]
+        if request.query.get("approvalRequested") == "false":
+            posts = [post for post in posts if not post["approvalRequested"]]
+
+        since = request.query.get("since")
+        if since:
+            since_date = parse_date(since)
+            posts = [post for post in posts if self._dates[post["id"]] > since_date]
+
+        fields = request.query.get("fields")
+        if fields:
+            names = fields.split(",")
+            posts = [{name: post[name] for name in names} for post in posts]
+
+        return web.json_response({"posts": posts})
+
+    def _set_marked(self, post_ids: Set[str], requested: bool) -> None:
+        for post in self._posts:
+            if post["id"] in post_ids:
+                post["approvalRequested"] = requested
+
+    async def _mark_bulk(self, request: web.Request) -> web.Response:
+        await self._delay()
+        data = await request.json()
+        self._set_marked(set(data["ids"]), data["approvalRequested"])
+        return web.json_response({"success": True})
+
+    async def _mark(self, request: web.Request) -> web.Response:
+        await self._delay()
+        data = await request.json()
+        self._set_marked({request.match_info["id"]}, data["approvalRequested"])
+        return web.json_response({"success": True})
+
+    async def _get_accounts(self, request: web.Request) -> web.Response:
+        await self._delay()
+        return web.json_response({"accounts": self._admins})
+
+
+class SMTPSink:
+    """
+    Accepts any mail over SMTP, with STARTTLS and any login, and throws
+    it away. Every reply is delayed by `latency` seconds.
+    """
+
+    MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+
+    def __init__(self, certificate: str, key: str, latency: float = 0) -> None:
+        self._latency = latency
+        self._tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self._tls.load_cert_chain(certificate, key)
+
+        self.connections = 0
+        self.messages = 0
+        self.recipients = 0
+
+    async def _reply(self, writer: asyncio.StreamWriter, reply: str) -> None:
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        writer.write(reply.encode("ascii") + b"\r\n")
+        await writer.drain()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        recipients = 0
+        try:
+            await self._reply(writer, "220 localhost ESMTP sink")
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                command = line.decode("ascii", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    await self._reply(
+                        writer,
+                        "250-localhost\r\n250-8BITMIME\r\n"
+                        "250-STARTTLS\r\n250 AUTH PLAIN LOGIN",
+                    )
+                elif verb == "HELO":
+                    await self._reply(writer, "250 localhost")
+                elif verb == "STARTTLS":
+                    await self._reply(writer, "220 Ready to start TLS")
+                    writer = await self._start_tls(reader, writer)
+                elif verb == "AUTH":
+                    arguments = command.split()[1:]
+                    if arguments and arguments[0].upper() == "LOGIN":
+                        # The username may come with the command
+                        if len(arguments) == 1:
+                            await self._reply(writer, "334 VXNlcm5hbWU6")
+                            await reader.readline()
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await self._reply(writer, "235 Authentication successful")
+                elif verb == "MAIL":
+                    recipients = 0
+                    await self._reply(writer, "250 OK")
+                elif verb == "RCPT":
+                    recipients += 1
+                    await self._reply(writer, "250 OK")
+                elif verb == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    await reader.readuntil(b"\r\n.\r\n")
+                    self.messages += 1
+                    self.recipients += recipients
+                    await self._reply(writer, "250 OK")
+                elif verb in ("RSET", "NOOP"):
+                    await self._reply(writer, "250 OK")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start_tls(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> asyncio.StreamWriter:
+        loop = asyncio.get_event_loop()
+        protocol = writer.transport.get_protocol()  # type: ignore
+        transport = await loop.start_tls(  # type: ignore
+            writer.transport, protocol, self._tls, server_side=True
+        )
+        # The reader is fed by the same protocol, only writes have to go
+        # through the new transport
+        return asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": self.connections,
+            "messages": self.messages,
+            "recipients": self.recipients,
+        }
+
+
+class Stubs:
+    """
+    The stub services and SMTP sink, listening on free local ports
+    """
+
+    HOST = "127.0.0.1"
+
+    def __init__(
+        self,
+        posts: int,
+        admins: int,
+        certificate: str,
+        key: str,
+        arrivals: int = 0,
+        api_latency: float = 0,
+        smtp_latency: float = 0,
+    ) -> None:
+        self.apis = StubApis(posts, admins, arrivals, api_latency)
+        self.sink = SMTPSink(certificate, key, smtp_latency)
+        self.apis.app.router.add_get("/stats", self._get_stats)
+
+        self._runner: Optional[web.AppRunner] = None
+        self._smtp_server: Optional[asyncio.AbstractServer] = None
+        self.api_port = 0
+        self.smtp_port = 0
+
+    async def _get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.sink.stats()
+        stats["api_requests"] = self.apis.requests
+        stats["unmarked_posts"] = self.apis.unmarked
+        return stats
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.apis.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, Stubs.HOST, 0)
+        await site.start()
+        self.api_port = self._runner.addresses[0][1]
+
+        self._smtp_server = await asyncio.start_server(
+            self.sink.handle, Stubs.HOST, 0, limit=SMTPSink.MAX_MESSAGE_SIZE
+        )
+        assert self._smtp_server.sockets
+        self.smtp_port = self._smtp_server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._smtp_server:
+            self._smtp_server.close()
+            await self._smtp_server.wait_closed()
+        if self._runner:
+            await self._runner.cleanup()
+
+
+def serve(
+    posts: int,
+    admins: int,
+    certificate: str,
+    key: str,
+    arrivals: int,
+    api_latency: float,
+    smtp_latency: float,
+    connection: Any,
+) -> None:
+    """
+    Run the stubs until told to stop over `connection`, after sending
+    back the ports they listen on
+    """
+    # TLS streams warn about every connection the client closes
+    logging.getLogger("asyncio").setLevel(logging.ERROR)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    stubs = Stubs(posts, admins, certificate, key, arrivals, api_latency, smtp_latency)
+    loop.run_until_complete(stubs.start())
+    connection.send((stubs.api_port, stubs.smtp_port))
+
+    stopped = asyncio.Event()
+    loop.add_reader(connection.fileno(), stopped.set)
+    loop.run_until_complete(stopped.wait())
+
+    loop.remove_reader(connection.fileno())
+    loop.run_until_complete(stubs.stop())
+    loop.close()
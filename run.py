@@ -5,7 +5,11 @@ from announcer.service import AnnouncerService
 
 
 def start():
-    asyncio.get_event_loop().run_until_complete(service.main_loop())
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(service.main_loop())
+    finally:
+        loop.run_until_complete(service.close())
 
 
 posts_api = os.environ.get("POSTS_API", "http://localhost:2833")
@@ -17,6 +21,46 @@ email_host = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
 email_port = int(os.environ.get("EMAIL_PORT", 25))
 posts_base_url = os.environ.get("EMAIL_BASE_URL", "https://beefboard.mooo.com/posts/")
 
+http_limit = int(os.environ.get("HTTP_POOL_LIMIT", 100))
+http_limit_per_host = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", 0))
+http_dns_cache_ttl = int(os.environ.get("HTTP_DNS_CACHE_TTL", 10))
+smtp_pool_size = int(os.environ.get("SMTP_POOL_SIZE", 1))
+smtp_idle_timeout = float(os.environ.get("SMTP_IDLE_TIMEOUT", 60))
+smtp_concurrency = int(os.environ.get("SMTP_CONCURRENCY", smtp_pool_size))
+smtp_recipients_per_message = int(os.environ.get("SMTP_RECIPIENTS_PER_MESSAGE", 1))
+smtp_messages_per_second = float(os.environ.get("SMTP_MESSAGES_PER_SECOND", 0))
+smtp_recipients_per_day = int(os.environ.get("SMTP_RECIPIENTS_PER_DAY", 0))
+smtp_connections_per_minute = int(os.environ.get("SMTP_CONNECTIONS_PER_MINUTE", 0))
+notification_mode = os.environ.get("NOTIFICATION_MODE", "post")
+digest_max_posts = int(os.environ.get("DIGEST_MAX_POSTS", 50))
+digest_window = float(os.environ.get("DIGEST_WINDOW", 0))
+admin_cache_ttl = float(os.environ.get("ADMIN_CACHE_TTL", 300))
+admin_cache_max_stale = float(os.environ.get("ADMIN_CACHE_MAX_STALE", 24 * 60 * 60))
+incremental_polling = os.environ.get("INCREMENTAL_POLLING", "false") == "true"
+full_poll_interval = int(os.environ.get("FULL_POLL_INTERVAL", 60))
+webhook_port = os.environ.get("WEBHOOK_PORT", None)
+webhook_debounce = float(os.environ.get("WEBHOOK_DEBOUNCE", 0.5))
+reconcile_interval = float(os.environ.get("RECONCILE_INTERVAL", 60))
+poll_min_interval = float(os.environ.get("POLL_MIN_INTERVAL", 1))
+poll_max_interval = float(os.environ.get("POLL_MAX_INTERVAL", 5))
+poll_max_backoff = float(os.environ.get("POLL_MAX_BACKOFF", 300))
+mark_concurrency = int(os.environ.get("MARK_CONCURRENCY", 10))
+mark_batch_size = int(os.environ.get("MARK_BATCH_SIZE", 100))
+outbox_path = os.environ.get("OUTBOX_PATH", "outbox.sqlite3")
+outbox_max_attempts = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 3))
+outbox_retry_delay = float(os.environ.get("OUTBOX_RETRY_DELAY", 60))
+outbox_batch_size = int(os.environ.get("OUTBOX_BATCH_SIZE", 20))
+announced_path = os.environ.get("ANNOUNCED_PATH", "announced.sqlite3")
+priority_keys = os.environ.get("PRIORITY_KEYS", "pinned,newest").split(",")
+priority_authors = os.environ.get("PRIORITY_AUTHORS", "").split(",")
+send_budget = int(os.environ.get("SEND_BUDGET", 0))
+metrics_port = os.environ.get("METRICS_PORT", None)
+profile_dir = os.environ.get("PROFILE_DIR", None)
+profile_ticks = int(os.environ.get("PROFILE_TICKS", 10))
+record_path = os.environ.get("RECORD_PATH", None)
+replay_path = os.environ.get("REPLAY_PATH", None)
+replay_latency_scale = float(os.environ.get("REPLAY_LATENCY_SCALE", 1))
+
 log_level = os.environ.get("LOG_LEVEL", logging.INFO)
 
 if not email_username or not email_username:
@@ -35,6 +79,45 @@ service = AnnouncerService(
     email_host,
     email_port,
     posts_base_url,
+    http_limit=http_limit,
+    http_limit_per_host=http_limit_per_host,
+    http_dns_cache_ttl=http_dns_cache_ttl,
+    smtp_pool_size=smtp_pool_size,
+    smtp_idle_timeout=smtp_idle_timeout,
+    smtp_concurrency=smtp_concurrency,
+    smtp_recipients_per_message=smtp_recipients_per_message,
+    smtp_messages_per_second=smtp_messages_per_second,
+    smtp_recipients_per_day=smtp_recipients_per_day,
+    smtp_connections_per_minute=smtp_connections_per_minute,
+    notification_mode=notification_mode,
+    digest_max_posts=digest_max_posts,
+    digest_window=digest_window,
+    admin_cache_ttl=admin_cache_ttl,
+    admin_cache_max_stale=admin_cache_max_stale,
+    incremental_polling=incremental_polling,
+    full_poll_interval=full_poll_interval,
+    webhook_port=int(webhook_port) if webhook_port else None,
+    webhook_debounce=webhook_debounce,
+    reconcile_interval=reconcile_interval,
+    poll_min_interval=poll_min_interval,
+    poll_max_interval=poll_max_interval,
+    poll_max_backoff=poll_max_backoff,
+    mark_concurrency=mark_concurrency,
+    mark_batch_size=mark_batch_size,
+    outbox_path=outbox_path,
+    outbox_max_attempts=outbox_max_attempts,
+    outbox_retry_delay=outbox_retry_delay,
+    outbox_batch_size=outbox_batch_size,
+    announced_path=announced_path,
+    priority_keys=[key.strip() for key in priority_keys if key.strip()],
+    priority_authors=[author.strip() for author in priority_authors if author.strip()],
+    send_budget=send_budget,
+    metrics_port=int(metrics_port) if metrics_port else None,
+    profile_dir=profile_dir,
+    profile_ticks=profile_ticks,
+    record_path=record_path,
+    replay_path=replay_path,
+    replay_latency_scale=replay_latency_scale,
 )
 
 start()